@@ -1,10 +1,12 @@
 
 import os
 import pandas as pd
-import statsmodels.formula.api as smf
 from tabulate import tabulate
 from statsmodels.iolib.summary2 import summary_col
 import matplotlib.pyplot as plt
+from pisa_store import read_cleaned, drop_unused_categories, CLEANED_2018
+from pisa_ols import fe_ols_many
+from pisa_survey import replicate_ols, has_replicates, WEIGHT_COL, REPLICATE_COLS
 
 # === 0. Config: choose how to encode Books-at-Home ===
 # "ordinal"  -> use original 1–6 coding in df['books_home']
@@ -23,17 +25,10 @@ BOOKS_MIDPOINTS = {
     6: OPEN_ENDED_VALUE  # >500
 }
 
-# === 1. Load numeric-cleaned dataset ===
+# === 1. Paths (the dataset is loaded once the variable lists below are defined) ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-data_path = os.path.join(BASE_DIR, "../output/2018output/newpisa2018_cleaned_all_countries.csv")
-df = pd.read_csv(data_path)
-
-# === 2. Rename if needed ===
-df = df.rename(columns={"read_time": "read_time_numeric"})
-
-# === 2b. Build midpoint column (safe if books_home already numeric/categorical) ===
-df["books_home_midpoint"] = pd.to_numeric(df.get("books_home"), errors="coerce").map(BOOKS_MIDPOINTS)
 
+# === 2. Books predictor ===
 # Pick the active books predictor name based on BOOKS_ENCODING
 BOOKS_VAR = "books_home_midpoint" if BOOKS_ENCODING.lower() == "midpoint" else "books_home"
 
@@ -152,11 +147,6 @@ control_vars = [
     
 ]
 
-# Coerce only numeric columns — exclude 'country'
-for col in ["read_time_numeric", BOOKS_VAR] + control_vars:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-
 # === Outcome variable groups ===
 effort_vars = ["effort_actual", "effort_ideal"]
 goal_vars = ["mastery_goal_orientation", "work_mastery"]
@@ -176,6 +166,22 @@ fearfailure_vars = ["general_fear_of_failure"]
 meaning_vars = ["eudaemonia_meaning_in_life"]
 learning_vars = ["attitude_learning_activities"]
 
+# === 4. Load numeric-cleaned dataset: only the variables listed above ===
+outcome_vars = [var for var_list in (
+    effort_vars, goal_vars, bully_vars, immigration_vars, mindset_vars, metacog_vars, citizenship_vars,
+    intercultural_vars, empathy_vars, cognitiveflex_vars, resilience_vars, fearfailure_vars, meaning_vars,
+    learning_vars,
+) for var in var_list]
+model_columns = ["read_time", "books_home", "country", "school_id", "gender"] + control_vars + outcome_vars
+model_columns += [WEIGHT_COL] + REPLICATE_COLS
+df = read_cleaned(CLEANED_2018, columns=list(dict.fromkeys(model_columns)))
+
+# === Rename if needed ===
+df = df.rename(columns={"read_time": "read_time_numeric"})
+
+# === Build midpoint column (safe if books_home already numeric/categorical) ===
+df["books_home_midpoint"] = pd.to_numeric(df.get("books_home"), errors="coerce").map(BOOKS_MIDPOINTS)
+
 def significance_stars(pval):
     if pval < 0.001:
         return '***'
@@ -201,8 +207,18 @@ SPLIT_BY_OECD = True
 
 USE_CLUSTER_SES = True
 USE_COUNTRY_FE = True
+# True = absorb school (within country) effects instead of country ones; needs USE_COUNTRY_FE
+USE_SCHOOL_FE = False
+FE_COLUMNS = ["country", "school_id"] if USE_SCHOOL_FE else ["country"]
+# Cluster column(s) under USE_CLUSTER_SES; two columns = two-way clustered SEs (Cameron–Gelbach–Miller).
+# The two columns must not be nested: school_id lies within country, so ["country", "school_id"]
+# would just be one-way country clustering and fe_ols rejects it
+CLUSTER_COLUMNS = "country"
 CHECK_NONLINEAR = False
 CHECK_VIF = False
+# True = add se_brr columns: Fay-BRR replicate SE of the W_FSTUWT-weighted fit (when the weights are loaded);
+# coef/se/stars always come from the FE-OLS fit printed by summary()
+USE_REPLICATE_SES = True
 
 INTERACT_READTIME_GENDER = False
 INTERACT_BOOKS_GENDER = False
@@ -239,53 +255,62 @@ if RUN_GENERAL_REGRESSION:
     for subset_label, subset_df in subsets:
         print(f"\n=== Running regressions for: {subset_label} ===")
 
-        for outcome in metacog_vars:
-            print(f"\n=== Regression for: {outcome} ===")
+        predictors = base_predictors + control_vars
+        rhs = ' + '.join(predictors + interaction_terms)
+        model_vars = list(predictors)
 
-            predictors = base_predictors + control_vars
-            formula_terms = predictors + interaction_terms
-            formula = f"{outcome} ~ {' + '.join(formula_terms)}"
-            model_vars = [outcome] + predictors
+        if USE_COUNTRY_FE:
+            model_vars += FE_COLUMNS
 
-            if USE_COUNTRY_FE:
-                formula += " + C(country)"
-                model_vars += ["country"]
+        if INTERACT_READTIME_GENDER:
+            model_vars += ["read_time_numeric", "gender"]
+        if INTERACT_BOOKS_GENDER:
+            model_vars += [BOOKS_VAR, "gender"]
+        if INTERACT_READTIME_BOOKS:
+            model_vars += ["read_time_numeric", BOOKS_VAR]
 
-            if INTERACT_READTIME_GENDER:
-                model_vars += ["read_time_numeric", "gender"]
-            if INTERACT_BOOKS_GENDER:
-                model_vars += [BOOKS_VAR, "gender"]
-            if INTERACT_READTIME_BOOKS:
-                model_vars += ["read_time_numeric", BOOKS_VAR]
+        # Drop missing rows on used vars (each outcome's own missing rows are dropped in the fit)
+        df_subset = subset_df[list(dict.fromkeys(model_vars + ["country", "school_id"] + metacog_vars))].dropna(subset=model_vars)
+        if df_subset["read_time_numeric"].nunique() < 2:
+            print(f"⚠️ Skipping {subset_label}: not enough variation")
+            continue
 
-            # Drop missing rows on used vars
-            df_model = subset_df[model_vars].copy().dropna()
-            print(f"📊 Sample size: {len(df_model)}")
+        # One batched fit for every outcome: outcomes missing for the same students share one design,
+        # with country (or school) effects absorbed by demeaning instead of ~80 dummy columns
+        fits = fe_ols_many(rhs, df_subset, metacog_vars, absorb=FE_COLUMNS if USE_COUNTRY_FE else None,
+                           cluster=CLUSTER_COLUMNS if USE_CLUSTER_SES else None)
 
-            if df_model["read_time_numeric"].nunique() < 2:
-                print(f"⚠️ Skipping {outcome}: not enough variation")
-                continue
+        for outcome in metacog_vars:
+            print(f"\n=== Regression for: {outcome} ===")
+            results_model = fits[outcome]
+            print(f"📊 Sample size: {results_model.nobs}")
+            print(results_model.summary())
 
-            model = smf.ols(formula=formula, data=df_model)
-            results_model = model.fit(
-                cov_type="cluster", cov_kwds={"groups": df_model["country"]}
-            ) if USE_CLUSTER_SES else model.fit()
+            fe_formula = f"{outcome} ~ {rhs}"
+            df_model = drop_unused_categories(df_subset.dropna(subset=[outcome]))
 
-            print(results_model.summary())
+            # Fay-BRR replicate SEs of the W_FSTUWT-weighted fit (country effects swept out)
+            survey = None
+            if USE_REPLICATE_SES and has_replicates(subset_df):
+                survey = replicate_ols(fe_formula, df_model.join(subset_df[[WEIGHT_COL] + REPLICATE_COLS]),
+                                       absorb=FE_COLUMNS if USE_COUNTRY_FE else None)
 
             # Capture key predictors (raw + display-scaled)
             for pred in ["read_time_numeric", BOOKS_VAR]:
                 if pred in results_model.params:
-                    pval = results_model.pvalues[pred]
+                    coef, se, pval = results_model.params[pred], results_model.bse[pred], results_model.pvalues[pred]
+                    se_brr = survey.loc[pred, "se"] if survey is not None else float("nan")
                     scale = BOOKS_DISPLAY_INC if pred == BOOKS_VAR else 1.0
                     results.append({
                         "subset": subset_label,
                         "outcome": outcome,
                         "predictor": ("read_time_numeric" if pred == "read_time_numeric" else BOOKS_DISPLAY_LABEL),
-                        "coef_raw": results_model.params[pred],
-                        "se_raw": results_model.bse[pred],
-                        "coef_disp": results_model.params[pred] * scale,
-                        "se_disp": results_model.bse[pred] * scale,
+                        "coef_raw": coef,
+                        "se_raw": se,
+                        "coef_disp": coef * scale,
+                        "se_disp": se * scale,
+                        "se_brr_raw": se_brr,
+                        "se_brr_disp": se_brr * scale,
                         "stars": significance_stars(pval)
                     })
 
@@ -293,8 +318,8 @@ if RUN_GENERAL_REGRESSION:
                 from statsmodels.stats.outliers_influence import variance_inflation_factor
                 from patsy import dmatrix
                 print("\n Checking VIFs...")
-                rhs = formula.split('~')[1].strip()
-                X_vif = dmatrix(rhs, data=df_model, return_type='dataframe')
+                vif_rhs = rhs + (" + C(country)" if USE_COUNTRY_FE else "")
+                X_vif = dmatrix(vif_rhs, data=df_model, return_type='dataframe')
                 vif_df = pd.DataFrame({
                     'Variable': X_vif.columns,
                     'VIF': [variance_inflation_factor(X_vif.values, i) for i in range(X_vif.shape[1])]
@@ -308,7 +333,7 @@ if RUN_GENERAL_REGRESSION:
     results_df["coef_str"] = results_df.apply(lambda r: f"{r['coef_disp']:.5f}{r['stars']}", axis=1)
     print("\n=== Summary Table of Predictors (display-scaled) ===")
     print(tabulate(
-        results_df[["subset", "outcome", "predictor", "coef_str", "se_disp"]],
+        results_df[["subset", "outcome", "predictor", "coef_str", "se_disp", "se_brr_disp"]],
         headers='keys', tablefmt='github', floatfmt=".5f"
     ))
 
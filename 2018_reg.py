@@ -1,25 +1,20 @@
 import os
 import pandas as pd
-import statsmodels.formula.api as smf
 from tabulate import tabulate
 # For optional regression summary formatting
 from statsmodels.iolib.summary2 import summary_col
+from pisa_store import read_cleaned, drop_unused_categories, CLEANED_2018
+from pisa_ols import fe_ols, fe_ols_many
+from pisa_survey import weighted_means, replicate_ols, pv_ols, has_replicates, WEIGHT_COL, REPLICATE_COLS, PV_READ
 
 
-# === 1. Load numeric-cleaned dataset ===
+# === 1. Paths (the dataset is loaded once the variable lists below are defined) ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-data_path = os.path.join(BASE_DIR, "../output/2018output/newpisa2018_cleaned_all_countries.csv")
-df = pd.read_csv(data_path)
 
-
-
-# === 2. Rename if needed
-df = df.rename(columns={"read_time": "read_time_numeric"})
-
-# === 3. Define variables ===
+# === 2. Define variables ===
 base_vars = ["read_time_numeric", "books_home", "country"]
 
-# === 4. Optional control variables (comment out if you do not want as a control for regression) ===
+# === 3. Optional control variables (comment out if you do not want as a control for regression) ===
 control_vars = [
     
     
@@ -125,10 +120,6 @@ control_vars = [
     
 ]
 
-# Coerce only numeric columns — exclude 'country'
-for col in ["read_time_numeric", "books_home"] + control_vars:
-    df[col] = pd.to_numeric(df[col], errors="coerce")
-
 # 6 The testable variables (predictors) that you can block out when running different things
 
 # === Effort and goal orientation ===
@@ -199,6 +190,22 @@ learning_vars = [
     "attitude_learning_activities"
 ]
 
+# === Load numeric-cleaned dataset: only the variables listed above ===
+# (plus the wealth/SES outcomes and books_home_cat used by the extra models below)
+outcome_vars = [var for var_list in (
+    effort_vars, goal_vars, bully_vars, immigration_vars, mindset_vars, metacog_vars, citizenship_vars,
+    intercultural_vars, empathy_vars, cognitiveflex_vars, resilience_vars, fearfailure_vars, meaning_vars,
+    learning_vars,
+) for var in var_list]
+model_columns = [
+    "read_time", "books_home", "books_home_cat", "country", "school_id", "gender",
+    "family_wealth_index", "socioeconomic_index",
+] + control_vars + outcome_vars + PV_READ + [WEIGHT_COL] + REPLICATE_COLS
+df = read_cleaned(CLEANED_2018, columns=list(dict.fromkeys(model_columns)))
+
+# === Rename if needed
+df = df.rename(columns={"read_time": "read_time_numeric"})
+
 def significance_stars(pval):
     if pval < 0.001:
         return '***'   # p < 0.001
@@ -229,8 +236,41 @@ SPLIT_BY_OECD = False  # False = all countries; True = OECD split
 # === Robustness settings ===
 USE_CLUSTER_SES = True
 USE_COUNTRY_FE = True
+# True = absorb school (within country) effects instead of country ones; needs USE_COUNTRY_FE
+USE_SCHOOL_FE = False
+FE_COLUMNS = ["country", "school_id"] if USE_SCHOOL_FE else ["country"]
+# Cluster column(s) under USE_CLUSTER_SES; two columns = two-way clustered SEs (Cameron–Gelbach–Miller).
+# The two columns must not be nested: school_id lies within country, so ["country", "school_id"]
+# would just be one-way country clustering and fe_ols rejects it
+CLUSTER_COLUMNS = "country"
 CHECK_NONLINEAR = False
 CHECK_VIF = False
+# True = add a se_brr column: Fay-BRR replicate SE of the W_FSTUWT-weighted fit (when the weights are loaded);
+# coef/se/stars always come from the FE-OLS fit printed by summary()
+USE_REPLICATE_SES = True
+
+
+def fit_model(formula, df_model, subset_df):
+    """OLS of formula (without C(country)): FE_COLUMNS absorbed by demeaning under USE_COUNTRY_FE,
+    clustered by CLUSTER_COLUMNS under USE_CLUSTER_SES."""
+    cluster_vars = [CLUSTER_COLUMNS] if isinstance(CLUSTER_COLUMNS, str) else CLUSTER_COLUMNS
+    data = df_model.join(subset_df[[col for col in cluster_vars if col not in df_model.columns]])
+    return fe_ols(formula, data, absorb=FE_COLUMNS if USE_COUNTRY_FE else None,
+                  cluster=CLUSTER_COLUMNS if USE_CLUSTER_SES else None)
+
+
+def survey_fit(formula, df_model, subset_df):
+    """Weighted fit with Fay-BRR SEs for formula (without C(country)), or None."""
+    if not USE_REPLICATE_SES or not has_replicates(subset_df):
+        return None
+    data = df_model.join(subset_df[[WEIGHT_COL] + REPLICATE_COLS])
+    return replicate_ols(formula, data, absorb=FE_COLUMNS if USE_COUNTRY_FE else None)
+
+
+def estimate(fit, survey, term):
+    """(coef, se, pvalue, se_brr) of one term: the FE-OLS fit, plus the Fay-BRR SE when there is a survey fit."""
+    se_brr = survey.loc[term, "se"] if survey is not None else float("nan")
+    return fit.params[term], fit.bse[term], fit.pvalues[term], se_brr
 
 # === Optional interaction switches ===
 INTERACT_READTIME_GENDER = False
@@ -269,47 +309,48 @@ if RUN_GENERAL_REGRESSION:
     for subset_label, subset_df in subsets:
         print(f"\n=== Running regressions for: {subset_label} ===")
 
-        for outcome in metacog_vars:
-            print(f"\n=== Regression for: {outcome} ===")
-
-            predictors = base_vars + control_vars
-            formula_terms = predictors + interaction_terms
-            formula = f"{outcome} ~ {' + '.join(formula_terms)}"
-            model_vars = [outcome] + predictors
-            if USE_COUNTRY_FE:
-                formula += " + C(country)"
-                model_vars += ["country"]
-
-            if INTERACT_READTIME_GENDER:
-                model_vars += ["read_time_numeric", "gender"]
-            if INTERACT_BOOKS_GENDER:
-                model_vars += ["books_home", "gender"]
-            if INTERACT_READTIME_BOOKS:
-                model_vars += ["read_time_numeric", "books_home"]
-
-            df_model = subset_df[model_vars].copy().dropna()
-            print(f"📊 Sample size: {len(df_model)}")
-
-            if df_model["read_time_numeric"].nunique() < 2:
-                print(f"⚠️ Skipping {outcome}: not enough variation")
-                continue
+        predictors = base_vars + control_vars
+        rhs = ' + '.join(predictors + interaction_terms)
+        model_vars = list(predictors)
+        if USE_COUNTRY_FE:
+            model_vars += FE_COLUMNS
+
+        if INTERACT_READTIME_GENDER:
+            model_vars += ["read_time_numeric", "gender"]
+        if INTERACT_BOOKS_GENDER:
+            model_vars += ["books_home", "gender"]
+        if INTERACT_READTIME_BOOKS:
+            model_vars += ["read_time_numeric", "books_home"]
+
+        df_subset = subset_df[list(dict.fromkeys(model_vars + ["country", "school_id"] + metacog_vars))].dropna(subset=model_vars)
+        if df_subset["read_time_numeric"].nunique() < 2:
+            print(f"⚠️ Skipping {subset_label}: not enough variation")
+            continue
 
-            model = smf.ols(formula=formula, data=df_model)
-            results_model = model.fit(
-                cov_type="cluster", cov_kwds={"groups": df_model["country"]}
-            ) if USE_CLUSTER_SES else model.fit()
+        # One batched fit for every outcome: outcomes missing for the same students share one design
+        fits = fe_ols_many(rhs, df_subset, metacog_vars, absorb=FE_COLUMNS if USE_COUNTRY_FE else None,
+                           cluster=CLUSTER_COLUMNS if USE_CLUSTER_SES else None)
 
+        for outcome in metacog_vars:
+            print(f"\n=== Regression for: {outcome} ===")
+            results_model = fits[outcome]
+            print(f"📊 Sample size: {results_model.nobs}")
             print(results_model.summary())
 
+            formula = f"{outcome} ~ {rhs}"
+            df_model = drop_unused_categories(df_subset.dropna(subset=[outcome]))
+            survey = survey_fit(formula, df_model, subset_df)
+
             for pred in ["read_time_numeric", "books_home"]:
                 if pred in results_model.params:
-                    pval = results_model.pvalues[pred]
+                    coef, se, pval, se_brr = estimate(results_model, survey, pred)
                     results.append({
                         "subset": subset_label,
                         "outcome": outcome,
                         "predictor": pred,
-                        "coef": results_model.params[pred],
-                        "se": results_model.bse[pred],
+                        "coef": coef,
+                        "se": se,
+                        "se_brr": se_brr,
                         "stars": significance_stars(pval)
                     })
 
@@ -317,8 +358,8 @@ if RUN_GENERAL_REGRESSION:
                 from statsmodels.stats.outliers_influence import variance_inflation_factor
                 from patsy import dmatrix
                 print("\n Checking VIFs...")
-                rhs = formula.split('~')[1].strip()
-                X_vif = dmatrix(rhs, data=df_model, return_type='dataframe')
+                vif_rhs = rhs + (" + C(country)" if USE_COUNTRY_FE else "")
+                X_vif = dmatrix(vif_rhs, data=df_model, return_type='dataframe')
                 vif_df = pd.DataFrame({
                     'Variable': X_vif.columns,
                     'VIF': [variance_inflation_factor(X_vif.values, i) for i in range(X_vif.shape[1])]
@@ -373,7 +414,7 @@ if RUN_GENERAL_REGRESSION:
 
     results_df["coef_str"] = results_df.apply(lambda row: f"{row['coef']:.3f}{row['stars']}", axis=1)
     print("\n=== Summary Table of Predictors ===")
-    print(tabulate(results_df[["subset", "outcome", "predictor", "coef_str", "se"]],
+    print(tabulate(results_df[["subset", "outcome", "predictor", "coef_str", "se", "se_brr"]],
                    headers='keys', tablefmt='github', floatfmt=".3f"))
 
     output_path = os.path.join(BASE_DIR, "../output/2018output/regression_results_summary.csv")
@@ -411,34 +452,32 @@ def run_wealth_to_books_model(df):
         formula = f"{outcome_var} ~ {' + '.join(predictors)}"
 
         if USE_COUNTRY_FE:
-            formula += " + C(country)"
-            model_vars = [outcome_var, predictor] + control_vars + ["country"]
+            model_vars = [outcome_var, predictor] + control_vars + FE_COLUMNS
         else:
             model_vars = [outcome_var, predictor] + control_vars
 
-        df_model = subset_df[model_vars].copy().dropna()
+        df_model = drop_unused_categories(subset_df[model_vars].copy().dropna())
         print(f"📊 Sample size: {len(df_model)}")
 
         if df_model[predictor].nunique() < 2:
             print("⚠️ Skipping: not enough variation in predictor")
             continue
 
-        model = smf.ols(formula=formula, data=df_model)
-        results_model = model.fit(
-            cov_type="cluster", cov_kwds={"groups": df_model["country"]}
-        ) if USE_CLUSTER_SES else model.fit()
+        results_model = fit_model(formula, df_model, subset_df)
 
         print(results_model.summary())
         full_models[subset_label] = results_model
+        survey = survey_fit(formula, df_model, subset_df)
 
         if predictor in results_model.params:
-            pval = results_model.pvalues[predictor]
+            coef, se, pval, se_brr = estimate(results_model, survey, predictor)
             results.append({
                 "subset": subset_label,
                 "outcome": outcome_var,
                 "predictor": predictor,
-                "coef": results_model.params[predictor],
-                "se": results_model.bse[predictor],
+                "coef": coef,
+                "se": se,
+                "se_brr": se_brr,
                 "stars": significance_stars(pval)
             })
 
@@ -473,33 +512,31 @@ def run_books_to_reading_model(df):
         formula = f"{outcome_var} ~ {' + '.join(predictors)}"
 
         if USE_COUNTRY_FE:
-            formula += " + C(country)"
-            model_vars = [outcome_var, predictor] + control_vars + ["country"]
+            model_vars = [outcome_var, predictor] + control_vars + FE_COLUMNS
         else:
             model_vars = [outcome_var, predictor] + control_vars
 
-        df_model = subset_df[model_vars].copy().dropna()
+        df_model = drop_unused_categories(subset_df[model_vars].copy().dropna())
         print(f"📊 Sample size: {len(df_model)}")
 
         if df_model[predictor].nunique() < 2:
             print("⚠️ Skipping: not enough variation in predictor")
             continue
 
-        model = smf.ols(formula=formula, data=df_model)
-        results_model = model.fit(
-            cov_type="cluster", cov_kwds={"groups": df_model["country"]}
-        ) if USE_CLUSTER_SES else model.fit()
+        results_model = fit_model(formula, df_model, subset_df)
 
         print(results_model.summary())
+        survey = survey_fit(formula, df_model, subset_df)
 
         if predictor in results_model.params:
-            pval = results_model.pvalues[predictor]
+            coef, se, pval, se_brr = estimate(results_model, survey, predictor)
             results.append({
                 "subset": subset_label,
                 "outcome": outcome_var,
                 "predictor": predictor,
-                "coef": results_model.params[predictor],
-                "se": results_model.bse[predictor],
+                "coef": coef,
+                "se": se,
+                "se_brr": se_brr,
                 "stars": significance_stars(pval)
             })
 
@@ -658,8 +695,7 @@ def run_books_to_ses_model(df):
 
         model_vars = [outcome_var, predictor] + control_vars
         if USE_COUNTRY_FE:
-            formula += " + C(country)"
-            model_vars += ["country"]
+            model_vars += FE_COLUMNS
 
         df_model = subset_df[model_vars].copy()
         # ensure numeric
@@ -667,34 +703,30 @@ def run_books_to_ses_model(df):
         df_model[predictor]   = pd.to_numeric(df_model[predictor],   errors="coerce")
         for c in control_vars:
             df_model[c] = pd.to_numeric(df_model[c], errors="coerce")
-        df_model = df_model.dropna()
+        df_model = drop_unused_categories(df_model.dropna())
         print(f"📊 Sample size: {len(df_model):,}")
 
         if df_model[predictor].nunique() < 2:
             print("⚠️ Skipping: not enough variation in books_home")
             continue
 
-        mod = smf.ols(formula=formula, data=df_model)
-        if USE_CLUSTER_SES:
-            # be robust if 'country' wasn't added to df_model
-            groups = df_model["country"] if "country" in df_model.columns else subset_df.loc[df_model.index, "country"]
-            fit = mod.fit(cov_type="cluster", cov_kwds={"groups": groups})
-        else:
-            fit = mod.fit()
+        fit = fit_model(formula, df_model, subset_df)
 
         print(fit.summary())
         full_models[subset_label] = fit
+        survey = survey_fit(formula, df_model, subset_df)
 
         # collect the lines you care about (like your other script)
         for pred in collect_predictors:
             if pred in fit.params:
-                pval = fit.pvalues[pred]
+                coef, se, pval, se_brr = estimate(fit, survey, pred)
                 results.append({
                     "subset": subset_label,
                     "outcome": outcome_var,
                     "predictor": pred,
-                    "coef": float(fit.params[pred]),
-                    "se": float(fit.bse[pred]),
+                    "coef": float(coef),
+                    "se": float(se),
+                    "se_brr": float(se_brr),
                     "stars": significance_stars(pval),
                 })
 
@@ -704,7 +736,7 @@ def run_books_to_ses_model(df):
         res_df["coef_str"] = res_df.apply(lambda r: f"{r['coef']:.3f}{r['stars']}", axis=1)
         from tabulate import tabulate
         print("\n=== Books ➜ SES: summary (coef★, SE) ===")
-        print(tabulate(res_df[["subset", "predictor", "coef_str", "se"]], headers="keys", tablefmt="github", floatfmt=".3f"))
+        print(tabulate(res_df[["subset", "predictor", "coef_str", "se", "se_brr"]], headers="keys", tablefmt="github", floatfmt=".3f"))
         out_csv = os.path.join(BASE_DIR, "../output/2018output/books_ses_results_summary.csv")
         os.makedirs(os.path.dirname(out_csv), exist_ok=True)
         res_df.to_csv(out_csv, index=False)
@@ -751,12 +783,10 @@ if RUN_BOOKS_SES_MODEL:
             )
 
         if "books_home_cat" in df.columns:
-            # Means + SE by category
-            g = (df.dropna(subset=["books_home_cat", SES_VAR])
-                   .groupby("books_home_cat")[SES_VAR]
-                   .agg(["mean","count","std"])
+            # Weighted means + SE by category (Fay-BRR when the replicate weights are loaded)
+            g = (weighted_means(df.dropna(subset=["books_home_cat"]), [SES_VAR], by=["books_home_cat"])
+                   .set_index("books_home_cat")
                    .reindex(book_labels))
-            g["se"] = g["std"] / (g["count"] ** 0.5)
 
             # Plot 1: 6-point mean plot (main text)
             plt.figure(figsize=(7, 5))
@@ -807,3 +837,58 @@ if RUN_BOOKS_SES_MODEL:
             plt.savefig("output/books_ses_scatter_with_means.png", dpi=300)
             print("✅ Saved scatter plot ➜ output/books_ses_scatter_with_means.png")
             plt.show()
+
+
+# ============================
+# Books / Reading Time ➜ Reading Achievement (PV1READ..PV10READ)
+# ============================
+# Each model is fitted for all 10 plausible values under the final and the 80
+# replicate weights in one pass (pisa_survey.pv_ols) and combined with Rubin's rules.
+
+RUN_ACHIEVEMENT_MODEL = True
+
+if RUN_ACHIEVEMENT_MODEL:
+    import time
+    subsets = [("All Countries", df)] if not SPLIT_BY_OECD else [
+        ("OECD", df[df["is_OECD"] == True]),
+        ("non-OECD", df[df["is_OECD"] == False]),
+    ]
+
+    achievement_results = []
+    for subset_label, subset_df in subsets:
+        print(f"\n📗 Reading achievement (10 PVs) regression for: {subset_label}")
+        predictors = base_vars + control_vars
+        rhs = " + ".join(predictors + interaction_terms)
+        model_vars = list(dict.fromkeys(
+            PV_READ + predictors + [v for term in interaction_terms for v in term.split(" * ")]
+            + (FE_COLUMNS if USE_COUNTRY_FE else [])
+        ))
+        weight_vars = [WEIGHT_COL] + REPLICATE_COLS if has_replicates(subset_df) else [WEIGHT_COL]
+        df_model = drop_unused_categories(subset_df[model_vars].dropna()).join(subset_df[weight_vars])
+        print(f"📊 Sample size: {len(df_model):,}")
+        if len(df_model) == 0:
+            print("⚠️ Skipping: no students with reading plausible values")
+            continue
+
+        start = time.perf_counter()
+        pv_fit = pv_ols(rhs, df_model, PV_READ, absorb=FE_COLUMNS if USE_COUNTRY_FE else None)
+        print(f"⏱️ {len(PV_READ)} PVs x {len(weight_vars)} weights fitted in {time.perf_counter() - start:.2f}s")
+        print(tabulate(pv_fit, headers="keys", tablefmt="github", floatfmt=".3f"))
+
+        for pred in ["read_time_numeric", "books_home"]:
+            if pred in pv_fit.index:
+                achievement_results.append({
+                    "subset": subset_label,
+                    "outcome": "reading (PV1READ..PV10READ)",
+                    "predictor": pred,
+                    "coef": pv_fit.loc[pred, "coef"],
+                    "se": pv_fit.loc[pred, "se"],
+                    "stars": significance_stars(pv_fit.loc[pred, "pvalue"]),
+                })
+
+    achievement_df = pd.DataFrame(achievement_results)
+    if not achievement_df.empty:
+        out_csv = os.path.join(BASE_DIR, "../output/2018output/reading_achievement_results_summary.csv")
+        os.makedirs(os.path.dirname(out_csv), exist_ok=True)
+        achievement_df.to_csv(out_csv, index=False)
+        print(f"✅ Saved reading achievement summary CSV ➜ {out_csv}")
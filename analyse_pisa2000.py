@@ -3,11 +3,13 @@ import os
 from tabulate import tabulate
 import matplotlib.pyplot as plt
 import seaborn as sns
+from pisa_survey import weighted_tables, weight_note
 
 # === 1. Load Cleaned Dataset ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 data_path = os.path.join(BASE_DIR, "../output/pisa2000_cleaned.csv")
 df = pd.read_csv(data_path)
+print(weight_note(df))
 
 # === 2. Minimal Cleaning ===
 df["books_home"] = pd.to_numeric(df["books_home"], errors="coerce")
@@ -38,10 +40,8 @@ print("\n📚 Books at Home (UK + US):")
 print(tabulate(ukus_df["books_home"].map(book_map).value_counts().reindex(category_order_books).reset_index().rename(columns={"index": "Books", "books_home": "Count"}), headers="keys", tablefmt="pretty"))
 
 # === 4b. Save Books at Home % Breakdown ===
-book_counts = df["books_home_label"].value_counts(normalize=True).reindex(category_order_books) * 100
-book_counts = book_counts.round(1)
-book_n = df["books_home_label"].value_counts().reindex(category_order_books)
-book_df = pd.DataFrame({"books_home": category_order_books, "percent": book_counts.values, "n": book_n.values})
+book_table = weighted_tables(df, ["books_home_label"], levels={"books_home_label": category_order_books})
+book_df = pd.DataFrame({"books_home": category_order_books, "percent": book_table["percent"].round(1).values, "n": book_table["n"].values})
 
 # Save CSV
 output_dir = os.path.join(BASE_DIR, "../output")
@@ -87,10 +87,8 @@ print("\n📖 Reading Time (UK + US):")
 print(tabulate(ukus_df["read_time_cat"].map(read_map).value_counts().reindex(category_order_read).reset_index().rename(columns={"index": "Read Time", "read_time_cat": "Count"}), headers="keys", tablefmt="pretty"))
 
 # === 5b. Bar Chart – Reading Time ===
-read_counts = df["read_time_label"].value_counts(normalize=True).reindex(category_order_read) * 100
-read_counts = read_counts.round(1)
-read_n = df["read_time_label"].value_counts().reindex(category_order_read)
-read_df = pd.DataFrame({"read_time": category_order_read, "percent": read_counts.values, "n": read_n.values})
+read_table = weighted_tables(df, ["read_time_label"], levels={"read_time_label": category_order_read})
+read_df = pd.DataFrame({"read_time": category_order_read, "percent": read_table["percent"].round(1).values, "n": read_table["n"].values})
 
 plt.figure(figsize=(8, 5))
 ax = sns.barplot(x="read_time", y="percent", data=read_df)
@@ -4,14 +4,22 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import matplotlib.ticker as mtick
 from tabulate import tabulate
+from pisa_store import read_cleaned, strip_strings, CLEANED_2018
+from pisa_survey import weighted_tables, weight_note, WEIGHT_COL, REPLICATE_COLS
 
-# === 1. Load cleaned 2018 dataset ===
+# === 1. Load cleaned 2018 dataset (only the variables used below) ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-data_path = os.path.join(BASE_DIR, "../output/2018output/oldpisa2018_cleaned_all_countries.csv")
-df = pd.read_csv(data_path)
+COLUMNS = [
+    "country", "books_home_cat", "read_time", "book_reading_format_label",
+    "att_1_read_only_if_have_to", "att_2_reading_hobby", "att_3_talk_books",
+    "att_4_reading_waste", "att_5_read_for_info",
+    WEIGHT_COL, *REPLICATE_COLS,
+]
+df = read_cleaned(CLEANED_2018, columns=COLUMNS)
+print(weight_note(df))
 
 # === Clean string columns ===
-df = df.apply(lambda col: col.str.strip() if col.dtype == "object" else col)
+df = strip_strings(df)
 
 output_dir = os.path.join(BASE_DIR, "../output")
 os.makedirs(output_dir, exist_ok=True)
@@ -20,9 +28,9 @@ os.makedirs(output_dir, exist_ok=True)
 book_order = ["0–10", "11–25", "26–100", "101–200", "201–500", "500+"]
 df["books_home_cat"] = pd.Categorical(df["books_home_cat"], categories=book_order, ordered=True)
 
-book_counts = df["books_home_cat"].value_counts().reindex(book_order)
-book_percents = (book_counts / book_counts.sum() * 100).round(1)
-book_df = pd.DataFrame({"Books": book_order, "Percent": book_percents.values, "n": book_counts.values})
+book_table = weighted_tables(df, ["books_home_cat"], levels={"books_home_cat": book_order})
+book_df = pd.DataFrame({"Books": book_order, "Percent": book_table["percent"].round(1).values,
+                        "SE": book_table["se"].round(2).values, "n": book_table["n"].values})
 
 print("\n📚 Books at Home (All Countries):")
 print(tabulate(book_df, headers="keys", tablefmt="pretty"))
@@ -30,7 +38,7 @@ book_df.to_csv(os.path.join(output_dir, "2018_books_all.csv"), index=False)
 
 plt.figure(figsize=(8, 5))
 ax = sns.barplot(x="Books", y="Percent", data=book_df)
-plt.title(f"PISA 2018 – Global Distribution of Books at Home (n = {int(book_counts.sum()):,})")
+plt.title(f"PISA 2018 – Global Distribution of Books at Home (n = {int(book_df['n'].sum()):,})")
 plt.ylabel("Percent of Students")
 plt.xlabel("Books at Home")
 plt.ylim(0, book_df["Percent"].max() + 8)
@@ -43,12 +51,12 @@ plt.close()
 # === 3. READING TIME ===
 read_map = {1.0: "None", 2.0: "<30 min", 3.0: "30–60 min", 4.0: "1–2 hrs", 5.0: ">2 hrs"}
 read_order = ["None", "<30 min", "30–60 min", "1–2 hrs", ">2 hrs"]
-df["read_time_cat"] = df["read_time"].replace(read_map)
+df["read_time_cat"] = df["read_time"].map(read_map)
 df["read_time_cat"] = pd.Categorical(df["read_time_cat"], categories=read_order, ordered=True)
 
-read_counts = df["read_time_cat"].value_counts().reindex(read_order)
-read_percents = (read_counts / read_counts.sum() * 100).round(1)
-read_df = pd.DataFrame({"Time": read_order, "Percent": read_percents.values, "n": read_counts.values})
+read_table = weighted_tables(df, ["read_time_cat"], levels={"read_time_cat": read_order})
+read_df = pd.DataFrame({"Time": read_order, "Percent": read_table["percent"].round(1).values,
+                        "SE": read_table["se"].round(2).values, "n": read_table["n"].values})
 
 print("\n📖 Reading Time (All Countries):")
 print(tabulate(read_df, headers="keys", tablefmt="pretty"))
@@ -56,7 +64,7 @@ read_df.to_csv(os.path.join(output_dir, "2018_readingtime_all.csv"), index=False
 
 plt.figure(figsize=(8, 5))
 ax = sns.barplot(x="Time", y="Percent", data=read_df)
-plt.title(f"PISA 2018 – Global Distribution of Reading Time (n = {int(read_counts.sum()):,})")
+plt.title(f"PISA 2018 – Global Distribution of Reading Time (n = {int(read_df['n'].sum()):,})")
 plt.ylabel("Percent of Students")
 plt.xlabel("Reading Time")
 plt.ylim(0, read_df["Percent"].max() + 8)
@@ -69,13 +77,13 @@ import matplotlib.ticker as mtick  # Add this import at the top of your script
 
 # === 4. BOOK READING FORMAT (Fixed) ===
 df["book_reading_format_label"] = df["book_reading_format_label"].astype(str).str.strip()
-format_counts = df["book_reading_format_label"].value_counts(dropna=True).sort_index()
-format_percents = (format_counts / format_counts.sum() * 100).round(1)
+format_table = weighted_tables(df, ["book_reading_format_label"])
 
 format_df = pd.DataFrame({
-    "Format": format_counts.index,
-    "Percent": format_percents.values,
-    "n": format_counts.values
+    "Format": format_table["value"].values,
+    "Percent": format_table["percent"].round(1).values,
+    "SE": format_table["se"].round(2).values,
+    "n": format_table["n"].values
 })
 
 print("\n📘 Book Format Preference (All Countries):")
@@ -86,7 +94,7 @@ format_df.to_csv(os.path.join(output_dir, "2018_format_all.csv"), index=False)
 plt.figure(figsize=(8, 5))
 ax = sns.barplot(x="Format", y="Percent", data=format_df, palette="muted")
 
-plt.title(f"PISA 2018 – Book Format Preference (n = {int(format_counts.sum()):,})", fontsize=13)
+plt.title(f"PISA 2018 – Book Format Preference (n = {int(format_df['n'].sum()):,})", fontsize=13)
 plt.ylabel("Percent of Students")
 plt.xlabel("Preferred Format")
 plt.xticks(rotation=15)
@@ -144,21 +152,24 @@ df["is_OECD"] = df["country"].isin(oecd_codes)
 # Filter out missing data
 df_bh = df.dropna(subset=["books_home_cat"])
 
+# Both groups' weighted distributions in one pass
+df_bh["Group"] = df_bh["is_OECD"].map({True: "OECD", False: "non-OECD"})
+group_table = weighted_tables(df_bh, ["books_home_cat"], by=["Group"], levels={"books_home_cat": book_order})
+
 # === Export CSVs and print summaries ===
-for group_label, group_df in [("OECD", df_bh[df_bh["is_OECD"]]), ("non-OECD", df_bh[~df_bh["is_OECD"]])]:
-    counts = group_df["books_home_cat"].value_counts().reindex(book_order)
-    percents = (counts / counts.sum() * 100).round(1)
-    summary = pd.DataFrame({"Books": book_order, "Percent": percents.values, "n": counts.values})
+for group_label in ["OECD", "non-OECD"]:
+    rows = group_table[group_table["Group"] == group_label]
+    summary = pd.DataFrame({"Books": book_order, "Percent": rows["percent"].round(1).values,
+                            "SE": rows["se"].round(2).values, "n": rows["n"].values})
     summary.to_csv(os.path.join(output_dir, f"2018_books_{group_label}.csv"), index=False)
     print(f"\n📚 {group_label} Books at Home:")
     print(tabulate(summary, headers="keys", tablefmt="pretty"))
 
 # === Combined bar chart ===
 comp_df = []
-for label, group_df in [("OECD", df_bh[df_bh["is_OECD"]]), ("non-OECD", df_bh[~df_bh["is_OECD"]])]:
-    vc = group_df["books_home_cat"].value_counts().reindex(book_order)
-    pct = (vc / vc.sum() * 100).round(1)
-    temp = pd.DataFrame({"Books": book_order, "Percent": pct.values, "Group": label})
+for label in ["OECD", "non-OECD"]:
+    rows = group_table[group_table["Group"] == label]
+    temp = pd.DataFrame({"Books": book_order, "Percent": rows["percent"].round(1).values, "Group": label})
     comp_df.append(temp)
 comp_df = pd.concat(comp_df)
 
@@ -3,6 +3,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 import seaborn as sns
+from pisa_store import read_cleaned, available_columns, CLEANED_2018
 
 # === 1. Setup ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,7 +11,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 file_paths = {
     2000: os.path.join(BASE_DIR, "../output/pisa2000_cleaned.csv"),
     2009: os.path.join(BASE_DIR, "../output/pisa2009_cleaned.csv"),
-    2018: os.path.join(BASE_DIR, "../output/2018output/newpisa2018_cleaned_all_countries.csv"),
+    2018: CLEANED_2018,
 }
 
 plot_dir = os.path.join(BASE_DIR, "../output/attitudes_trend/plots")
@@ -55,41 +56,47 @@ attitude_colors = [
     "#465759"   # Strongly Agree
 ]
 
-# === 4. Loop and plot ===
-for item_label, year_map in attitude_var_map.items():
-    df_plot = pd.DataFrame()
-    sample_sizes = {}
+RESPONSE_CODES = [1, 2, 3, 4]
 
-    print(f"\n📖 {item_label}")
-    for year, var in year_map.items():
-        path = file_paths.get(year)
-        if not os.path.exists(path):
-            print(f"{year}: ❌ File not found at {path}")
-            continue
-
-        df = pd.read_csv(path)
-        if var not in df.columns:
+# === 4. Load each year once (attitude columns only) ===
+frames = []
+for year, path in file_paths.items():
+    if not os.path.exists(path):
+        print(f"{year}: ❌ File not found at {path}")
+        continue
+
+    item_of_var = {year_map[year]: item for item, year_map in attitude_var_map.items() if year in year_map}
+    columns = available_columns(path)
+    for var in item_of_var:
+        if var not in columns:
             print(f"{year}: ❌ Column not found: {var}")
-            continue
-
-        series = df[var]
-        if year == 2009:
-            valid = series[series.isin([1, 2, 3, 4])]
-        else:
-            valid = series.dropna()
-            valid = valid[valid.isin([1, 2, 3, 4])]
-
-        vc = valid.value_counts(normalize=True).sort_index() * 100
-        vc = vc.round(2)
-        df_plot[year] = vc
-        sample_sizes[year] = len(valid)
-
-        response_str = ", ".join([f"{int(k)}: {v:.2f}%" for k, v in vc.items()])
-        print(f"{year}: [{response_str}], n = {len(valid):,}")
-
-    # Reformat for plotting
-    df_plot = df_plot.T[[1, 2, 3, 4]]
-    df_plot.index = df_plot.index.astype(int)
+    df = read_cleaned(path, columns=[var for var in item_of_var if var in columns])
+
+    # Long format: one row per (student, item) answer in 1–4
+    long = df.rename(columns=item_of_var).astype("float64").melt(var_name="item", value_name="response")
+    long = long[long["response"].isin(RESPONSE_CODES)].astype({"response": "int8"})
+    long["year"] = year
+    frames.append(long)
+
+# === 5. Response distributions of every item and year in one groupby ===
+counts = pd.concat(frames, ignore_index=True).groupby(["item", "year", "response"]).size()
+n_valid = counts.groupby(level=["item", "year"]).sum()
+shares = (counts / n_valid.reindex(counts.index.droplevel("response")).to_numpy() * 100).round(2)
+shares = shares.unstack("response").reindex(columns=RESPONSE_CODES)
+
+# === 6. Plot ===
+for item_label in attitude_var_map:
+    print(f"\n📖 {item_label}")
+    if item_label not in shares.index.get_level_values("item"):
+        print("❌ No data for this item")
+        continue
+
+    df_plot = shares.loc[item_label]
+    sample_sizes = n_valid.loc[item_label]
+    for year, vc in df_plot.iterrows():
+        response_str = ", ".join([f"{int(k)}: {v:.2f}%" for k, v in vc.dropna().items()])
+        print(f"{year}: [{response_str}], n = {sample_sizes[year]:,}")
+
     label_lines = [f"{year} (n = {sample_sizes[year]:,})" for year in df_plot.index]
 
     plt.figure(figsize=(10, 5))
@@ -99,7 +106,7 @@ for item_label, year_map in attitude_var_map.items():
     plt.title(f"{item_label} (2000–2018)")
     plt.ylabel("Percent of Students")
     plt.xlabel("Year")
-    plt.xticks([2000, 2009, 2018], label_lines)
+    plt.xticks(list(df_plot.index), label_lines)  # only the years with data
 
     min_val = df_plot.min().min()
     max_val = df_plot.max().max()
@@ -1,8 +1,8 @@
-import pandas as pd
 import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import matplotlib.ticker as mtick
+from pisa_panel import panel_shares
 
 # === 1. Setup ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,51 +10,13 @@ OUTPUT_DIR = os.path.join(BASE_DIR, "../output")
 YEARS = [2003, 2006, 2009, 2012, 2015, 2018, 2022]
 BOOK_ORDER = ["0–10", "11–25", "26–100", "101–200", "201–500", "500+"]
 
-label_map = {
-    "1–10": "0–10", "0–10": "0–10", "0-10": "0–10",
-    "11–25": "11–25", "11-25": "11–25",
-    "26–100": "26–100", "26-100": "26–100",
-    "51–100": "26–100", "51-100": "26–100",
-    "101–200": "101–200", "101-200": "101–200", "101–250": "101–200",
-    "201–500": "201–500", "201-500": "201–500", "251–500": "201–500",
-    "500+": "500+", "More than 500 books": "500+"
-}
+# === 2. Load books_home shares (one grouped scan of the harmonised panel, see build_panel.py) ===
+combined = panel_shares("books_home", years=YEARS)
+combined["percent"] = combined["percent"].round(1)
+combined = combined.sort_values(["books_home", "year"]).reset_index(drop=True)
 
-all_dfs = []
-
-# === 2. Load and clean ===
-for year in YEARS:
-    path = os.path.join(OUTPUT_DIR, f"pisa{year}_books_overall.csv")
-    if not os.path.exists(path):
-        print(f"Missing: {path}")
-        continue
-
-    df = pd.read_csv(path)
-
-    if "books_home" in df.columns:
-        label_col = "books_home"
-    elif "books_home_label" in df.columns:
-        label_col = "books_home_label"
-    elif "Books" in df.columns:
-        label_col = "Books"
-    elif "index" in df.columns:
-        label_col = "index"
-    else:
-        raise ValueError(f"No label column found for {year}")
-
-    if "Percent" in df.columns:
-        df = df.rename(columns={"Percent": "percent"})
-    elif "percent" not in df.columns:
-        raise ValueError(f"No percent column found for {year}")
-
-    df["books_home"] = df[label_col].astype(str).map(label_map).fillna(df[label_col])
-    df["books_home"] = pd.Categorical(df["books_home"], categories=BOOK_ORDER, ordered=True)
-    df = df[df["books_home"].notna() & df["percent"].notna()]
-    df["year"] = year
-
-    all_dfs.append(df[["year", "books_home", "percent"]])
-
-combined = pd.concat(all_dfs).sort_values(["books_home", "year"]).reset_index(drop=True)
+for year in sorted(set(YEARS) - set(combined["year"])):
+    print(f"Missing from panel: {year}")
 
 # === 3. Plot ===
 sns.set(style="whitegrid")
@@ -0,0 +1,26 @@
+import os
+import sys
+from pisa_panel import build_panel_year, PANEL_DIR, PANEL_YEARS
+
+print("✅ Script started...")
+
+# === Years to (re)build ===
+# None = every cycle; years given on the command line (python build_panel.py 2009 2018) win
+YEARS = None
+
+# === Read mode ===
+# True  = decode in a process pool (fast on many-core machines)
+# False = decode on one core
+PARALLEL_READ = True
+
+
+# === 1. Build each year's partitions from the raw questionnaire files ===
+# Text files are streamed from their archives; an archived 2015/2018/2022 .sav is
+# unpacked in full to $PISA_EXTRACT_DIR (default: the system temp dir) on a cache miss
+years = [int(arg) for arg in sys.argv[1:]] or YEARS or PANEL_YEARS
+
+for year in years:
+    df = build_panel_year(year, num_processes=None if PARALLEL_READ else 1)
+    print(f"📦 {year}: {len(df):,} students in {df['country'].nunique()} countries")
+
+print(f"📁 Panel written to: {os.path.normpath(PANEL_DIR)}")
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pyreadstat
+import pytest
+
+# Shared fixtures: small synthetic survey files written into pytest's tmp_path
+
+
+def write_sav(path, n_rows=1000, seed=0):
+    """Small student file: a country code, a labelled item with PISA missing codes and a continuous index."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "CNT": rng.choice(["GBR", "USA", "DEU"], n_rows),
+        "ST013Q01TA": rng.choice([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 95.0, 97.0, 98.0, 99.0], n_rows),
+        "ESCS": np.round(rng.normal(0, 1, n_rows), 4),
+        "W_FSTUWT": rng.uniform(1, 50, n_rows),
+    })
+    df.loc[::50, "ESCS"] = 97.0  # a valid value of a continuous index that looks like a missing code
+    pyreadstat.write_sav(
+        df, str(path),
+        variable_value_labels={"ST013Q01TA": {
+            1: "0-10 books", 2: "11-25 books", 3: "26-100 books", 4: "101-200 books", 5: "201-500 books",
+            6: "More than 500 books", 95: "Valid Skip", 97: "Not Applicable", 98: "Invalid", 99: "No Response",
+        }},
+        missing_ranges={"ESCS": [{"lo": 9995.0, "hi": 9999.0}]},
+    )
+    return path
+
+
+@pytest.fixture
+def sav_path(tmp_path):
+    return str(write_sav(tmp_path / "CY07_MSU_STU_QQQ.sav"))
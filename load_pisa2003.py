@@ -1,44 +1,29 @@
 import pandas as pd
 import os
 from tabulate import tabulate
+from pisa_codebook import read_cycle, value_labels, BOOK_ORDER
+
+# === Read mode ===
+# True  = decode row ranges in a process pool (fast on many-core machines)
+# False = decode on one core
+PARALLEL_READ = True
 
 # === 1. Load raw fixed-width text file ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 data_path = os.path.join(BASE_DIR, "../data/2003/2003_QU_data.txt")
 
 # COUNTRY (cols 1–3), ST19Q01 (col 96)
-colspecs = [(0, 3), (95, 96)]
-col_names = ["country", "books_raw"]
-df = pd.read_fwf(data_path, colspecs=colspecs, names=col_names)
-
-df["country"] = pd.to_numeric(df["country"], errors="coerce")
+df = read_cycle(2003, ["country", "books_raw"], data_path, num_processes=None if PARALLEL_READ else 1)
 
 # === 2. Country mapping ===
-country_map = {
-    8: "Albania", 32: "Argentina", 36: "Australia", 40: "Austria", 56: "Belgium",
-    76: "Brazil", 100: "Bulgaria", 124: "Canada", 152: "Chile", 203: "Czech Republic",
-    208: "Denmark", 246: "Finland", 250: "France", 276: "Germany", 300: "Greece",
-    344: "Hong Kong (China)", 348: "Hungary", 352: "Iceland", 360: "Indonesia",
-    372: "Ireland", 376: "Israel", 380: "Italy", 392: "Japan", 410: "Korea",
-    428: "Latvia", 438: "Liechtenstein", 442: "Luxembourg", 446: "Macao (China)",
-    484: "Mexico", 528: "Netherlands", 554: "New Zealand", 578: "Norway", 604: "Peru",
-    616: "Poland", 620: "Portugal", 643: "Russia", 703: "Slovakia",
-    724: "Spain", 752: "Sweden", 756: "Switzerland", 764: "Thailand", 788: "Tunisia",
-    792: "Turkey", 807: "Macedonia", 826: "United Kingdom", 840: "United States",
-    858: "Uruguay", 891: "Yugoslavia"
-}
-df["country_name"] = df["country"].map(country_map)
-
-# === 3. Convert and filter book responses ===
-df["books_raw"] = pd.to_numeric(df["books_raw"], errors="coerce")
+df["country_name"] = df["country"].map(value_labels(2003, "country"))
+
+# === 3. Filter book responses ===
 df = df[df["books_raw"].between(1, 6)]
 
 # === 4. Map to labels and enforce order ===
-book_map = {
-    1: "0–10", 2: "11–25", 3: "26–100", 4: "101–200", 5: "201–500", 6: "500+"
-}
-df["books_home"] = df["books_raw"].map(book_map)
-ordered_labels = ["0–10", "11–25", "26–100", "101–200", "201–500", "500+"]
+df["books_home"] = df["books_raw"].map(value_labels(2003, "books_raw"))
+ordered_labels = BOOK_ORDER
 df["books_home"] = pd.Categorical(df["books_home"], categories=ordered_labels, ordered=True)
 
 # === 5. Save cleaned data ===
@@ -3,46 +3,30 @@ import os
 from tabulate import tabulate
 import matplotlib.pyplot as plt
 import seaborn as sns
+from pisa_codebook import read_cycle, value_labels, BOOK_ORDER
+
+# === Read mode ===
+# True  = decode row ranges in a process pool (fast on many-core machines)
+# False = decode on one core
+PARALLEL_READ = True
 
 # === 1. Load fixed-width raw file ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 data_path = os.path.join(BASE_DIR, "../data/2006/2006_QU_data.txt")
 
 # Fixed-width columns: COUNTRY (18–21), ST15Q01 (89–90)
-colspecs = [(18, 21), (89, 90)]
-col_names = ["country", "books_raw"]
-df = pd.read_fwf(data_path, colspecs=colspecs, names=col_names)
+df = read_cycle(2006, ["country", "books_raw"], data_path, num_processes=None if PARALLEL_READ else 1)
 
 # === 2. Clean and map countries ===
-df["country"] = df["country"].astype(str).str.strip()
-
-country_map = {
-    "031": "Azerbaijan", "032": "Argentina", "036": "Australia", "040": "Austria",
-    "056": "Belgium", "076": "Brazil", "100": "Bulgaria", "124": "Canada",
-    "152": "Chile", "158": "Chinese Taipei", "170": "Colombia", "191": "Croatia",
-    "203": "Czech Republic", "208": "Denmark", "233": "Estonia", "246": "Finland",
-    "250": "France", "276": "Germany", "300": "Greece", "344": "Hong Kong-China",
-    "348": "Hungary", "352": "Iceland", "360": "Indonesia", "372": "Ireland",
-    "376": "Israel", "380": "Italy", "392": "Japan", "400": "Jordan", "410": "Korea",
-    "417": "Kyrgyzstan", "428": "Latvia", "438": "Liechtenstein", "440": "Lithuania",
-    "442": "Luxembourg", "446": "Macao-China", "484": "Mexico", "499": "Montenegro",
-    "528": "Netherlands", "554": "New Zealand", "578": "Norway", "616": "Poland",
-    "620": "Portugal", "634": "Qatar", "642": "Romania", "643": "Russian Federation",
-    "688": "Serbia", "703": "Slovak Republic", "705": "Slovenia", "724": "Spain",
-    "752": "Sweden", "756": "Switzerland", "764": "Thailand", "788": "Tunisia",
-    "792": "Turkey", "826": "United Kingdom", "840": "United States", "858": "Uruguay"
-}
-df["country_name"] = df["country"].map(country_map)
+df["country"] = df["country"].astype(str)
+
+df["country_name"] = df["country"].map(value_labels(2006, "country"))
 
 # === 3. Clean books and map to categories ===
-df["books_raw"] = pd.to_numeric(df["books_raw"], errors="coerce")
 df = df[df["books_raw"].between(1, 6)]
 
-book_map = {
-    1: "0–10", 2: "11–25", 3: "26–100", 4: "101–200", 5: "201–500", 6: "500+"
-}
-ordered_labels = ["0–10", "11–25", "26–100", "101–200", "201–500", "500+"]
-df["books_home"] = df["books_raw"].map(book_map)
+ordered_labels = BOOK_ORDER
+df["books_home"] = df["books_raw"].map(value_labels(2006, "books_raw"))
 df["books_home"] = pd.Categorical(df["books_home"], categories=ordered_labels, ordered=True)
 
 # === 4. Export cleaned file ===
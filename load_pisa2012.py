@@ -1,53 +1,30 @@
 import pandas as pd
 import os
+from pisa_codebook import read_cycle, value_labels, BOOK_ORDER
+from pisa_survey import weighted_tables, weighted_shares, weight_note
+
+# === Read mode ===
+# True  = decode row ranges in a process pool (fast on many-core machines)
+# False = decode on one core
+PARALLEL_READ = True
 
 # === 1. Load raw fixed-width text file ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 data_path = os.path.join(BASE_DIR, "../data/2012/2012_QU_data.txt")
 
 # Define column specs: CNT (3-char ISO), ST28Q01 (books at home)
-colspecs = [(0, 3), (124, 125)]
-col_names = ["CNT", "books_raw"]
-df = pd.read_fwf(data_path, colspecs=colspecs, names=col_names)
+df = read_cycle(2012, ["CNT", "books_raw"], data_path, num_processes=None if PARALLEL_READ else 1)
+print(weight_note(df))
 
-# === 2. Clean country codes and book responses ===
-df["CNT"] = df["CNT"].str.strip()
-df["books_raw"] = pd.to_numeric(df["books_raw"], errors="coerce")
+# === 2. Filter book responses ===
 df = df[df["books_raw"].between(1, 6)]
 
 # === 3. Map books_raw to categories ===
-book_map = {
-    1: "0–10", 2: "11–25", 3: "26–100",
-    4: "101–200", 5: "201–500", 6: "500+"
-}
-df["books_home"] = df["books_raw"].map(book_map)
-df["books_home"] = pd.Categorical(df["books_home"],
-    categories=["0–10", "11–25", "26–100", "101–200", "201–500", "500+"],
-    ordered=True
-)
+df["books_home"] = df["books_raw"].map(value_labels(2012, "books_raw"))
+df["books_home"] = pd.Categorical(df["books_home"], categories=BOOK_ORDER, ordered=True)
 
 # === 4. Country label map ===
-country_map = {
-    "ALB": "Albania", "ARG": "Argentina", "AUS": "Australia", "AUT": "Austria",
-    "BEL": "Belgium", "BRA": "Brazil", "BGR": "Bulgaria", "CAN": "Canada",
-    "CHL": "Chile", "QCN": "Shanghai-China", "TAP": "Chinese Taipei", "COL": "Colombia",
-    "CRI": "Costa Rica", "HRV": "Croatia", "CZE": "Czech Republic", "DNK": "Denmark",
-    "EST": "Estonia", "FIN": "Finland", "FRA": "France", "DEU": "Germany",
-    "GRC": "Greece", "HKG": "Hong Kong-China", "HUN": "Hungary", "ISL": "Iceland",
-    "IDN": "Indonesia", "IRL": "Ireland", "ISR": "Israel", "ITA": "Italy",
-    "JPN": "Japan", "JOR": "Jordan", "KAZ": "Kazakhstan", "KOR": "Korea",
-    "LVA": "Latvia", "LIE": "Liechtenstein", "LTU": "Lithuania", "LUX": "Luxembourg",
-    "MAC": "Macao-China", "MYS": "Malaysia", "MEX": "Mexico", "MNE": "Montenegro",
-    "NLD": "Netherlands", "NZL": "New Zealand", "NOR": "Norway", "QRS": "Perm (Russia)",
-    "PER": "Peru", "POL": "Poland", "PRT": "Portugal", "QAT": "Qatar",
-    "ROU": "Romania", "RUS": "Russian Federation", "SRB": "Serbia", "SGP": "Singapore",
-    "SVK": "Slovak Republic", "SVN": "Slovenia", "ESP": "Spain", "SWE": "Sweden",
-    "CHE": "Switzerland", "THA": "Thailand", "TUN": "Tunisia", "TUR": "Turkey",
-    "GBR": "United Kingdom", "ARE": "United Arab Emirates", "USA": "United States",
-    "URY": "Uruguay", "VNM": "Viet Nam", "QUA": "Florida (USA)",
-    "QUB": "Connecticut (USA)", "QUC": "Massachusetts (USA)"
-}
-df["country_name"] = df["CNT"].map(country_map)
+df["country_name"] = df["CNT"].map(value_labels(2012, "CNT"))
 
 # === 4a. Sample Size and Country Count Summary ===
 num_students = len(df)
@@ -68,22 +45,20 @@ print("\n🔢 Number of observations per country:")
 print(df["country_name"].value_counts())
 
 print("\n📚 Book category distribution by country:")
-dist = df.groupby("country_name")["books_home"].value_counts(normalize=True).unstack().round(3) * 100
+dist = weighted_shares(df, "books_home", levels=BOOK_ORDER, by=["country_name"]).round(1)
 print(dist.fillna(0).sort_index())
 
 print("\n📊 Overall distribution across UK + US only:")
 ukus = df[df["CNT"].isin(["GBR", "USA"])]
-print(ukus["books_home"].value_counts(sort=False))
-print(ukus["books_home"].value_counts(normalize=True, sort=False).round(3) * 100)
+ukus_table = weighted_tables(ukus, ["books_home"], levels={"books_home": BOOK_ORDER})
+print(ukus_table.set_index("value").rename_axis("books_home")[["n", "percent"]].round(1))
 
 print("\n🌍 Overall global distribution (all countries):")
-print(df["books_home"].value_counts(sort=False))
-print(df["books_home"].value_counts(normalize=True, sort=False).round(3) * 100)
+overall_table = weighted_tables(df, ["books_home"], levels={"books_home": BOOK_ORDER})
+print(overall_table.set_index("value").rename_axis("books_home")[["n", "percent"]].round(1))
 
 # === Save overall percentages to CSV ===
-overall_percent = df["books_home"].value_counts(normalize=True).sort_index() * 100
-overall_df = overall_percent.reset_index()
-overall_df.columns = ["books_home", "percent"]
+overall_df = pd.DataFrame({"books_home": BOOK_ORDER, "percent": overall_table["percent"].values})
 
 overall_df.to_csv(os.path.join(output_dir, "pisa2012_books_overall.csv"), index=False)
 print("📁 Saved overall book distribution to: pisa2012_books_overall.csv")
@@ -94,8 +69,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 
 # Prepare counts and percentages
-counts = df["books_home"].value_counts().reindex(overall_df["books_home"])
-overall_df["n"] = counts.values
+overall_df["n"] = overall_table["n"].values
 
 # Plot
 sns.set(style="whitegrid")
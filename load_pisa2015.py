@@ -1,14 +1,21 @@
 import pandas as pd
 import os
 from tabulate import tabulate
+from pisa_cache import read_spss_cached
+from pisa_survey import weighted_tables, weighted_shares, weight_note, WEIGHT_COL
 
 # === 1. Load SPSS file ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 data_path = os.path.join(BASE_DIR, "../data/2015/PUF_SPSS_COMBINED_CMB_STU_QQQ/CY6_MS_CMB_STU_QQQ.sav")
 
-columns = ["ST013Q01TA", "CNTRYID"]
-df = pd.read_spss(data_path, usecols=columns)
+columns = ["ST013Q01TA", "CNTRYID", WEIGHT_COL]
+# Served from the Parquet extract cache when the file and columns are unchanged;
+# otherwise decoded across all cores. Labels applied as in pd.read_spss
+# From a .zip/.gz/.zst, a miss unpacks the whole .sav to $PISA_EXTRACT_DIR (default:
+# the system temp dir) for the read, so that disk needs room for the unpacked file
+df = read_spss_cached(data_path, columns=columns, apply_value_formats=True)
 df = df.rename(columns={"ST013Q01TA": "books_home", "CNTRYID": "country"})
+print(weight_note(df))
 
 # === 2. Clean and map books ===
 label_map = {
@@ -40,9 +47,11 @@ os.makedirs(output_dir, exist_ok=True)
 df.to_csv(os.path.join(output_dir, "pisa2015_amountbooks.csv"), index=False)
 
 # === 4. All-country distribution ===
-all_counts = df["books_home_label"].value_counts(sort=False)
-all_percent = (all_counts / all_counts.sum() * 100).round(1)
-all_df = pd.DataFrame({"Count": all_counts, "Percent": all_percent})
+all_table = weighted_tables(df, ["books_home_label"], levels={"books_home_label": ordered_labels})
+all_df = pd.DataFrame(
+    {"Count": all_table["n"].values, "Percent": all_table["percent"].round(1).values},
+    index=pd.Index(ordered_labels, name="books_home_label"),
+)
 
 print("\n📘 Book Distribution (All Countries):")
 print(tabulate(all_df, headers="keys", tablefmt="pretty"))
@@ -54,23 +63,20 @@ print(tabulate(df["country"].value_counts().head(20).reset_index().rename(column
 
 # === 6. UK + US subset ===
 ukus = df[df["country"].isin(["United Kingdom", "United States"])]
-ukus_counts = ukus["books_home_label"].value_counts(sort=False)
-ukus_percent = (ukus_counts / ukus_counts.sum() * 100).round(1)
-ukus_df = pd.DataFrame({"Count": ukus_counts, "Percent": ukus_percent})
+ukus_table = weighted_tables(ukus, ["books_home_label"], levels={"books_home_label": ordered_labels})
+ukus_df = pd.DataFrame(
+    {"Count": ukus_table["n"].values, "Percent": ukus_table["percent"].round(1).values},
+    index=pd.Index(ordered_labels, name="books_home_label"),
+)
 
-print(f"\n✅ UK + US valid samples: {ukus_counts.sum():,}")
+print(f"\n✅ UK + US valid samples: {ukus_df['Count'].sum():,}")
 print("\n📘 Book Distribution (UK + US):")
 print(tabulate(ukus_df, headers="keys", tablefmt="pretty"))
 ukus_df.to_csv(os.path.join(output_dir, "pisa2015_books_ukus.csv"))
 
 # === 7. Per-Country Breakdown ===
-country_summary = (
-    df.groupby("country")["books_home_label"]
-    .value_counts(normalize=True)
-    .unstack(fill_value=0)
-    .loc[:, ordered_labels]
-    * 100
-).round(1)
+# Every country's weighted distribution from one bincount
+country_summary = weighted_shares(df, "books_home_label", levels=ordered_labels, by=["country"]).fillna(0).round(1)
 
 print("\n📚 Percentage of Students per Book Category by Country:")
 print(tabulate(country_summary, headers="keys", tablefmt="pretty"))
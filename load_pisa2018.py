@@ -1,8 +1,22 @@
 import os
 import pandas as pd
+from pisa_cache import read_spss_cached
+from pisa_spss import missing_rules, scrub_block, isin_filter
+from pisa_store import write_cleaned, label_column, shrink_dtypes, CLEANED_2018
+from pisa_survey import WEIGHT_COL, REPLICATE_COLS, PV_READ
 
 print("✅ Script started...")
 
+# === Read mode ===
+# True  = decode row blocks in a process pool (fast on many-core machines)
+# False = stream row blocks on one core (lowest memory on small batch nodes)
+PARALLEL_READ = True
+
+# === Country filter ===
+# None = every country; e.g. ["GBR", "USA"] for UK/US-only runs.
+# Applied to each raw row block before cleaning.
+COUNTRIES = None
+
 
 # === 1. Load PISA 2018 SPSS .sav file ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,7 +27,7 @@ columns = [
     # indepedent/categorical variables
 
 
-    "CNT", "ST013Q01TA", "ST175Q01IA",
+    "CNT", "CNTSCHID", "ST013Q01TA", "ST175Q01IA",
 
     # reading attitudes
 
@@ -167,15 +181,17 @@ columns = [
     "SOCONPA",
 
 ]
-
-df = pd.read_spss(data_path, usecols=columns, convert_categoricals=False)
-
+# Final student weight + the 80 Fay-BRR replicate weights (weighted percentages and SEs, see pisa_survey)
+columns += [WEIGHT_COL] + REPLICATE_COLS
+# Reading achievement: the 10 plausible values (combined with Rubin's rules, see pisa_survey.pv_ols)
+columns += PV_READ
 
 # === 2. Rename columns ===
-df = df.rename(columns={
+rename_map = {
     
 
     "CNT": "country",
+    "CNTSCHID": "school_id",
 
     # READING VARIABLES
     "ST013Q01TA": "books_home",
@@ -366,30 +382,34 @@ df = df.rename(columns={
     "GFOFAIL": "general_fear_of_failure",
     "EUDMO": "eudaemonia_meaning_in_life",
 
-})
-
-# === 6. Clean known special codes ===
+}
 
-# General codes used across many categorical/ordinal items
-GENERIC_SPECIAL_CODES = [97, 98, 99, -9, -8, -5, -4, -3, -2, -1]
+# === 6. Missing codes from the SPSS metadata ===
+# Declared user-missing ranges plus codes labelled "Valid Skip", "Not Applicable",
+# "Invalid" or "No Response", per variable (continuous indices keep values like 97)
+missing_codes = {
+    rename_map.get(col, col): ranges
+    for col, ranges in missing_rules(data_path, columns).items()
+}
 
-# PISA-specific extended numeric missing codes
-EXTENDED_SPECIAL_CODES = [9999995, 9999997, 9999998, 9999999]
+# Variable-specific codes that are always treated as missing
+missing_codes.setdefault("immigration_status", []).extend((code, code) for code in [5, 7, 8, 9])
+missing_codes.setdefault("ecec_duration", []).extend((code, code) for code in [95, 97, 98, 99])
 
-# Combine all known codes into a master list
-ALL_SPECIAL_CODES = GENERIC_SPECIAL_CODES + EXTENDED_SPECIAL_CODES
 
-# Apply to all numeric-looking columns
-for col in df.columns:
-    if df[col].dtype in ["float64", "int64"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-        df[col] = df[col].where(~df[col].isin(ALL_SPECIAL_CODES))
+def clean_block(block):
+    block = block.rename(columns=rename_map)
+    return scrub_block(block, missing_codes)
 
-df["immigration_status"] = pd.to_numeric(df["immigration_status"], errors="coerce")
-df["immigration_status"] = df["immigration_status"].where(~df["immigration_status"].isin([5, 7, 8, 9]))
 
-df["ecec_duration"] = pd.to_numeric(df["ecec_duration"], errors="coerce")
-df["ecec_duration"] = df["ecec_duration"].where(~df["ecec_duration"].isin([95, 97, 98, 99]))
+# === 7. Read the file in row blocks: rename, clean and downcast each block ===
+# Raw columns come from the Parquet extract cache after the first run
+# From a .zip/.gz/.zst, a miss unpacks the whole .sav to $PISA_EXTRACT_DIR (default:
+# the system temp dir) for the read, so that disk needs room for the unpacked file
+df = read_spss_cached(
+    data_path, columns=columns, num_processes=None if PARALLEL_READ else 1, clean=clean_block,
+    row_filter=isin_filter("CNT", COUNTRIES) if COUNTRIES else None,
+)
 
 
 # === 3. Recode books_home ===
@@ -397,7 +417,7 @@ books_map = {
     1: "0–10", 2: "11–25", 3: "26–100",
     4: "101–200", 5: "201–500", 6: "500+"
 }
-df["books_home_cat"] = df["books_home"].replace(books_map)
+df["books_home_cat"] = label_column(df["books_home"], books_map, ordered=True)
 
 # === 4. Recode reading time ===
 read_map = {
@@ -407,7 +427,7 @@ read_map = {
     4: "1–2 hrs",
     5: ">2 hrs"
 }
-df["read_time_cat"] = df["read_time"].replace(read_map)
+df["read_time_cat"] = label_column(df["read_time"], read_map, ordered=True)
 
 
 ecec_duration_map = {
@@ -422,7 +442,7 @@ ecec_duration_map = {
     8: "8+ years"
 }
 
-df["ecec_duration_label"] = df["ecec_duration"].replace(ecec_duration_map)
+df["ecec_duration_label"] = label_column(df["ecec_duration"], ecec_duration_map)
 
 
 # === Value labels for cooperation vars ===
@@ -433,7 +453,7 @@ coop_map = {
     4: "Extremely true"
 }
 for var in ["coop_value_cooperation", "coop_students_cooperate", "coop_coop_important", "coop_encouraged"]:
-    df[var + "_label"] = df[var].map(coop_map)
+    df[var + "_label"] = label_column(df[var], coop_map)
 
     # === ST207: Anti-Bullying Attitudes Label Mapping ===
 bully_map = {
@@ -447,21 +467,21 @@ for var in [
     "bullied_irritates_me", "bullied_help_good", "bullied_wrong_join",
     "bullied_feel_bad", "bullied_like_defender"
 ]:
-    df[var + "_label"] = df[var].map(bully_map)
+    df[var + "_label"] = label_column(df[var], bully_map)
 
 effort_scale = {
     1: "1", 2: "2", 3: "3", 4: "4", 5: "5",
     6: "6", 7: "7", 8: "8", 9: "9", 10: "10"
 }
-df["effort_actual_cat"] = df["effort_actual"].map(effort_scale)
-df["effort_ideal_cat"] = df["effort_ideal"].map(effort_scale)
+df["effort_actual_cat"] = label_column(df["effort_actual"], effort_scale)
+df["effort_ideal_cat"] = label_column(df["effort_ideal"], effort_scale)
 
 immigration_map = {
     1: "Native",
     2: "Second-Generation",
     3: "First-Generation"
 }
-df["immigration_status_label"] = df["immigration_status"].replace(immigration_map)
+df["immigration_status_label"] = label_column(df["immigration_status"], immigration_map)
 
 
 
@@ -476,9 +496,9 @@ isced_parent_map = {
     6: "ISCED 5A/6"
 }
 
-df["mother_edu_label"] = df["mother_edu"].replace(isced_parent_map)
-df["father_edu_label"] = df["father_edu"].replace(isced_parent_map)
-df["highest_parent_edu_label"] = df["highest_parent_edu"].replace(isced_parent_map)
+df["mother_edu_label"] = label_column(df["mother_edu"], isced_parent_map)
+df["father_edu_label"] = label_column(df["father_edu"], isced_parent_map)
+df["highest_parent_edu_label"] = label_column(df["highest_parent_edu"], isced_parent_map)
 
 
 # === ST221: Global Competence Learning at School (Yes/No) ===
@@ -499,7 +519,7 @@ for var in [
     "learn_different_perspectives",
     "learn_crosscultural_communication"
 ]:
-    df[var + "_label"] = df[var].map(yes_no_map)
+    df[var + "_label"] = label_column(df[var], yes_no_map)
 
 
 # === ST177: Number of Languages Spoken (Student, Mother, Father) ===
@@ -511,7 +531,7 @@ lang_map = {
 }
 
 for var in ["lang_student", "lang_mother", "lang_father"]:
-    df[var + "_label"] = df[var].map(lang_map)
+    df[var + "_label"] = label_column(df[var], lang_map)
 
 # === ST204: Attitudes Toward Immigrants ===
 imm_map = {
@@ -525,7 +545,7 @@ for var in [
     "imm_edu_rights", "imm_voting_rights", 
     "imm_customs", "imm_equal_rights"
 ]:
-    df[var + "_label"] = df[var].map(imm_map)
+    df[var + "_label"] = label_column(df[var], imm_map)
 
 
 # === ST220: Contact with People from Other Countries ===
@@ -537,7 +557,7 @@ contact_map = {
 for var in [
     "contact_family", "contact_school", "contact_neighbourhood", "contact_friends"
 ]:
-    df[var + "_label"] = df[var].map(contact_map)
+    df[var + "_label"] = label_column(df[var], contact_map)
 
 
 
@@ -550,7 +570,7 @@ isced_map = {
     5: "ISCED 5 (Tertiary)"
 }
 
-df["student_edu_level_label"] = df["student_edu_level"].replace(isced_map)
+df["student_edu_level_label"] = label_column(df["student_edu_level"], isced_map)
 
 
 # === ST184: Fixed Mindset Statement ===
@@ -561,7 +581,7 @@ mindset_map = {
     4: "Strongly agree"
 }
 
-df["fixed_mindset_label"] = df["fixed_mindset"].map(mindset_map)
+df["fixed_mindset_label"] = label_column(df["fixed_mindset"], mindset_map)
 
 
 # === ST168: Book Reading Format Preference ===
@@ -572,7 +592,7 @@ format_map = {
     4: "Equal paper and digital"
 }
 
-df["book_reading_format_label"] = df["book_reading_format"].map(format_map)
+df["book_reading_format_label"] = label_column(df["book_reading_format"], format_map)
 
 
 # reading preference
@@ -593,7 +613,7 @@ reading_pref_vars = [
 ]
 
 for col in reading_pref_vars:
-    df[col + "_label"] = df[col].map(reading_pref_map)
+    df[col + "_label"] = label_column(df[col], reading_pref_map)
 
 # === ST158: Taught Digital Literacy Skills at School (Yes/No) ===
 yes_no_map = {
@@ -606,7 +626,7 @@ for var in [
     "diglit_privacy_awareness", "diglit_search_snippet",
     "diglit_subjectivity_bias", "diglit_detect_phishing"
 ]:
-    df[var + "_label"] = df[var].map(yes_no_map)
+    df[var + "_label"] = label_column(df[var], yes_no_map)
 
 # === ST150: Frequency of Reading Text Types in School ===
 frequency_map = {
@@ -620,14 +640,14 @@ for var in [
     "school_text_diagrams_maps", "school_text_fiction",
     "school_text_tables_graphs", "school_text_digital_links"
 ]:
-    df[var + "_label"] = df[var].map(frequency_map)
+    df[var + "_label"] = label_column(df[var], frequency_map)
 
 # === ST004: Gender ===
 gender_map = {
     1: "Female",
     2: "Male"
 }
-df["gender_label"] = df["gender"].map(gender_map)
+df["gender_label"] = label_column(df["gender"], gender_map)
 
 # how many devices
 
@@ -638,11 +658,14 @@ device_count_map = {
     4: "Three or more"
 }
 
-df["home_smartphones_label"] = df["home_smartphones"].map(device_count_map)
-df["home_computers_label"] = df["home_computers"].map(device_count_map)
+df["home_smartphones_label"] = label_column(df["home_smartphones"], device_count_map)
+df["home_computers_label"] = label_column(df["home_computers"], device_count_map)
 
 
-# ===#  7. Export cleaned data ===
-output_path = os.path.join(BASE_DIR, "../output/2018output/newpisa2018_cleaned_all_countries.csv")
-df.to_csv(output_path, index=False)
+# ===#  7. Export cleaned data (typed Parquet, read back with pisa_store.read_cleaned) ===
+# Complete Likert items -> int8, items with missing answers and WLE indices (ESCS,
+# WEALTH) -> float32 (NaN), country -> category;
+# weights and plausible values stay float64 for the replicate SEs and Rubin's rules
+df = shrink_dtypes(df, exact=[col for col in [WEIGHT_COL] + REPLICATE_COLS + PV_READ if col in df.columns])
+output_path = write_cleaned(df, CLEANED_2018)
 print(f"📁 Exported cleaned file to: {output_path}")
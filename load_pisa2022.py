@@ -3,15 +3,22 @@ import os
 from tabulate import tabulate
 import matplotlib.pyplot as plt
 import seaborn as sns
+from pisa_cache import read_spss_cached
+from pisa_survey import weighted_tables, weight_note, WEIGHT_COL
 
 # === 1. Define file path ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 data_path = os.path.join(BASE_DIR, "../data/2022/CY08MSP_STU_QQQ.SAV")
 
 # === 2. Load relevant columns: Country + Books at home ===
-columns = ["CNT", "ST255Q01JA"]
-df = pd.read_spss(data_path, usecols=columns)
+columns = ["CNT", "ST255Q01JA", WEIGHT_COL]
+# Served from the Parquet extract cache when the file and columns are unchanged;
+# otherwise decoded across all cores. Labels applied as in pd.read_spss
+# From a .zip/.gz/.zst, a miss unpacks the whole .sav to $PISA_EXTRACT_DIR (default:
+# the system temp dir) for the read, so that disk needs room for the unpacked file
+df = read_spss_cached(data_path, columns=columns, apply_value_formats=True)
 df = df.rename(columns={"CNT": "country", "ST255Q01JA": "books_home"})
+print(weight_note(df))
 
 # === 3. Map book categories and enforce sort order ===
 book_map = {
@@ -38,9 +45,11 @@ print(f"🌍 Number of countries in dataset: {num_countries}")
 
 
 # === 4. Summary: All Countries (corrected sorting)
-all_counts = df["books_home_label"].value_counts().reindex(category_order)
-all_percent = df["books_home_label"].value_counts(normalize=True).reindex(category_order) * 100
-all_df = pd.DataFrame({"Count": all_counts, "Percent": all_percent.round(1)})
+all_table = weighted_tables(df, ["books_home_label"], levels={"books_home_label": category_order})
+all_df = pd.DataFrame(
+    {"Count": all_table["n"].values, "Percent": all_table["percent"].round(1).values},
+    index=pd.Index(category_order, name="books_home_label"),
+)
 
 print("\n📘 All Countries Book Distribution:")
 print(tabulate(all_df, headers="keys", tablefmt="pretty"))
@@ -54,9 +63,11 @@ print(tabulate(top_countries.reset_index().rename(columns={"index": "country", "
 ukus = df[df["country"].isin(["United Kingdom", "United States"])]
 print(f"\n✅ UK + US valid samples: {len(ukus):,}")
 
-ukus_counts = ukus["books_home_label"].value_counts().reindex(category_order)
-ukus_percent = ukus["books_home_label"].value_counts(normalize=True).reindex(category_order) * 100
-ukus_df = pd.DataFrame({"Count": ukus_counts, "Percent": ukus_percent.round(1)})
+ukus_table = weighted_tables(ukus, ["books_home_label"], levels={"books_home_label": category_order})
+ukus_df = pd.DataFrame(
+    {"Count": ukus_table["n"].values, "Percent": ukus_table["percent"].round(1).values},
+    index=pd.Index(category_order, name="books_home_label"),
+)
 
 print("\n📘 UK + US Book Distribution:")
 print(tabulate(ukus_df, headers="keys", tablefmt="pretty"))
@@ -91,7 +102,7 @@ plt.show()
 # === 9. Save Books Overall Percentages Only ===
 books_overall = pd.DataFrame({
     "books_home": category_order,
-    "percent": all_percent.round(1)
+    "percent": all_df["Percent"].values
 })
 books_overall.to_csv(os.path.join(BASE_DIR, "../output/pisa2022_books_overall.csv"), index=False)
 print("✅ Saved books overall percentages to: pisa2022_books_overall.csv")
@@ -0,0 +1,188 @@
+import os
+import shutil
+import zipfile
+import gzip
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from pisa_fwf import records_from_buffer, iter_stream_records, field_mask, decode_fields
+
+# Read the raw PISA files straight from the OECD archives.
+#
+# A loader keeps pointing at the unpacked file name (e.g. ../data/2009/2009_QU_data.txt).
+# When that file is not on disk, find_source() looks for an archive holding it:
+# <file>.gz, <file>.zst, or a .zip named after the file or its folder.
+# Uncompressed zip members are memory-mapped in place (random access);
+# everything else is streamed through bounded buffers. The one exception is a
+# .sav: pyreadstat needs a seekable file, so an archived .sav is unpacked in full
+# to EXTRACT_ENV (default: the system temp dir) for the length of the read.
+
+ARCHIVE_SUFFIXES = (".zip", ".gz", ".zst")
+COPY_BYTES = 16 * 1024 ** 2
+# SPSS dictionaries (variables, labels, missing ranges) sit at the start of a .sav
+HEADER_BYTES = 64 * 1024 ** 2
+# Directory for unpacked copies of archived files; needs as much free space as the unpacked file
+EXTRACT_ENV = "PISA_EXTRACT_DIR"
+
+
+# === 1. Locating sources ===
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def find_source(path):
+    """Return (file on disk, zip member or None) for a raw data path."""
+    if os.path.exists(path):
+        if path.lower().endswith(".zip"):
+            return path, zip_member(path)
+        return path, None
+
+    for suffix in (".gz", ".zst"):
+        if os.path.exists(path + suffix):
+            return path + suffix, None
+
+    for zip_path in (path + ".zip", os.path.splitext(path)[0] + ".zip", os.path.dirname(path) + ".zip"):
+        if os.path.exists(zip_path):
+            return zip_path, zip_member(zip_path, os.path.basename(path))
+
+    raise FileNotFoundError(f"{path} (no unpacked file or .zip/.gz/.zst archive found)")
+
+
+def zip_member(zip_path, name=None):
+    """Member of zip_path matching name (case-insensitive), or its only file when name is None."""
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [info.filename for info in archive.infolist() if not info.is_dir()]
+    if name is None:
+        if len(members) != 1:
+            raise ValueError(f"{zip_path} holds {len(members)} files; name the one to read")
+        return members[0]
+
+    for member in members:
+        if os.path.basename(member).lower() == name.lower():
+            return member
+    raise FileNotFoundError(f"{name} not found in {zip_path}")
+
+
+# === 2. Random access + streams ===
+def stored_member_span(zip_path, member):
+    """(byte offset, size) of an uncompressed zip member, or None if it is compressed."""
+    with zipfile.ZipFile(zip_path) as archive:
+        info = archive.getinfo(member)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    # Data starts after the 30-byte local file header, the file name and the extra field
+    with open(zip_path, "rb") as f:
+        f.seek(info.header_offset)
+        header = f.read(30)
+    name_len = int.from_bytes(header[26:28], "little")
+    extra_len = int.from_bytes(header[28:30], "little")
+    return info.header_offset + 30 + name_len + extra_len, info.file_size
+
+
+@contextmanager
+def open_stream(source, member=None):
+    """Binary stream of the decompressed data."""
+    if source.lower().endswith(".zip"):
+        with zipfile.ZipFile(source) as archive, archive.open(member) as stream:
+            yield stream
+    elif source.lower().endswith(".gz"):
+        with gzip.open(source, "rb") as stream:
+            yield stream
+    elif source.lower().endswith(".zst"):
+        import zstandard  # only needed for .zst archives
+        with open(source, "rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw) as stream:
+            yield stream
+    else:
+        with open(source, "rb") as stream:
+            yield stream
+
+
+def unpacked_size(source, member=None):
+    """Uncompressed size of an archived file in bytes, or None when the archive does not record it."""
+    if source.lower().endswith(".zip"):
+        with zipfile.ZipFile(source) as archive:
+            return archive.getinfo(member).file_size
+    if source.lower().endswith(".zst"):
+        import zstandard  # only needed for .zst archives
+        with open(source, "rb") as f:
+            size = zstandard.frame_content_size(f.read(18))
+        return size if size >= 0 else None
+    return None  # gzip only stores the size modulo 4 GB
+
+
+def extract_dir():
+    return os.environ.get(EXTRACT_ENV) or tempfile.gettempdir()
+
+
+@contextmanager
+def local_copy(path, dest_dir=None, max_bytes=None):
+    """Yield a plain file path for path, extracting from an archive into a temp file if needed.
+
+    The copy goes to dest_dir (default: $PISA_EXTRACT_DIR, else the system temp
+    dir), which must have room for the whole unpacked file; this is checked up
+    front where the archive records the size. max_bytes limits the extract to
+    the start of the file (enough for SPSS metadata). The copy is removed afterwards.
+    """
+    source, member = find_source(path)
+    if not is_archive(source):
+        yield source
+        return
+
+    dest_dir = dest_dir or extract_dir()
+    needed = unpacked_size(source, member)
+    if needed is not None and max_bytes is not None:
+        needed = min(needed, max_bytes)
+    free = shutil.disk_usage(dest_dir).free
+    if needed is not None and needed > free:
+        raise OSError(
+            f"Unpacking {member or os.path.basename(path)} from {source} needs {needed / 1024 ** 3:,.1f} GB "
+            f"in {dest_dir} but only {free / 1024 ** 3:,.1f} GB is free; set {EXTRACT_ENV} to a larger disk"
+        )
+    if max_bytes is None:
+        size = "" if needed is None else f" ({needed / 1024 ** 3:,.1f} GB)"
+        print(f"📦 Unpacking {os.path.basename(path)}{size} from {os.path.basename(source)} to {dest_dir}")
+
+    fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir=dest_dir)
+    try:
+        with os.fdopen(fd, "wb") as out, open_stream(source, member) as stream:
+            if max_bytes is None:
+                shutil.copyfileobj(stream, out, COPY_BYTES)
+            else:
+                out.write(stream.read(max_bytes))
+        yield tmp_path
+    finally:
+        os.remove(tmp_path)
+
+
+# === 3. Fixed-width reader ===
+def read_fixed_width_archive(source, member, colspecs, names, dtypes=None, decimals=None,
+                             filter_span=None, filter_values=None):
+    """Decode fields of a fixed-width file held in an archive.
+
+    filter_span/filter_values keep only rows whose raw bytes in that span match
+    (e.g. the country field), checked on each buffer before decoding.
+    """
+    name = f"{source}:{member}" if member else source
+
+    def decode(records):
+        if filter_span is not None:
+            records = records[field_mask(records, *filter_span, filter_values)]
+        return decode_fields(records, colspecs, names, dtypes, decimals)
+
+    span = stored_member_span(source, member) if member else None
+    if span is not None:
+        offset, size = span
+        if size == 0:
+            return decode(np.empty((0, 0), dtype=np.uint8))
+        buf = np.memmap(source, dtype=np.uint8, mode="r", offset=offset, shape=(size,))
+        return decode(records_from_buffer(buf, name))
+
+    with open_stream(source, member) as stream:
+        frames = [decode(records) for records in iter_stream_records(stream, name)]
+    if not frames:
+        return decode(np.empty((0, 0), dtype=np.uint8))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pisa_spss import CHUNKSIZE, iter_spss_blocks, finish_block
+from pisa_archive import find_source
+
+# Content-addressed Parquet cache for raw SPSS extracts.
+#
+# An entry holds the raw decoded columns of one source file, keyed by the
+# SHA-256 of the file contents, the decoded variable set and the read options.
+# Any later request whose columns are a subset of a cached entry is served from
+# Parquet, reading only the requested columns. Cleaning still runs per row
+# group, so a cleaning change never needs a cache flush.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "../cache/extracts")
+MAX_CACHE_BYTES = 20 * 1024 ** 3  # 20 GB, least recently used entries evicted first
+
+HASH_INDEX = "source_hashes.json"
+HASH_BLOCK = 8 * 1024 ** 2
+
+
+# === 1. Source hashing ===
+def file_hash(path, cache_dir=CACHE_DIR):
+    """SHA-256 of a file, memoised on (size, mtime) so unchanged files are hashed once."""
+    stat = os.stat(path)
+    index_path = os.path.join(cache_dir, HASH_INDEX)
+    index = _load_json(index_path, {})
+
+    key = os.path.abspath(path)
+    known = index.get(key)
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+
+    index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+    _save_json(index_path, index)
+    return index[key]["sha256"]
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"  # loaders may run concurrently (run_pipeline.py)
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# === 2. Entry lookup ===
+def entry_key(source_hash, columns, options):
+    payload = json.dumps([source_hash, sorted(columns), options], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def find_entry(source_hash, columns, options, cache_dir=CACHE_DIR):
+    """Return the Parquet path of a cached entry covering all requested columns, or None."""
+    wanted = set(columns)
+    for name in sorted(os.listdir(cache_dir)):
+        if not name.endswith(".json") or name == HASH_INDEX:
+            continue
+        manifest = _load_json(os.path.join(cache_dir, name), {})
+        if (
+            manifest.get("source_hash") == source_hash
+            and manifest.get("options") == options
+            and wanted <= set(manifest.get("columns", []))
+        ):
+            parquet_path = os.path.join(cache_dir, name[:-len(".json")] + ".parquet")
+            if os.path.exists(parquet_path):
+                return parquet_path
+    return None
+
+
+# === 3. Entry writing + eviction ===
+def write_entry(path, columns, options, source_hash, num_processes=None, cache_dir=CACHE_DIR):
+    """Decode the raw columns block by block straight into a new Parquet entry."""
+    key = entry_key(source_hash, columns, options)
+    parquet_path = os.path.join(cache_dir, key + ".parquet")
+    tmp_path = parquet_path + ".tmp"
+
+    writer = None
+    stored_columns = []
+    try:
+        blocks = iter_spss_blocks(path, columns, CHUNKSIZE, num_processes, downcast=False, **options)
+        for block in blocks:
+            if writer is None:
+                table = pa.Table.from_pandas(block, preserve_index=False)
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+                stored_columns = list(block.columns)
+            else:
+                table = pa.Table.from_pandas(block, schema=writer.schema, preserve_index=False)
+            writer.write_table(table, row_group_size=CHUNKSIZE)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(tmp_path)
+        raise
+
+    if writer is None:
+        return None
+    writer.close()
+
+    os.replace(tmp_path, parquet_path)
+    _save_json(os.path.join(cache_dir, key + ".json"), {
+        "source": os.path.abspath(path),
+        "source_hash": source_hash,
+        "columns": stored_columns,
+        "options": options,
+    })
+    return parquet_path
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, keep=None, cache_dir=CACHE_DIR):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".parquet"):
+            parquet_path = os.path.join(cache_dir, name)
+            stat = os.stat(parquet_path)
+            entries.append((stat.st_mtime, stat.st_size, parquet_path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, parquet_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if parquet_path == keep:
+            continue
+        os.remove(parquet_path)
+        manifest_path = parquet_path[:-len(".parquet")] + ".json"
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        total -= size
+        print(f"🧹 Evicted cached extract: {os.path.basename(parquet_path)}")
+
+
+# === 4. Cached reader ===
+def read_entry(parquet_path, columns, clean=None, downcast=True, row_filter=None):
+    parquet_file = pq.ParquetFile(parquet_path)
+    wanted = set(columns)
+    stored = [name for name in parquet_file.schema_arrow.names if name in wanted]
+
+    blocks = [
+        finish_block(batch.to_pandas(), clean, downcast, row_filter)
+        for batch in parquet_file.iter_batches(batch_size=CHUNKSIZE, columns=stored)
+    ]
+    if not blocks:
+        return pd.DataFrame(columns=stored)
+    return pd.concat(blocks, ignore_index=True)
+
+
+def read_spss_cached(path, columns, num_processes=None, clean=None, downcast=True, row_filter=None,
+                     cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, **read_kwargs):
+    """Read columns of a .sav file through the Parquet cache.
+
+    On a miss the raw columns are decoded (in a process pool unless
+    num_processes=1; archived files are unpacked first) and stored; hits read
+    only the requested columns. The
+    entry always holds every row; row_filter, clean and downcast run per row
+    block exactly as in pisa_spss.read_spss_chunked.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    # Archived files are keyed by the archive's hash, so cache hits never unpack them
+    source, member = find_source(path)
+    source_hash = file_hash(source, cache_dir) + (f":{member}" if member else "")
+    options = dict(sorted(read_kwargs.items()))
+
+    parquet_path = find_entry(source_hash, columns, options, cache_dir)
+    if parquet_path is None:
+        print(f"🗄️ Cache miss for {os.path.basename(path)} – decoding {len(columns)} columns")
+        parquet_path = write_entry(path, columns, options, source_hash, num_processes, cache_dir)
+        if parquet_path is None:
+            return pd.DataFrame(columns=columns)
+        evict(max_bytes, keep=parquet_path, cache_dir=cache_dir)
+    else:
+        print(f"⚡ Cache hit for {os.path.basename(path)}")
+        os.utime(parquet_path)  # mark as recently used
+
+    return read_entry(parquet_path, columns, clean, downcast, row_filter)
@@ -0,0 +1,253 @@
+import os
+import numpy as np
+
+from pisa_fwf import (
+    read_fixed_width, decode_row_ranges, field_index, index_row_ranges, index_layout, merge_spans
+)
+from pisa_archive import find_source, is_archive, read_fixed_width_archive
+
+# Per-cycle codebook for the fixed-width *_QU_data.txt questionnaire files.
+#
+# Each variable records its byte offset (0-indexed), width, decode type, the
+# codes that mean missing, and an optional value-label set. Loaders ask for
+# variables by name and read_cycle() fetches only those byte ranges in one pass.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DATA_FILES = {
+    2000: os.path.join(BASE_DIR, "../data/2000/2000_QU_data.txt"),
+    2003: os.path.join(BASE_DIR, "../data/2003/2003_QU_data.txt"),
+    2006: os.path.join(BASE_DIR, "../data/2006/2006_QU_data.txt"),
+    2009: os.path.join(BASE_DIR, "../data/2009/2009_QU_data.txt"),
+    2012: os.path.join(BASE_DIR, "../data/2012/2012_QU_data.txt"),
+}
+
+# Variable holding the country code in each cycle (used for read-time filtering)
+COUNTRY_FIELDS = {2000: "country", 2003: "country", 2006: "country", 2009: "country", 2012: "CNT"}
+
+# Single-digit questionnaire items: 7 = N/A, 8 = invalid, 9 = missing
+ITEM_MISSING = [7, 8, 9]
+
+
+# === 1. Value-label sets ===
+BOOK_LABELS = {
+    1: "0–10", 2: "11–25", 3: "26–100", 4: "101–200", 5: "201–500", 6: "500+"
+}
+BOOK_ORDER = ["0–10", "11–25", "26–100", "101–200", "201–500", "500+"]
+
+COUNTRY_LABELS_2000 = {
+    8: "Albania", 32: "Argentina", 36: "Australia", 40: "Austria", 56: "Belgium",
+    76: "Brazil", 100: "Bulgaria", 124: "Canada", 152: "Chile", 203: "Czech Republic",
+    208: "Denmark", 246: "Finland", 250: "France", 276: "Germany", 300: "Greece",
+    344: "Hong Kong", 348: "Hungary", 352: "Iceland", 360: "Indonesia", 372: "Ireland",
+    376: "Israel", 380: "Italy", 392: "Japan", 410: "Korea, Republic of", 428: "Latvia",
+    438: "Liechtenstein", 442: "Luxembourg", 484: "Mexico", 528: "Netherlands",
+    554: "New Zealand", 578: "Norway", 604: "Peru", 616: "Poland", 620: "Portugal",
+    642: "Romania", 643: "Russian Federation", 724: "Spain", 752: "Sweden",
+    756: "Switzerland", 764: "Thailand", 807: "Macedonia", 826: "United Kingdom",
+    840: "United States"
+}
+
+COUNTRY_LABELS_2003 = {
+    8: "Albania", 32: "Argentina", 36: "Australia", 40: "Austria", 56: "Belgium",
+    76: "Brazil", 100: "Bulgaria", 124: "Canada", 152: "Chile", 203: "Czech Republic",
+    208: "Denmark", 246: "Finland", 250: "France", 276: "Germany", 300: "Greece",
+    344: "Hong Kong (China)", 348: "Hungary", 352: "Iceland", 360: "Indonesia",
+    372: "Ireland", 376: "Israel", 380: "Italy", 392: "Japan", 410: "Korea",
+    428: "Latvia", 438: "Liechtenstein", 442: "Luxembourg", 446: "Macao (China)",
+    484: "Mexico", 528: "Netherlands", 554: "New Zealand", 578: "Norway", 604: "Peru",
+    616: "Poland", 620: "Portugal", 643: "Russia", 703: "Slovakia",
+    724: "Spain", 752: "Sweden", 756: "Switzerland", 764: "Thailand", 788: "Tunisia",
+    792: "Turkey", 807: "Macedonia", 826: "United Kingdom", 840: "United States",
+    858: "Uruguay", 891: "Yugoslavia"
+}
+
+COUNTRY_LABELS_2006 = {
+    "031": "Azerbaijan", "032": "Argentina", "036": "Australia", "040": "Austria",
+    "056": "Belgium", "076": "Brazil", "100": "Bulgaria", "124": "Canada",
+    "152": "Chile", "158": "Chinese Taipei", "170": "Colombia", "191": "Croatia",
+    "203": "Czech Republic", "208": "Denmark", "233": "Estonia", "246": "Finland",
+    "250": "France", "276": "Germany", "300": "Greece", "344": "Hong Kong-China",
+    "348": "Hungary", "352": "Iceland", "360": "Indonesia", "372": "Ireland",
+    "376": "Israel", "380": "Italy", "392": "Japan", "400": "Jordan", "410": "Korea",
+    "417": "Kyrgyzstan", "428": "Latvia", "438": "Liechtenstein", "440": "Lithuania",
+    "442": "Luxembourg", "446": "Macao-China", "484": "Mexico", "499": "Montenegro",
+    "528": "Netherlands", "554": "New Zealand", "578": "Norway", "616": "Poland",
+    "620": "Portugal", "634": "Qatar", "642": "Romania", "643": "Russian Federation",
+    "688": "Serbia", "703": "Slovak Republic", "705": "Slovenia", "724": "Spain",
+    "752": "Sweden", "756": "Switzerland", "764": "Thailand", "788": "Tunisia",
+    "792": "Turkey", "826": "United Kingdom", "840": "United States", "858": "Uruguay"
+}
+
+COUNTRY_LABELS_2009 = {
+    "826": "United Kingdom", "840": "United States"
+}
+
+COUNTRY_LABELS_2012 = {
+    "ALB": "Albania", "ARG": "Argentina", "AUS": "Australia", "AUT": "Austria",
+    "BEL": "Belgium", "BRA": "Brazil", "BGR": "Bulgaria", "CAN": "Canada",
+    "CHL": "Chile", "QCN": "Shanghai-China", "TAP": "Chinese Taipei", "COL": "Colombia",
+    "CRI": "Costa Rica", "HRV": "Croatia", "CZE": "Czech Republic", "DNK": "Denmark",
+    "EST": "Estonia", "FIN": "Finland", "FRA": "France", "DEU": "Germany",
+    "GRC": "Greece", "HKG": "Hong Kong-China", "HUN": "Hungary", "ISL": "Iceland",
+    "IDN": "Indonesia", "IRL": "Ireland", "ISR": "Israel", "ITA": "Italy",
+    "JPN": "Japan", "JOR": "Jordan", "KAZ": "Kazakhstan", "KOR": "Korea",
+    "LVA": "Latvia", "LIE": "Liechtenstein", "LTU": "Lithuania", "LUX": "Luxembourg",
+    "MAC": "Macao-China", "MYS": "Malaysia", "MEX": "Mexico", "MNE": "Montenegro",
+    "NLD": "Netherlands", "NZL": "New Zealand", "NOR": "Norway", "QRS": "Perm (Russia)",
+    "PER": "Peru", "POL": "Poland", "PRT": "Portugal", "QAT": "Qatar",
+    "ROU": "Romania", "RUS": "Russian Federation", "SRB": "Serbia", "SGP": "Singapore",
+    "SVK": "Slovak Republic", "SVN": "Slovenia", "ESP": "Spain", "SWE": "Sweden",
+    "CHE": "Switzerland", "THA": "Thailand", "TUN": "Tunisia", "TUR": "Turkey",
+    "GBR": "United Kingdom", "ARE": "United Arab Emirates", "USA": "United States",
+    "URY": "Uruguay", "VNM": "Viet Nam", "QUA": "Florida (USA)",
+    "QUB": "Connecticut (USA)", "QUC": "Massachusetts (USA)"
+}
+
+# === 2. Variable registry ===
+def field(source, start, width, dtype="int", missing=(), labels=None, decimals=0):
+    return {
+        "source": source,
+        "start": start,
+        "width": width,
+        "dtype": dtype,
+        "decimals": decimals,
+        "missing": list(missing),
+        "labels": labels,
+    }
+
+
+def item_block(names, sources, start, missing=ITEM_MISSING):
+    """One-byte items stored side by side, e.g. ST35Q01–ST35Q09."""
+    return {
+        name: field(source, start + i, 1, missing=missing)
+        for i, (name, source) in enumerate(zip(names, sources))
+    }
+
+
+ATTITUDE_NAMES_2000 = [
+    "att_q35a_only_if_have_to", "att_q35b_reading_hobby", "att_q35c_talk_books",
+    "att_q35d_hard_to_finish", "att_q35e_feel_happy", "att_q35f_waste_of_time",
+    "att_q35g_enjoy_library", "att_q35h_read_for_info", "att_q35i_few_minutes_only"
+]
+ATTITUDE_NAMES_2009 = [f"att_q35{chr(97 + i)}" for i in range(11)]  # a–k
+READ_TYPE_NAMES_2009 = [
+    f"voluntary_read_{label}"
+    for label in ["magazines", "comics", "fiction", "nonfiction", "newspapers"]
+]
+
+CODEBOOKS = {
+    2000: {
+        "country": field("COUNTRY", 1, 3, labels=COUNTRY_LABELS_2000),
+        "read_time_cat": field("ST34Q01", 164, 1, missing=ITEM_MISSING),
+        **item_block(ATTITUDE_NAMES_2000, [f"ST35Q0{i + 1}" for i in range(9)], 165),
+        "books_home": field("ST37Q01", 180, 2, missing=[97, 98, 99]),
+        "hisei": field("HISEI", 315, 2, dtype="float"),
+        "wealth": field("WEALTH", 335, 5, dtype="float"),
+
+        "mother_sec_edu": field("ST12Q01", 50, 1, missing=ITEM_MISSING),
+        "father_sec_edu": field("ST13Q01", 51, 1, missing=ITEM_MISSING),
+        "mother_ter_edu": field("ST14Q01", 52, 1, missing=ITEM_MISSING),
+        "father_ter_edu": field("ST15Q01", 53, 1, missing=ITEM_MISSING),
+
+        **item_block(
+            ["cultural_movies", "cultural_art", "cultural_pop", "cultural_opera", "cultural_theatre"],
+            [f"ST18Q0{i + 1}" for i in range(5)], 58,
+        ),
+        **item_block(
+            ["discuss_politics", "discuss_books", "listens_classics"],
+            [f"ST19Q0{i + 1}" for i in range(3)], 64,
+        ),
+    },
+    2003: {
+        "country": field("COUNTRY", 0, 3, labels=COUNTRY_LABELS_2003),
+        "books_raw": field("ST19Q01", 95, 1, labels=BOOK_LABELS),
+    },
+    2006: {
+        "country": field("COUNTRY", 18, 3, dtype="str", labels=COUNTRY_LABELS_2006),
+        "books_raw": field("ST15Q01", 89, 1, labels=BOOK_LABELS),
+    },
+    2009: {
+        "country": field("COUNTRY", 3, 3, dtype="str", labels=COUNTRY_LABELS_2009),
+        "books_raw": field("ST22Q01", 114, 1, labels=BOOK_LABELS),
+        "read_time_cat": field("ST23Q01", 115, 1, missing=ITEM_MISSING),
+        **item_block(ATTITUDE_NAMES_2009, [f"ST24Q{i + 1:02d}" for i in range(11)], 116),
+        **item_block(READ_TYPE_NAMES_2009, [f"ST25Q0{i + 1}" for i in range(5)], 127),
+        "hisei": field("HISEI", 408, 8, dtype="float"),
+        "wealth": field("WEALTH", 700, 9, dtype="float"),
+    },
+    2012: {
+        "CNT": field("CNT", 0, 3, dtype="str", labels=COUNTRY_LABELS_2012),
+        "books_raw": field("ST28Q01", 124, 1, labels=BOOK_LABELS),
+    },
+}
+
+
+# === 3. Lookups ===
+def get_fields(year, names):
+    if year not in CODEBOOKS:
+        raise KeyError(f"No codebook registered for PISA {year}")
+    codebook = CODEBOOKS[year]
+    unknown = [name for name in names if name not in codebook]
+    if unknown:
+        raise KeyError(f"Variables not in the PISA {year} codebook: {unknown}")
+    return {name: codebook[name] for name in names}
+
+
+def value_labels(year, name):
+    return get_fields(year, [name])[name]["labels"]
+
+
+def plan_read(year, names):
+    """Return (colspecs, dtypes, spans) for one merged read of the requested variables."""
+    fields = get_fields(year, names)
+    colspecs = [(f["start"], f["start"] + f["width"]) for f in fields.values()]
+    dtypes = {name: f["dtype"] for name, f in fields.items()}
+    spans = [(start, end) for start, end, _ in merge_spans(colspecs)]
+    return colspecs, dtypes, spans
+
+
+# === 4. Reader ===
+def read_cycle(year, names, path=None, apply_missing=True, countries=None, num_processes=1):
+    """Read the named variables for one cycle and blank out their missing codes.
+
+    countries     – optional country codes; only those countries' blocks of the
+                    file are read, located through the per-country byte index
+    num_processes – decode row ranges in a process pool (None = default_processes())
+
+    If the .txt file has not been unpacked, it is read from its .zip/.gz/.zst
+    archive (see pisa_archive) on one core.
+    """
+    source, member = find_source(path or DATA_FILES[year])
+    colspecs, dtypes, _ = plan_read(year, names)
+    decimals = {name: f["decimals"] for name, f in get_fields(year, names).items() if f["decimals"]}
+    if is_archive(source):
+        country = get_fields(year, [COUNTRY_FIELDS[year]])[COUNTRY_FIELDS[year]]
+        span = (country["start"], country["start"] + country["width"]) if countries is not None else None
+        df = read_fixed_width_archive(source, member, colspecs, list(names), dtypes, decimals, span, countries)
+    elif countries is None:
+        df = read_fixed_width(source, colspecs, list(names), dtypes, decimals, num_processes)
+    else:
+        index = country_index(year, source)
+        df = decode_row_ranges(source, index_layout(index), index_row_ranges(index, countries),
+                               colspecs, list(names), dtypes, decimals, num_processes)
+
+    if apply_missing:
+        df = apply_missing_codes(df, year)
+    return df
+
+
+def country_index(year, path=None):
+    """Byte range of each country's block in a cycle's file (sidecar built on first use)."""
+    country = get_fields(year, [COUNTRY_FIELDS[year]])[COUNTRY_FIELDS[year]]
+    return field_index(path or DATA_FILES[year], country["start"], country["start"] + country["width"])
+
+
+def apply_missing_codes(df, year):
+    codebook = CODEBOOKS[year]
+    for col in df.columns:
+        missing = codebook.get(col, {}).get("missing")
+        if missing:
+            values = df[col].to_numpy()
+            df[col] = np.where(np.isin(values, missing), np.nan, values)
+    return df
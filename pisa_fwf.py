@@ -0,0 +1,398 @@
+import os
+import json
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Shared fixed-width reader for the PISA *_QU_data.txt questionnaire files.
+#
+# The files use one fixed-length record per student, so the whole file can be
+# viewed as a 2-D (rows x record length) byte array and every field becomes a
+# column slice of that array. This replaces repeated pd.read_fwf passes.
+
+NEWLINE = ord("\n")
+CARRIAGE_RETURN = ord("\r")
+BLANK = ord(" ")
+ZERO = ord("0")
+POINT = ord(".")
+MINUS = ord("-")
+PLUS = ord("+")
+
+# Rows per task when decoding in a process pool
+CHUNK_ROWS = 100_000
+# Pool size for num_processes=None; run_pipeline.py sets it so that stages running
+# side by side share the cores instead of each starting one worker per core
+PROCESSES_ENV = "PISA_NUM_PROCESSES"
+
+# Bytes decompressed at a time when streaming from an archive
+STREAM_BYTES = 64 * 1024 ** 2
+
+
+def default_processes():
+    """Pool size for num_processes=None: $PISA_NUM_PROCESSES when set, else every core."""
+    return int(os.environ.get(PROCESSES_ENV) or 0) or os.cpu_count() or 1
+
+
+# === 1. Record layout ===
+def open_records(path):
+    """Memory-map a fixed-width file and return it as a (rows, record_len) uint8 view."""
+    if os.path.getsize(path) == 0:
+        return np.empty((0, 0), dtype=np.uint8)
+
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    return records_from_buffer(buf, path)
+
+
+def map_records(path, stride, record_len, n_rows):
+    """Memory-map a file whose record layout is already known, without re-validating it."""
+    if n_rows == 0:
+        return np.empty((0, record_len), dtype=np.uint8)
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    return np.lib.stride_tricks.as_strided(
+        buf, shape=(n_rows, record_len), strides=(stride, 1), writeable=False
+    )
+
+
+def record_layout(records):
+    """(stride, record_len, n_rows) of an open_records view, for map_records in another process."""
+    return (records.strides[0] if len(records) else 0), records.shape[1], len(records)
+
+
+def records_from_buffer(buf, name="<buffer>"):
+    stride = _find_stride(buf, name)
+    eol = 2 if stride > 1 and buf[stride - 2] == CARRIAGE_RETURN else 1
+    record_len = stride - eol
+
+    # Last record may be missing its line terminator
+    n_rows = -(-len(buf) // stride)
+    if not 0 <= n_rows * stride - len(buf) <= eol:
+        raise ValueError(f"{name} does not have a constant record length of {stride} bytes")
+
+    full_rows = len(buf) // stride
+    if not (buf[stride - 1: full_rows * stride: stride] == NEWLINE).all():
+        raise ValueError(f"{name} does not have a constant record length of {stride} bytes")
+
+    return np.lib.stride_tricks.as_strided(
+        buf, shape=(n_rows, record_len), strides=(stride, 1), writeable=False
+    )
+
+
+def iter_stream_records(stream, name="<stream>", buffer_bytes=STREAM_BYTES):
+    """Yield (rows, record_len) arrays from a binary stream, at most buffer_bytes of records at a time.
+
+    Used for compressed files that cannot be memory-mapped; partial records are
+    carried over to the next read.
+    """
+    stride = record_len = None
+    carry = b""
+    while True:
+        chunk = stream.read(buffer_bytes)
+        data = carry + chunk
+        if not chunk:
+            if data:
+                records = records_from_buffer(np.frombuffer(data, dtype=np.uint8), name)
+                if record_len is not None and records.shape[1] != record_len:
+                    raise ValueError(f"{name} does not have a constant record length")
+                yield records
+            return
+
+        if stride is None:
+            hits = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == NEWLINE)
+            if not len(hits):
+                carry = data
+                continue
+            stride = int(hits[0]) + 1
+
+        n_full = len(data) // stride * stride
+        carry = data[n_full:]
+        if n_full:
+            records = records_from_buffer(np.frombuffer(data[:n_full], dtype=np.uint8), name)
+            record_len = records.shape[1]
+            yield records
+
+
+def _find_stride(buf, name):
+    window = 1 << 16
+    while True:
+        hits = np.flatnonzero(buf[:window] == NEWLINE)
+        if len(hits):
+            return int(hits[0]) + 1
+        if window >= len(buf):
+            # Single record with no line terminator
+            return len(buf) + 1
+        window *= 4
+
+
+# === 2. Field decoders ===
+def decode_int(block):
+    """Decode right- or left-padded ASCII digits; blanks and junk become NaN.
+
+    Returns int64 when every field holds a number (e.g. country codes), else
+    float64 with NaN, as pd.read_fwf would type the column.
+    """
+    n_rows, width = block.shape
+    if width == 0:
+        return np.full(n_rows, np.nan)
+
+    digits = block.astype(np.int64) - ZERO
+    is_digit = (digits >= 0) & (digits <= 9)
+    is_blank = block == BLANK
+
+    has_digit = is_digit.any(axis=1)
+    first = np.argmax(is_digit, axis=1)
+    last = width - 1 - np.argmax(is_digit[:, ::-1], axis=1)
+
+    # Valid = only digits/blanks, at least one digit, and no blank between digits
+    valid = (
+        (is_digit | is_blank).all(axis=1)
+        & has_digit
+        & (is_digit.sum(axis=1) == last - first + 1)
+    )
+
+    exponent = last[:, None] - np.arange(width)[None, :]
+    contrib = np.where(is_digit & (exponent >= 0), digits * 10 ** np.clip(exponent, 0, None), 0)
+    values = contrib.sum(axis=1)
+    if valid.all():
+        return values
+    values = values.astype(np.float64)
+    values[~valid] = np.nan
+    return values
+
+
+def decode_str(block):
+    """Decode a byte block to stripped strings (latin-1, so any byte decodes); blank fields become NaN."""
+    n_rows, width = block.shape
+    if width == 0:
+        return pd.Series([np.nan] * n_rows, dtype=object)
+
+    raw = np.ascontiguousarray(block).view(f"S{width}").ravel()
+    values = pd.Series(np.char.decode(np.char.strip(raw), "latin-1"), dtype=object)
+    return values.where(values != "")
+
+
+def decode_float(block, decimals=0):
+    """Decode signed decimal fields ("-0.4532", " 45.0", "+12") straight to float64.
+
+    Fields without a decimal point are scaled by 10**-decimals (implied decimals,
+    e.g. "-04532" with decimals=4). Blank fields and anything that is not a
+    single optionally signed number become NaN.
+    """
+    n_rows, width = block.shape
+    if width == 0:
+        return np.full(n_rows, np.nan)
+
+    digits = block.astype(np.int64) - ZERO
+    is_digit = (digits >= 0) & (digits <= 9)
+    is_blank = block == BLANK
+    is_point = block == POINT
+    is_sign = (block == MINUS) | (block == PLUS)
+    filled = ~is_blank
+
+    rows = np.arange(n_rows)
+    first = np.argmax(filled, axis=1)
+    last = width - 1 - np.argmax(filled[:, ::-1], axis=1)
+    has_point = is_point.any(axis=1)
+    point = np.where(has_point, np.argmax(is_point, axis=1), width)
+
+    # Valid = one blank-free run holding digits, at most one point and at most one leading sign
+    valid = (
+        (is_digit | is_blank | is_point | is_sign).all(axis=1)
+        & is_digit.any(axis=1)
+        & (filled.sum(axis=1) == last - first + 1)
+        & (is_point.sum(axis=1) <= 1)
+        & (is_sign.sum(axis=1) == is_sign[rows, first])
+    )
+
+    # Each digit's power of ten = number of digits to its right
+    exponent = np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1] - 1
+    mantissa = np.where(is_digit, digits * 10 ** np.clip(exponent, 0, None), 0).sum(axis=1)
+    scale = np.where(has_point, (is_digit & (np.arange(width) > point[:, None])).sum(axis=1), decimals)
+
+    values = mantissa / 10.0 ** scale
+    values[block[rows, first] == MINUS] *= -1
+    values[~valid] = np.nan
+    return values
+
+
+DECODERS = {
+    "int": decode_int,
+    "float": decode_float,
+    "str": decode_str,
+}
+
+
+# === 3. Offset index ===
+# The questionnaire files are sorted by country, so each country is one block of
+# consecutive records. A sidecar JSON next to the data file records the byte
+# range of every block, letting readers map only the blocks they need.
+INDEX_SUFFIX = ".index.json"
+
+
+def field_index(path, start, end):
+    """Byte ranges of each run of equal field values, loaded from the sidecar or built once."""
+    stat = os.stat(path)
+    index_path = path + INDEX_SUFFIX
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if (index["size"] == stat.st_size and index["mtime_ns"] == stat.st_mtime_ns
+                and index["field"] == [start, end]):
+            return index
+
+    index = build_field_index(path, start, end)
+    index.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    try:
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+    except OSError:
+        pass  # read-only data directory: use the index without caching it
+    return index
+
+
+def build_field_index(path, start, end):
+    records = open_records(path)
+    stride = records.strides[0] if len(records) else 0
+    raw = np.ascontiguousarray(records[:, start:end]).view(f"S{end - start}").ravel()
+
+    # A new block starts wherever the field value changes
+    bounds = np.concatenate([[0], np.flatnonzero(raw[1:] != raw[:-1]) + 1, [len(raw)]])
+    blocks = {}
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if hi > lo:
+            key = raw[lo].decode("ascii", errors="replace")
+            blocks.setdefault(key, []).append([int(lo) * stride, int(hi) * stride])
+
+    return {
+        "field": [start, end],
+        "stride": int(stride),
+        "record_len": records.shape[1],
+        "rows": len(records),
+        "blocks": blocks,
+    }
+
+
+def _field_keys(values, width):
+    """Values as raw field text: 36, "36" and "036" all match a "036" field."""
+    keys = set()
+    for value in values:
+        text = str(value).strip()
+        keys.update({text.zfill(width), text.rjust(width), text.ljust(width)})
+    return {key for key in keys if len(key) == width}
+
+
+def field_mask(records, start, end, values):
+    """Rows whose raw field bytes equal one of values, checked before anything is decoded."""
+    if len(records) == 0:
+        return np.zeros(0, dtype=bool)
+    keys = [key.encode("ascii") for key in _field_keys(values, end - start)]
+    raw = np.ascontiguousarray(records[:, start:end]).view(f"S{end - start}").ravel()
+    return np.isin(raw, keys)
+
+
+def index_row_ranges(index, values):
+    """(first row, end row) of every block whose field matches one of values, in file order."""
+    start, end = index["field"]
+    keys = _field_keys(values, end - start)
+    stride = index["stride"]
+    return sorted(
+        (lo // stride, hi // stride) for key, byte_ranges in index["blocks"].items() if key in keys
+        for lo, hi in byte_ranges
+    )
+
+
+def index_layout(index):
+    return index["stride"], index["record_len"], index["rows"]
+
+
+# === 4. Span planning ===
+def merge_spans(colspecs):
+    """Group (start, end) colspecs into merged, non-overlapping byte spans.
+
+    Returns a list of (span_start, span_end, [field indices]) sorted by offset, so
+    each byte range of the record is copied out of the file only once.
+    """
+    order = sorted(range(len(colspecs)), key=lambda i: colspecs[i])
+    spans = []
+    for i in order:
+        start, end = colspecs[i]
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+            spans[-1][2].append(i)
+        else:
+            spans.append([start, end, [i]])
+    return [(s, e, idx) for s, e, idx in spans]
+
+
+# === 5. Reader ===
+def read_fixed_width(path, colspecs, names, dtypes=None, decimals=None, num_processes=1):
+    """Read every requested field of a fixed-width file in a single pass.
+
+    colspecs and names follow pd.read_fwf (0-indexed, half-open byte ranges).
+    dtypes maps a column name to "int" (default), "float" or "str"; decimals
+    maps a "float" column to its number of implied decimals. num_processes > 1
+    (None = default_processes()) decodes row ranges in a process pool.
+    """
+    if len(colspecs) != len(names):
+        raise ValueError("colspecs and names must have the same length")
+    records = open_records(path)
+    if (num_processes or default_processes()) == 1:
+        return decode_fields(records, colspecs, names, dtypes, decimals)
+    return decode_row_ranges(path, record_layout(records), [(0, len(records))],
+                             colspecs, names, dtypes, decimals, num_processes)
+
+
+def decode_row_ranges(path, layout, row_ranges, colspecs, names, dtypes=None, decimals=None,
+                      num_processes=1):
+    """Decode the given (first row, end row) ranges of a file and concatenate them in order.
+
+    With num_processes > 1 the ranges are cut into CHUNK_ROWS pieces and decoded
+    in a forked pool. Each worker memory-maps the file itself, so the raw text
+    is never copied between processes; only the decoded columns come back.
+    """
+    num_processes = num_processes or default_processes()
+    chunks = [
+        (lo, min(lo + CHUNK_ROWS, hi))
+        for first, hi in row_ranges for lo in range(first, hi, CHUNK_ROWS)
+    ]
+    if num_processes == 1 or len(chunks) < 2 or "fork" not in mp.get_all_start_methods():
+        records = map_records(path, *layout)
+        parts = [records[lo:hi] for lo, hi in row_ranges] or [records[:0]]
+        selected = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return decode_fields(selected, colspecs, names, dtypes, decimals)
+
+    with ProcessPoolExecutor(max_workers=min(num_processes, len(chunks)),
+                             mp_context=mp.get_context("fork")) as pool:
+        futures = [
+            pool.submit(_decode_range, path, layout, lo, hi, colspecs, names, dtypes, decimals)
+            for lo, hi in chunks
+        ]
+        return pd.concat([future.result() for future in futures], ignore_index=True)
+
+
+def _decode_range(path, layout, lo, hi, colspecs, names, dtypes, decimals):
+    return decode_fields(map_records(path, *layout)[lo:hi], colspecs, names, dtypes, decimals)
+
+
+def decode_fields(records, colspecs, names, dtypes=None, decimals=None):
+    dtypes = dtypes or {}
+    decimals = decimals or {}
+    for name in names:
+        if dtypes.get(name, "int") not in DECODERS:
+            raise ValueError(f"Unknown dtype for {name}: {dtypes[name]!r}")
+
+    columns = {}
+    for span_start, span_end, field_idx in merge_spans(colspecs):
+        span = np.ascontiguousarray(records[:, span_start:span_end])
+        for i in field_idx:
+            start, end = colspecs[i]
+            block = span[:, start - span_start:end - span_start]
+            dtype = dtypes.get(names[i], "int")
+            if dtype == "float":
+                columns[names[i]] = decode_float(block, decimals.get(names[i], 0))
+            else:
+                columns[names[i]] = DECODERS[dtype](block)
+
+    return pd.DataFrame({name: columns[name] for name in names})
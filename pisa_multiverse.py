@@ -0,0 +1,135 @@
+import math
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from pisa_ols import fe_ols_many
+from pisa_fwf import default_processes
+
+# Specification curves (multiverse analysis) over blocks of control variables.
+#
+# A specification is one combination of named control blocks (wealth,
+# education, ICT, ...); every outcome is fitted on it in one batched
+# fe_ols_many call. Combinations are enumerated, or sampled when there are too
+# many, and fitted in a forked process pool: the workers inherit the loaded
+# data from the parent instead of reloading or pickling it.
+
+# Data shared with forked workers (set by run_multiverse before the pool starts)
+_SHARED = {}
+
+
+# === 1. Specifications ===
+def specifications(blocks, max_blocks=None, max_specs=None, seed=0):
+    """Block-name tuples to fit: every combination of up to max_blocks blocks (None = any number),
+    including the no-controls baseline, or a random sample of max_specs of them (baseline always kept).
+    """
+    names = list(blocks)
+    sizes = range(0, (len(names) if max_blocks is None else min(max_blocks, len(names))) + 1)
+    if max_specs is None or sum(math.comb(len(names), size) for size in sizes) <= max_specs:
+        return [combo for size in sizes for combo in itertools.combinations(names, size)]
+
+    # Sample block subsets as bit masks, without replacement, keeping the baseline
+    rng = np.random.default_rng(seed)
+    chosen, specs = {0}, [()]
+    while len(specs) < max_specs:
+        mask = int(rng.integers(1, 2 ** len(names)))
+        if mask in chosen or (max_blocks is not None and bin(mask).count("1") > max_blocks):
+            continue
+        chosen.add(mask)
+        specs.append(tuple(name for i, name in enumerate(names) if mask >> i & 1))
+    return specs
+
+
+# === 2. Fitting ===
+def fit_specification(spec_id, combo):
+    """Fit every outcome on the base predictors plus the controls of one block combination."""
+    config = _SHARED
+    controls = [var for name in combo for var in config["blocks"][name]]
+    regressors = list(dict.fromkeys(config["predictors"] + controls))
+    columns = list(dict.fromkeys(regressors + config["outcomes"] + config["keys"]))
+    # Complete regressors only; each outcome then keeps its own complete cases
+    data = config["data"][columns].dropna(subset=regressors)
+    try:
+        fits = fe_ols_many(" + ".join(regressors), data, config["outcomes"], config["absorb"], config["cluster"])
+    except np.linalg.LinAlgError as error:
+        # One collinear combination is left out of the curve instead of stopping the run
+        print(f"⚠️ Specification {spec_id} ({'+'.join(combo) or 'none'}) skipped: {error}")
+        return []
+
+    rows = []
+    for outcome, fit in fits.items():
+        for predictor in config["predictors"]:
+            if predictor not in fit.params:
+                continue
+            row = {"spec_id": spec_id, "controls": "+".join(combo) or "none", "n_blocks": len(combo),
+                   "outcome": outcome, "predictor": predictor,
+                   "coef": fit.params[predictor], "se": fit.bse[predictor], "pvalue": fit.pvalues[predictor],
+                   "nobs": fit.nobs}
+            row.update({f"block_{name}": name in combo for name in config["blocks"]})
+            rows.append(row)
+    return rows
+
+
+def run_multiverse(data, outcomes, predictors, blocks, specs, absorb=None, cluster=None, num_processes=None):
+    """Fit every specification and return one tidy frame (one row per spec x outcome x predictor).
+
+    With num_processes > 1 (None = default_processes()) the specifications are fitted in
+    a forked process pool that shares data with the parent; without fork
+    (e.g. Windows) they run on one core.
+    """
+    keys = [absorb] if isinstance(absorb, str) else list(absorb or [])
+    keys += [col for col in ([cluster] if isinstance(cluster, str) else list(cluster or [])) if col not in keys]
+    _SHARED.update(data=data, outcomes=list(outcomes), predictors=list(predictors), blocks=blocks,
+                   absorb=absorb, cluster=cluster, keys=keys)
+
+    num_processes = num_processes or default_processes()
+    if num_processes > 1 and len(specs) > 1 and "fork" in mp.get_all_start_methods():
+        with ProcessPoolExecutor(max_workers=min(num_processes, len(specs)),
+                                 mp_context=mp.get_context("fork")) as pool:
+            futures = [pool.submit(fit_specification, spec_id, combo) for spec_id, combo in enumerate(specs)]
+            rows = [row for future in futures for row in future.result()]
+    else:
+        rows = [row for spec_id, combo in enumerate(specs) for row in fit_specification(spec_id, combo)]
+    _SHARED.clear()
+    return pd.DataFrame(rows)
+
+
+# === 3. Plot ===
+def spec_curve_plot(results, outcome, predictor, blocks, path, title=None):
+    """Specification curve: sorted estimates with 95% CIs above, the blocks each specification used below."""
+    curve = (results[(results["outcome"] == outcome) & (results["predictor"] == predictor)]
+             .sort_values("coef").reset_index(drop=True))
+    if curve.empty:
+        return None
+    x = np.arange(len(curve))
+    significant = curve["pvalue"] < 0.05
+
+    fig, (top, bottom) = plt.subplots(
+        2, 1, figsize=(10, 4 + 0.3 * len(blocks)), sharex=True,
+        gridspec_kw={"height_ratios": [3, max(1, 0.25 * len(blocks))]},
+    )
+    top.errorbar(x, curve["coef"], yerr=1.96 * curve["se"], fmt="none", ecolor="lightgray", elinewidth=1)
+    top.scatter(x[significant], curve["coef"][significant], s=10, color="#003366", label="p < 0.05", zorder=3)
+    top.scatter(x[~significant], curve["coef"][~significant], s=10, color="#bbbbbb", label="n.s.", zorder=3)
+    top.axhline(0, color="grey", linestyle="--", linewidth=1)
+    top.set_ylabel(f"Effect of {predictor} (β)")
+    top.set_title(title or f"Specification curve: {predictor} ➜ {outcome} ({len(curve):,} specifications)")
+    top.legend(loc="upper left", frameon=False)
+
+    names = list(blocks)
+    for i, name in enumerate(names):
+        used = curve[f"block_{name}"].to_numpy()
+        bottom.scatter(x[used], np.full(used.sum(), i), marker="|", s=40, color="#003366")
+    bottom.set_yticks(range(len(names)))
+    bottom.set_yticklabels(names)
+    bottom.invert_yaxis()
+    bottom.set_xlabel("Specification (sorted by estimate)")
+
+    fig.tight_layout()
+    fig.savefig(path, dpi=200)
+    plt.close(fig)
+    return path
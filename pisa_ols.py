@@ -0,0 +1,226 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import patsy
+from scipy import sparse, stats
+
+from pisa_survey import group_codes
+from pisa_store import drop_unused_categories
+
+# Fixed-effects OLS for the 2018 regression scripts.
+#
+# Country (or school) effects are absorbed by demeaning every variable within
+# its group instead of adding ~80 C(country) dummy columns to the design: the
+# slopes are identical (Frisch–Waugh), but the design matrix stays as narrow
+# as the regressors of interest. Results carry statsmodels' attribute names
+# (params, bse, tvalues, pvalues, nobs, summary()), so the scripts read them
+# the same way as an smf.ols fit.
+
+
+# === 1. Groups and demeaning ===
+def absorb_codes(data, absorb):
+    """Group number per row for the absorbed effects; several columns are absorbed as their combination.
+
+    The combination covers nested effects such as school within country. No
+    absorb = one group, i.e. a plain intercept.
+    """
+    if not absorb:
+        return np.zeros(len(data), dtype=np.intp), 1
+    columns = [absorb] if isinstance(absorb, str) else list(absorb)
+    groups, keys = group_codes(data, columns)
+    return groups, len(keys)
+
+
+def demean(values, groups, n_groups):
+    """Subtract each group's column means from a (rows, k) array."""
+    counts = np.bincount(groups, minlength=n_groups)
+    means = np.stack([np.bincount(groups, weights=values[:, j], minlength=n_groups) for j in range(values.shape[1])],
+                     axis=1) / np.maximum(counts, 1)[:, None]
+    return values - means[groups]
+
+
+def collinear_columns(gram, norms, tol=1e-10):
+    """Positions of design columns that are (numerically) linear combinations of earlier ones.
+
+    gram is the demeaned cross-product X'X and norms the columns' norms before
+    demeaning. A column is aliased when the share of its original sum of
+    squares left after projecting on the columns kept so far is below tol; that
+    includes a regressor constant within the absorbed groups, which demeaning
+    turns into zeros.
+    """
+    scale = np.where(norms > 0, norms, 1.0)
+    corr = gram / np.outer(scale, scale)
+    kept, aliased = [], []
+    for j in range(len(corr)):
+        residual = corr[j, j]
+        if kept:
+            residual -= corr[j, kept] @ np.linalg.solve(corr[np.ix_(kept, kept)], corr[kept, j])
+        (kept if residual > tol else aliased).append(j)
+    return aliased
+
+
+# === 2. Covariance ===
+def cluster_meats(Xd, resid, clusters):
+    """(outcomes, p, p) meat sum_g s_g s_g' of every outcome column, s_g = sum of x_i e_i in cluster g.
+
+    Row (j, g) of a stacked sparse indicator holds column j of X for the rows in
+    cluster g, so one sparse product with the residual matrix gives every
+    cluster's score sums for all the outcomes that share the design, without
+    forming the (rows x p x outcomes) scores.
+    """
+    n, p = Xd.shape
+    n_clusters = clusters.max() + 1
+    indicator = sparse.csr_matrix(
+        (Xd.T.ravel(), ((np.arange(p)[:, None] * n_clusters + clusters).ravel(), np.tile(np.arange(n), p))),
+        shape=(p * n_clusters, n),
+    )
+    sums = np.asarray(indicator @ resid).reshape(p, n_clusters, -1)  # (p, clusters, outcomes)
+    return np.einsum("pgm,qgm->mpq", sums, sums)
+
+
+def cluster_dimensions(rows, cluster):
+    """Cluster codes per dimension: one for one-way clustering; the two columns and their
+    intersection (entering with a minus sign) for two-way clustering, as in Cameron–Gelbach–Miller.
+
+    The two columns must not be nested (e.g. school_id within country): the
+    intersection would then equal the inner dimension and the sum reduce
+    exactly to one-way clustering by the outer one, so that case is rejected.
+    """
+    columns = [cluster] if isinstance(cluster, str) else list(cluster)
+    if len(columns) == 1:
+        return [(absorb_codes(rows, columns)[0], 1)]
+    if len(columns) != 2:
+        raise ValueError(f"Clustering supports one or two columns, not {columns}")
+    (first, n_first), (second, n_second), (both, n_both) = (
+        absorb_codes(rows, columns[0]), absorb_codes(rows, columns[1]), absorb_codes(rows, columns))
+    if n_both in (n_first, n_second):
+        inner, outer = columns if n_both == n_first else columns[::-1]
+        raise ValueError(f"Two-way clustering needs non-nested columns: {inner} is nested in {outer}, "
+                         f"which makes it one-way clustering by {outer}")
+    return [(first, 1), (second, 1), (both, -1)]
+
+
+def nested_in(groups, clusters, n_groups):
+    """True when every absorbed group lies inside a single cluster (e.g. country effects, country clusters)."""
+    pairs = np.unique(groups.astype(np.int64) * (clusters.max() + 1) + clusters)
+    return len(pairs) == n_groups
+
+
+def cluster_covs(Xd, resid, bread, groups, n_groups, dimensions):
+    """CRV1 covariance (outcomes, p, p) for one- or two-way clustering, reusing the shared bread.
+
+    Each dimension is scaled by G/(G - 1) * (N - 1)/(N - K). K leaves out the absorbed
+    effects when they are nested in one of the cluster dimensions. Returns the
+    covariances, df_resid and the smallest cluster count (for the t reference).
+    """
+    n, p = Xd.shape
+    nested = any(nested_in(groups, clusters, n_groups) for clusters, _ in dimensions[:2])
+    df_resid = n - p - (0 if nested else n_groups)
+    meat = np.zeros((resid.shape[1], p, p))
+    for clusters, sign in dimensions:
+        n_clusters = clusters.max() + 1
+        meat += sign * n_clusters / (n_clusters - 1) * cluster_meats(Xd, resid, clusters)
+    covs = (n - 1) / df_resid * bread @ meat @ bread
+    return covs, df_resid, min(clusters.max() + 1 for clusters, _ in dimensions[:2])
+
+
+# === 3. Estimator ===
+def fe_ols(formula, data, absorb=None, cluster=None):
+    """OLS of formula with the absorb effects swept out; cluster names the column (or two columns) for CRV1 SEs.
+
+    formula is a patsy formula without the absorbed dummies (and with an intercept,
+    which the demeaning absorbs). Degrees of freedom count the absorbed levels,
+    as the dummy regression would, except under clustering when the effects are
+    nested in the clusters (they then use no cluster-level degrees of freedom,
+    as in Stata's xtreg/reghdfe). Two non-nested cluster columns give two-way clustered SEs.
+    Clustered p-values use t with G - 1 df (G of the smaller dimension). A design
+    that is collinear once the absorbed effects are swept out (e.g. a regressor
+    constant within countries) raises LinAlgError naming the aliased terms.
+    """
+    outcome, rhs = (part.strip() for part in formula.split("~", 1))
+    return fe_ols_many(rhs, data, [outcome], absorb, cluster)[outcome]
+
+
+def fe_ols_many(rhs, data, outcomes, absorb=None, cluster=None):
+    """fe_ols of every outcome on the same right-hand side, as {outcome: result}.
+
+    Outcomes observed for exactly the same students share one design: it is
+    built, demeaned and inverted once, and all of their columns are solved
+    together. Each outcome still uses only its own complete cases, with unused
+    categories dropped, so the results equal separate fits.
+    """
+    keys = [absorb] if isinstance(absorb, str) else list(absorb or [])
+    keys += [col for col in ([cluster] if isinstance(cluster, str) else list(cluster or [])) if col not in keys]
+    base = data.dropna(subset=keys)
+    # Students with every right-hand-side variable (patsy drops the incomplete rows)
+    base = base.loc[patsy.dmatrix(rhs, base, return_type="dataframe").index]
+
+    # Outcomes with the same observed rows (the same missing-data pattern) are fitted together
+    observed = base[list(outcomes)].notna().to_numpy()
+    patterns = {}
+    for j, outcome in enumerate(outcomes):
+        patterns.setdefault(observed[:, j].tobytes(), []).append(outcome)
+
+    results = {}
+    for names in patterns.values():
+        rows = drop_unused_categories(base[base[names[0]].notna().to_numpy()])
+        results.update(fit_outcomes(rhs, rows, names, absorb, cluster))
+    return {outcome: results[outcome] for outcome in outcomes}
+
+
+def fit_outcomes(rhs, rows, outcomes, absorb, cluster):
+    """Fit every outcome column on one shared, complete set of rows."""
+    X = patsy.dmatrix(rhs, rows, return_type="dataframe").drop(columns="Intercept", errors="ignore")
+    rows = rows.loc[X.index]
+    groups, n_groups = absorb_codes(rows, absorb)
+
+    Z = demean(np.column_stack([X.to_numpy(dtype=np.float64), rows[outcomes].to_numpy(dtype=np.float64)]),
+               groups, n_groups)
+    Xd, Yd = Z[:, :X.shape[1]], Z[:, X.shape[1]:]
+    n, p = Xd.shape
+    gram = Xd.T @ Xd
+    aliased = collinear_columns(gram, np.linalg.norm(X.to_numpy(dtype=np.float64), axis=0))
+    if aliased:
+        absorbed_text = f" or the absorbed {absorb} effects" if absorb else ""
+        raise np.linalg.LinAlgError(f"Collinear design {rhs}: {list(X.columns[aliased])} "
+                                    f"are linear combinations of the other regressors{absorbed_text}")
+    bread = np.linalg.inv(gram)
+    beta = bread @ (Xd.T @ Yd)  # (p, outcomes)
+    resid = Yd - Xd @ beta
+
+    if cluster is None:
+        df_resid = n - p - n_groups
+        covs = bread[None] * ((resid ** 2).sum(axis=0) / df_resid)[:, None, None]
+        dist = stats.t(df_resid)
+        cov_type = "nonrobust"
+    else:
+        covs, df_resid, n_clusters = cluster_covs(Xd, resid, bread, groups, n_groups, cluster_dimensions(rows, cluster))
+        dist = stats.t(n_clusters - 1)
+        columns = [cluster] if isinstance(cluster, str) else list(cluster)
+        cov_type = f"cluster by {' x '.join(columns)} ({n_clusters} clusters{' in the smaller dimension' if len(columns) > 1 else ''})"
+
+    r2_within = 1 - (resid ** 2).sum(axis=0) / (Yd ** 2).sum(axis=0)
+    absorbed_text = ", ".join([absorb] if isinstance(absorb, str) else absorb) if absorb else "none"
+    header = f"Absorbed: {absorbed_text} ({n_groups} groups)   Covariance: {cov_type}"
+    return {
+        outcome: result(f"{outcome} ~ {rhs}", X.columns, beta[:, m], covs[m], dist, n, df_resid, r2_within[m], header)
+        for m, outcome in enumerate(outcomes)
+    }
+
+
+def result(formula, terms, beta, cov, dist, nobs, df_resid, r2_within, header):
+    """statsmodels-style view of one fitted outcome."""
+    params = pd.Series(beta, index=terms)
+    bse = pd.Series(np.sqrt(np.diag(cov)), index=terms)
+    tvalues = params / bse
+    pvalues = pd.Series(2 * dist.sf(np.abs(tvalues)), index=terms)
+
+    def summary():
+        table = pd.DataFrame({"coef": params, "std err": bse, "t": tvalues, "P>|t|": pvalues})
+        return (f"Fixed-effects OLS: {formula}\n{header}\n"
+                f"No. observations: {nobs}   Within R-squared: {r2_within:.4f}\n"
+                f"{table.to_string(float_format=lambda v: f'{v:.4f}')}")
+
+    return SimpleNamespace(params=params, bse=bse, tvalues=tvalues, pvalues=pvalues, cov_params=cov,
+                           nobs=nobs, df_resid=df_resid, rsquared_within=r2_within, summary=summary)
@@ -0,0 +1,217 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pisa_codebook import (
+    read_cycle, BOOK_LABELS, ATTITUDE_NAMES_2000, ATTITUDE_NAMES_2009,
+    COUNTRY_LABELS_2000, COUNTRY_LABELS_2003, COUNTRY_LABELS_2006, COUNTRY_LABELS_2009, COUNTRY_LABELS_2012,
+)
+from pisa_cache import read_spss_cached
+from pisa_store import label_column
+from pisa_survey import weighted_tables, WEIGHT_COL
+
+# Harmonised student-level panel of the PISA cycles 2000–2022.
+#
+# Every cycle is recoded to the same variable names and codes (books_home,
+# read_time, five reading-attitude items, ISO alpha-3 country, the final
+# student weight W_FSTUWT) and written as
+# Parquet partitioned by year and country (panel/year=2018/country=GBR/...).
+# Trend queries filter on the partition keys, so they only open the files they use.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PANEL_DIR = os.path.join(BASE_DIR, "../output/panel")
+PANEL_YEARS = [2000, 2003, 2006, 2009, 2012, 2015, 2018, 2022]
+
+SAV_FILES = {
+    2015: os.path.join(BASE_DIR, "../data/2015/PUF_SPSS_COMBINED_CMB_STU_QQQ/CY6_MS_CMB_STU_QQQ.sav"),
+    2018: os.path.join(BASE_DIR, "../data/2018/CY07_MSU_STU_QQQ.sav"),
+    2022: os.path.join(BASE_DIR, "../data/2022/CY08MSP_STU_QQQ.SAV"),
+}
+
+
+# === 1. Common codes ===
+# 2000 and 2022 ask "no books" separately; it is folded into 0–10 here, so the shares
+# of every year sum to 100%. (The CSV-based books_trend.py mapped 2022's "1–10" to
+# 0–10 and dropped the "0" row, so its 2022 0–10 share left out the no-books students.)
+BOOKS_SPLIT_ZERO = {
+    1: "0–10", 2: "0–10", 3: "11–25", 4: "26–100", 5: "101–200", 6: "201–500", 7: "500+"
+}
+READ_TIME_LABELS = {1: "None", 2: "<30 min", 3: "30–60 min", 4: "1–2 hrs", 5: ">2 hrs"}
+READ_TIME_ORDER = ["None", "<30 min", "30–60 min", "1–2 hrs", ">2 hrs"]
+
+# 1 = strongly disagree … 4 = strongly agree in every cycle
+ATTITUDE_CODES = [1, 2, 3, 4]
+ATTITUDE_ITEMS = {
+    "att_only_if_have_to": "I read only if I have to",
+    "att_reading_hobby": "Reading is one of my favourite hobbies",
+    "att_talk_books": "I like talking about books with other people",
+    "att_waste_of_time": "For me, reading is a waste of time",
+    "att_read_for_info": "I read only to get information that I need",
+}
+
+
+# === 2. Country codes ===
+# 2000–2009 (and CNTRYID in 2015) use ISO 3166 numeric codes; matched to alpha-3 by name
+_ISO3_BY_NAME = {name: iso for iso, name in COUNTRY_LABELS_2012.items()}
+_ISO3_EXTRA = {
+    31: "AZE", 156: "CHN", 188: "CRI", 268: "GEO", 344: "HKG", 356: "IND", 398: "KAZ",
+    410: "KOR", 417: "KGZ", 446: "MAC", 458: "MYS", 470: "MLT", 480: "MUS", 498: "MDA",
+    591: "PAN", 604: "PER", 643: "RUS", 702: "SGP", 703: "SVK", 780: "TTO", 784: "ARE",
+    807: "MKD", 862: "VEN", 891: "YUG",
+}
+COUNTRY_ISO3 = {
+    int(code): _ISO3_BY_NAME[name]
+    for labels in (COUNTRY_LABELS_2000, COUNTRY_LABELS_2003, COUNTRY_LABELS_2006, COUNTRY_LABELS_2009)
+    for code, name in labels.items() if name in _ISO3_BY_NAME
+}
+COUNTRY_ISO3.update(_ISO3_EXTRA)
+
+
+def iso_country(values):
+    """ISO alpha-3 code per row; unknown numeric codes are kept as 3-digit text."""
+    values = pd.Series(values)
+    return values.map({value: _iso3(value) for value in pd.unique(values)})
+
+
+def _iso3(value):
+    if isinstance(value, str) and not value.strip().isdigit():
+        return value.strip() or None
+    try:
+        code = int(float(value))
+    except (TypeError, ValueError):
+        return None
+    return COUNTRY_ISO3.get(code, f"{code:03d}")
+
+
+# === 3. Cycle recipes (source variables for each common variable) ===
+PANEL_SOURCES = {
+    2000: {
+        "country": "country", "books_home": ("books_home", BOOKS_SPLIT_ZERO), "read_time": "read_time_cat",
+        "attitudes": [ATTITUDE_NAMES_2000[i] for i in (0, 1, 2, 5, 7)],
+    },
+    2003: {"country": "country", "books_home": ("books_raw", BOOK_LABELS)},
+    2006: {"country": "country", "books_home": ("books_raw", BOOK_LABELS)},
+    2009: {
+        "country": "country", "books_home": ("books_raw", BOOK_LABELS), "read_time": "read_time_cat",
+        "attitudes": [ATTITUDE_NAMES_2009[i] for i in (0, 1, 2, 5, 7)],
+    },
+    2012: {"country": "CNT", "books_home": ("books_raw", BOOK_LABELS)},
+    2015: {"country": "CNTRYID", "books_home": ("ST013Q01TA", BOOK_LABELS), "weight": WEIGHT_COL},
+    2018: {
+        "country": "CNT", "books_home": ("ST013Q01TA", BOOK_LABELS), "read_time": "ST175Q01IA",
+        "attitudes": [f"ST160Q0{i}IA" for i in range(1, 6)], "weight": WEIGHT_COL,
+    },
+    2022: {"country": "CNT", "books_home": ("ST255Q01JA", BOOKS_SPLIT_ZERO), "weight": WEIGHT_COL},
+}
+
+
+def source_columns(year):
+    recipe = PANEL_SOURCES[year]
+    columns = [recipe["country"], recipe["books_home"][0]]
+    if "read_time" in recipe:
+        columns.append(recipe["read_time"])
+    if "weight" in recipe:
+        columns.append(recipe["weight"])
+    return columns + recipe.get("attitudes", [])
+
+
+def read_source(year, num_processes=None):
+    """Raw source columns of one cycle, straight from the questionnaire file."""
+    columns = source_columns(year)
+    if year in SAV_FILES:
+        return read_spss_cached(SAV_FILES[year], columns=columns, num_processes=num_processes)
+    return read_cycle(year, columns, num_processes=num_processes)
+
+
+def valid_codes(values, codes):
+    """Int8 column keeping only the listed codes (everything else, incl. missing codes, becomes NA)."""
+    values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.Series(np.where(np.isin(values, codes), values, np.nan)).astype("Int8")
+
+
+def harmonise(year, raw):
+    """Recode one cycle's raw columns to the common panel variables."""
+    recipe = PANEL_SOURCES[year]
+    raw = raw.reset_index(drop=True)
+    books_source, books_labels = recipe["books_home"]
+
+    df = pd.DataFrame({
+        "year": np.full(len(raw), year, dtype=np.int16),
+        "country": iso_country(raw[recipe["country"]]),
+        "books_home": label_column(raw[books_source], books_labels, ordered=True),
+    })
+    # The fixed-width codebooks (2000–2012) define no weight, so those cycles get unit
+    # weights, as does a .sav without the weight column (like the loaders' unweighted fallback)
+    if recipe.get("weight") in raw.columns:
+        df[WEIGHT_COL] = pd.to_numeric(raw[recipe["weight"]], errors="coerce").to_numpy(dtype=np.float64)
+    else:
+        df[WEIGHT_COL] = 1.0
+    if "read_time" in recipe:
+        df["read_time"] = label_column(raw[recipe["read_time"]], READ_TIME_LABELS, ordered=True)
+    else:
+        df["read_time"] = pd.Categorical([None] * len(raw), categories=READ_TIME_ORDER, ordered=True)
+
+    # Items a cycle did not ask stay NA, so every partition has the same schema
+    sources = dict(zip(ATTITUDE_ITEMS, recipe.get("attitudes", [])))
+    for item in ATTITUDE_ITEMS:
+        if item in sources:
+            df[item] = valid_codes(raw[sources[item]], ATTITUDE_CODES)
+        else:
+            df[item] = pd.array([pd.NA] * len(raw), dtype="Int8")
+    return df[df["country"].notna()]
+
+
+# === 4. Store ===
+def write_panel_year(df, year, panel_dir=PANEL_DIR):
+    """Replace one year's partitions with df (one file per country)."""
+    year_dir = os.path.join(panel_dir, f"year={year}")
+    if os.path.exists(year_dir):
+        shutil.rmtree(year_dir)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Fixed file names keep rebuilt partitions byte-identical when nothing changed
+    pq.write_to_dataset(table, panel_dir, partition_cols=["year", "country"],
+                        basename_template="part-{i}.parquet")
+    return year_dir
+
+
+def build_panel_year(year, num_processes=None, panel_dir=PANEL_DIR):
+    df = harmonise(year, read_source(year, num_processes))
+    write_panel_year(df, year, panel_dir)
+    return df
+
+
+def read_panel(columns=None, years=None, countries=None, panel_dir=PANEL_DIR):
+    """Load panel rows, opening only the year/country partitions asked for."""
+    filters = []
+    if years is not None:
+        filters.append(("year", "in", list(years)))
+    if countries is not None:
+        filters.append(("country", "in", list(countries)))
+
+    df = pd.read_parquet(panel_dir, columns=columns, filters=filters or None)
+    if "year" in df.columns:
+        df["year"] = df["year"].astype(int)
+    return df
+
+
+def panel_shares(var, by=("year",), years=None, countries=None, panel_dir=PANEL_DIR):
+    """W_FSTUWT-weighted percent distribution of var within each group, from one grouped scan of the panel.
+
+    Returns one row per (group, response) with columns n (students) and percent;
+    missing responses are left out of the base. The weighting is the one the
+    per-year summaries use (pisa_survey.weighted_tables), so the shares agree
+    with them; cycles without a weight count every student once.
+    """
+    by = list(by)
+    df = read_panel(by + [var, WEIGHT_COL], years, countries, panel_dir)
+    table = weighted_tables(df, [var], by)
+    table = table[table["n"] > 0].rename(columns={"value": var}).reset_index(drop=True)
+    for col in by:
+        table[col] = table[col].astype(df[col].dtype)
+    if isinstance(df[var].dtype, pd.CategoricalDtype):
+        table[var] = pd.Categorical(table[var], categories=df[var].cat.categories, ordered=df[var].cat.ordered)
+    return table[by + [var, "n", "percent"]]
@@ -0,0 +1,214 @@
+import functools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyreadstat
+
+from pisa_fwf import default_processes
+from pisa_archive import local_copy, HEADER_BYTES
+
+# Shared SPSS (.sav) reader for the 2015–2022 student questionnaire files.
+#
+# The student files are large (600k rows x 1,000+ variables for 2018), so they
+# are streamed in row blocks: each block is projected to the requested columns,
+# cleaned and downcast before it is kept. Peak memory then depends on the
+# chunk size, not on the size of the file.
+
+CHUNKSIZE = 50_000
+
+# Largest integer that float32 stores exactly
+FLOAT32_EXACT_INT = 2 ** 24
+
+
+# === 1. Per-block downcasting ===
+def downcast_block(block):
+    """Store integer-coded float columns (Likert items, codes) as float32."""
+    for col in block.columns:
+        values = block[col].to_numpy()
+        if values.dtype != np.float64:
+            continue
+        finite = values[~np.isnan(values)]
+        if (finite == np.round(finite)).all() and (np.abs(finite) < FLOAT32_EXACT_INT).all():
+            block[col] = values.astype(np.float32)
+    return block
+
+
+def finish_block(block, clean=None, downcast=True, row_filter=None):
+    if row_filter is not None:
+        block = block[row_filter(block)].reset_index(drop=True)
+    if clean is not None:
+        block = clean(block)
+    if downcast:
+        block = downcast_block(block)
+    return block
+
+
+def _isin_mask(column, values, block):
+    return block[column].isin(values).to_numpy()
+
+
+def isin_filter(column, values):
+    """Picklable row filter keeping rows whose raw column value is in values (e.g. CNT codes)."""
+    return functools.partial(_isin_mask, column, tuple(values))
+
+
+def concat_blocks(blocks, path, columns):
+    if not blocks:
+        _, meta = read_metadata(path, usecols=columns)
+        return pd.DataFrame(columns=meta.column_names)
+    return pd.concat(blocks, ignore_index=True)
+
+
+# === 2. Metadata-driven missing codes ===
+def read_metadata(path, **read_kwargs):
+    """pyreadstat metadata of a .sav file, also when it is still inside an archive.
+
+    Only the start of an archived file is extracted, since that is where SPSS
+    stores the dictionary; the whole file is extracted only if that fails.
+    """
+    with local_copy(path, max_bytes=HEADER_BYTES) as header_path:
+        try:
+            return pyreadstat.read_sav(header_path, metadataonly=True, **read_kwargs)
+        except pyreadstat.ReadstatError:
+            if header_path == path:
+                raise
+    with local_copy(path) as local_path:
+        return pyreadstat.read_sav(local_path, metadataonly=True, **read_kwargs)
+
+
+# PISA labels its missing codes (e.g. 95/97/98/99 or 5/7/8/9) with these texts
+MISSING_LABELS = ("valid skip", "not applicable", "invalid", "no response", "not reached")
+
+
+def missing_rules(path, columns=None):
+    """Per-variable missing codes from the .sav metadata as {column: [(lo, hi), ...]}.
+
+    Combines the declared SPSS user-missing ranges with every code whose value
+    label marks it as missing, so continuous indices keep valid values like 97.
+    """
+    _, meta = read_metadata(path, usecols=columns, user_missing=True)
+    rules = {}
+    for col, ranges in meta.missing_ranges.items():
+        for r in ranges:
+            if isinstance(r["lo"], (int, float)) and isinstance(r["hi"], (int, float)):
+                rules.setdefault(col, []).append((r["lo"], r["hi"]))
+    for col, labels in meta.variable_value_labels.items():
+        for code, label in labels.items():
+            if isinstance(code, (int, float)) and str(label).strip().lower() in MISSING_LABELS:
+                rules.setdefault(col, []).append((code, code))
+    return rules
+
+
+def scrub_block(block, rules):
+    """Blank every rule-matched code in one vectorised pass over the numeric columns."""
+    cols = [
+        col for col in block.columns
+        if rules.get(col) and pd.api.types.is_numeric_dtype(block[col])
+    ]
+    if not cols:
+        return block
+
+    # (rule, column) bounds, padded with NaN where a column has fewer rules
+    n_rules = max(len(rules[col]) for col in cols)
+    lo = np.full((n_rules, len(cols)), np.nan)
+    hi = np.full((n_rules, len(cols)), np.nan)
+    for j, col in enumerate(cols):
+        for i, (low, high) in enumerate(rules[col]):
+            lo[i, j], hi[i, j] = low, high
+
+    values = block[cols].to_numpy(dtype=np.float64, copy=True)
+    mask = np.zeros(values.shape, dtype=bool)
+    for i in range(n_rules):
+        mask |= (values >= lo[i]) & (values <= hi[i])
+    values[mask] = np.nan
+
+    block[cols] = values
+    return block
+
+
+# === 3. Block iterator ===
+def row_ranges(n_rows, chunksize):
+    """Split n_rows into (row_offset, row_limit) pairs of at most chunksize rows."""
+    return [(start, min(chunksize, n_rows - start)) for start in range(0, n_rows, chunksize)]
+
+
+def _read_range(path, columns, row_offset, row_limit, clean, downcast, row_filter, read_kwargs):
+    block, _ = pyreadstat.read_sav(
+        path, usecols=columns, row_offset=row_offset, row_limit=row_limit, **read_kwargs
+    )
+    return finish_block(block, clean, downcast, row_filter)
+
+
+def iter_spss_blocks(path, columns=None, chunksize=CHUNKSIZE, num_processes=1,
+                     clean=None, downcast=True, row_filter=None, **read_kwargs):
+    """Yield finished row blocks of a .sav file in file order.
+
+    row_filter(block) returns a boolean row mask on the raw block; rows outside
+    it are dropped before cleaning, so filtered-out students are never kept.
+
+    With num_processes > 1 the row ranges are decoded (and cleaned) in a forked
+    process pool. Falls back to one core where fork is unavailable, because the
+    loader scripts are not safe to re-import under the spawn start method.
+
+    A .sav that is still inside a .zip/.gz/.zst archive is extracted to a temp
+    file for the duration of the read (pyreadstat needs a seekable file).
+    """
+    with local_copy(path) as local_path:
+        yield from _iter_blocks(local_path, columns, chunksize, num_processes, clean, downcast,
+                                row_filter, read_kwargs)
+
+
+def _iter_blocks(path, columns, chunksize, num_processes, clean, downcast, row_filter, read_kwargs):
+    num_processes = num_processes or default_processes()
+    n_rows = None
+    if num_processes > 1 and "fork" in mp.get_all_start_methods():
+        _, meta = pyreadstat.read_sav(path, usecols=columns, metadataonly=True)
+        n_rows = meta.number_rows
+
+    if not n_rows:
+        reader = pyreadstat.read_file_in_chunks(
+            pyreadstat.read_sav, path, chunksize=chunksize, usecols=columns, **read_kwargs
+        )
+        for block, _meta in reader:
+            yield finish_block(block, clean, downcast, row_filter)
+        return
+
+    ranges = row_ranges(n_rows, chunksize)
+    with ProcessPoolExecutor(max_workers=min(num_processes, len(ranges)),
+                             mp_context=mp.get_context("fork")) as pool:
+        futures = [
+            pool.submit(_read_range, path, columns, offset, limit, clean, downcast, row_filter, read_kwargs)
+            for offset, limit in ranges
+        ]
+        for future in futures:
+            yield future.result()
+
+
+# === 4. Readers ===
+def read_spss_chunked(path, columns=None, chunksize=CHUNKSIZE, clean=None, downcast=True,
+                      row_filter=None, **read_kwargs):
+    """Stream a .sav file in row blocks on one core and return the concatenated frame.
+
+    columns     – variables to decode (projection is pushed down to pyreadstat)
+    clean       – optional function applied to each raw block before it is kept
+    downcast    – store integer-coded columns as float32 to cut memory
+    row_filter  – optional row mask function, e.g. isin_filter("CNT", ["GBR", "USA"])
+    read_kwargs – passed to pyreadstat.read_sav, e.g. apply_value_formats=True
+    """
+    blocks = list(iter_spss_blocks(path, columns, chunksize, 1, clean, downcast, row_filter, **read_kwargs))
+    return concat_blocks(blocks, path, columns)
+
+
+def read_spss_parallel(path, columns=None, num_processes=None, chunksize=CHUNKSIZE,
+                       clean=None, downcast=True, row_filter=None, **read_kwargs):
+    """Decode row ranges of a .sav file in a process pool and concatenate them in order.
+
+    Takes the same arguments as read_spss_chunked; num_processes defaults to
+    default_processes() (every core, or the share run_pipeline.py gives a stage).
+    Each worker cleans and downcasts its own block.
+    """
+    blocks = list(iter_spss_blocks(path, columns, chunksize, num_processes, clean, downcast, row_filter,
+                                   **read_kwargs))
+    return concat_blocks(blocks, path, columns)
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Typed columnar hand-off between the loader scripts and the analysis scripts.
+#
+# Cleaned datasets are written as Parquet, which keeps every column's dtype
+# (float32 codes, categoricals, strings), so readers never re-parse text or
+# re-coerce numerics, and can load just the columns they use.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_2018 = os.path.join(BASE_DIR, "../output/2018output/newpisa2018_cleaned_all_countries.parquet")
+CSV_CHUNKSIZE = 100_000
+
+
+# === 1. Label columns ===
+# One CategoricalDtype per value-label set, shared by every column that uses it
+_LABEL_DTYPES = {}
+
+
+def label_dtype(labels, ordered=False):
+    key = (tuple(labels.items()), ordered)
+    if key not in _LABEL_DTYPES:
+        _LABEL_DTYPES[key] = pd.CategoricalDtype(list(dict.fromkeys(labels.values())), ordered=ordered)
+    return _LABEL_DTYPES[key]
+
+
+def label_column(values, labels, ordered=False):
+    """Categorical view of a coded column; codes without a label become NaN."""
+    dtype = label_dtype(labels, ordered)
+    code_index = pd.Index(list(labels.keys()))
+    category_of_code = dtype.categories.get_indexer(list(labels.values()))
+
+    position = code_index.get_indexer(np.asarray(values))
+    codes = np.where(position >= 0, category_of_code[position], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=values.index)
+
+
+# === 2. Dtype shrinking ===
+# Smallest integer type for integer-coded columns (Likert items, codes) without missing values
+INT_DTYPES = [np.int8, np.int16, np.int32]
+# Whole numbers up to 2**24 are exact in float32
+FLOAT32_EXACT = 2 ** 24
+
+
+def shrink_column(series):
+    """Smallest dtype that holds a column: int8/16/32, float32, or category for repeated strings.
+
+    Missing values stay NaN in a float column rather than becoming pd.NA in a
+    nullable integer one, which patsy cannot evaluate before a dropna.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(values)
+        finite = values[~missing]
+        if len(finite) and (finite == np.round(finite)).all():
+            if not missing.any():
+                for int_type in INT_DTYPES:
+                    info = np.iinfo(int_type)
+                    if info.min <= finite.min() and finite.max() <= info.max:
+                        return series.astype(int_type)
+            if np.abs(finite).max() > FLOAT32_EXACT:
+                return series.astype(np.float64)
+        return series.astype(np.float32)
+
+    if pd.api.types.is_string_dtype(series.dtype) and series.nunique() <= len(series) // 2:
+        return series.astype("category")
+    return series
+
+
+def shrink_dtypes(df, report=True, exact=()):
+    """Downcast every column with shrink_column and print a before/after memory report.
+
+    Columns in exact stay float64: survey weights and plausible values feed the
+    replicate-variance and Rubin's-rules estimates, where float32's ~7 digits
+    would show up in the 80 small replicate differences.
+    """
+    before = df.memory_usage(deep=True).sum()
+    exact = set(exact)
+    df = pd.DataFrame({
+        col: df[col].astype(np.float64) if col in exact else shrink_column(df[col]) for col in df.columns
+    })
+    after = df.memory_usage(deep=True).sum()
+
+    if report:
+        counts = ", ".join(f"{n} {dtype}" for dtype, n in df.dtypes.astype(str).value_counts().items())
+        print(f"🧮 Memory: {before / 1024 ** 2:,.1f} MB → {after / 1024 ** 2:,.1f} MB "
+              f"({1 - after / max(before, 1):.0%} smaller; {counts})")
+    return df
+
+
+# === 3. Writing ===
+def write_cleaned(df, path):
+    """Write a cleaned dataset to Parquet, keeping dtypes."""
+    df = df.copy()
+    for col in df.columns:
+        # Mixed object columns (strings next to leftover codes) are stored as
+        # strings, exactly as a CSV round trip would have read them
+        if df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path, index=False)
+    return path
+
+
+# === 4. Reading ===
+def available_columns(path):
+    if path.endswith(".csv"):
+        return list(pd.read_csv(path, nrows=0).columns)
+    return pq.read_schema(path).names
+
+
+def read_cleaned(path, columns=None, countries=None, country_col="country"):
+    """Load a cleaned dataset, optionally only the named columns and countries.
+
+    Parquet files are read column by column with the country filter pushed
+    down to the reader; legacy CSV outputs are still accepted so older cycles
+    can use the same call, and are filtered chunk by chunk (country read as text).
+    """
+    if columns is not None:
+        missing = [col for col in columns if col not in available_columns(path)]
+        if missing:
+            raise KeyError(f"Columns not found in {os.path.basename(path)}: {missing}")
+
+    if path.endswith(".csv"):
+        if countries is None:
+            df = pd.read_csv(path, usecols=columns)
+            return df if columns is None else df[list(columns)]
+        usecols = None if columns is None else list(dict.fromkeys(list(columns) + [country_col]))
+        chunks = pd.read_csv(path, usecols=usecols, dtype={country_col: str}, chunksize=CSV_CHUNKSIZE)
+        df = pd.concat([chunk[chunk[country_col].isin(countries)] for chunk in chunks], ignore_index=True)
+        return df if columns is None else df[list(columns)]
+
+    if countries is None:
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_parquet(path, columns=columns, filters=[(country_col, "in", list(countries))])
+
+
+def strip_strings(df):
+    """Strip surrounding whitespace from text columns; categoricals are stripped once per category."""
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = dtype.categories
+            if pd.api.types.is_string_dtype(categories) and categories.str.strip().is_unique:
+                df[col] = df[col].cat.rename_categories(categories.str.strip())
+        elif dtype == object or pd.api.types.is_string_dtype(dtype):
+            df[col] = df[col].str.strip()
+    return df
+
+
+def drop_unused_categories(df):
+    """Drop category levels with no rows left (e.g. countries outside a subset), so C() stays full rank."""
+    for col in df.select_dtypes("category").columns:
+        df[col] = df[col].cat.remove_unused_categories()
+    return df
@@ -0,0 +1,427 @@
+import numpy as np
+import pandas as pd
+import patsy
+from scipy import sparse, stats
+
+# Survey-weighted tabulation for PISA's sampling design.
+#
+# PISA samples schools and then students with unequal selection probabilities,
+# so population shares are weighted by the final student weight W_FSTUWT, not
+# counted row by row. Tables are built from integer codes with np.bincount:
+# the grouping keys are coded once and each variable is one bincount, whatever
+# the number of groups. Files without W_FSTUWT (the fixed-width cycles, whose
+# codebooks do not define it) fall back to unit weights, i.e. plain counts.
+#
+# Standard errors follow PISA's Fay-BRR design: every statistic is recomputed
+# under the 80 replicate weights W_FSTURWT1..80 and SE^2 = sum((t_r - t)^2) / (R (1 - k)^2)
+# with k = 0.5. The final weight and the replicates are stacked into one
+# (rows x 81) matrix, so all 81 weightings come out of one matrix product
+# instead of 80 more passes over the data.
+
+WEIGHT_COL = "W_FSTUWT"
+REPLICATE_COLS = [f"W_FSTURWT{i}" for i in range(1, 81)]
+FAY_K = 0.5
+
+
+# === 1. Weights ===
+def has_weights(df, weight_col=WEIGHT_COL):
+    return weight_col in df.columns
+
+
+def student_weights(df, weight_col=WEIGHT_COL):
+    """Final student weights as float64 (missing weight = 0); unit weights if the file has none."""
+    if not has_weights(df, weight_col):
+        return np.ones(len(df))
+    return df[weight_col].to_numpy(dtype=np.float64, na_value=0.0)
+
+
+def has_replicates(df, weight_col=WEIGHT_COL, replicate_cols=REPLICATE_COLS):
+    return has_weights(df, weight_col) and all(col in df.columns for col in replicate_cols)
+
+
+def weight_matrix(df, weight_col=WEIGHT_COL, replicate_cols=REPLICATE_COLS):
+    """(rows, 1 + R) float64 matrix: the final weight, then each replicate weight (missing = 0)."""
+    return df[[weight_col] + list(replicate_cols)].to_numpy(dtype=np.float64, na_value=0.0)
+
+
+def replicate_se(estimates, k=FAY_K):
+    """Fay-BRR standard error from estimates whose last axis is (full weight, replicate 1..R)."""
+    estimates = np.asarray(estimates, dtype=np.float64)
+    full, replicates = estimates[..., :1], estimates[..., 1:]
+    return np.sqrt(((replicates - full) ** 2).sum(axis=-1) / (replicates.shape[-1] * (1 - k) ** 2))
+
+
+def weight_note(df, weight_col=WEIGHT_COL):
+    """One-line description of how percentages were computed, for the script output."""
+    if has_replicates(df, weight_col):
+        return (f"⚖️ Percentages weighted by {weight_col}, SEs from the {len(REPLICATE_COLS)} "
+                f"Fay-BRR replicate weights (n = unweighted student counts)")
+    if has_weights(df, weight_col):
+        return f"⚖️ Percentages weighted by {weight_col} (n = unweighted student counts; no replicate SEs)"
+    return f"⚖️ No {weight_col} in this file: percentages are unweighted"
+
+
+# === 2. Integer codes ===
+def level_codes(values, levels=None):
+    """Code per row plus the level labels; -1 (or any code past the last level) = skipped.
+
+    Without levels, the sorted distinct values are used, as in value_counts().sort_index();
+    for a categorical that is every category, in category order. Categorical
+    columns are recoded through their categories, never row by row.
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        levels = list(categories if levels is None else levels)
+        codes = values.cat.codes.to_numpy()
+        if levels == list(categories):
+            return codes, levels
+        position = np.append(pd.Index(levels).get_indexer(categories), -1)
+        return position[codes], levels
+
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        coded = integer_codes(values, levels)
+        if coded is not None:
+            return coded
+
+    if levels is None:
+        codes, uniques = pd.factorize(values, sort=True)
+        return codes, list(uniques)
+    levels = list(levels)
+    return pd.Index(levels).get_indexer(values), levels
+
+
+# Widest span of integer codes decoded through a lookup table instead of hashing
+MAX_CODE_SPAN = 10_000
+
+
+def integer_codes(values, levels=None):
+    """Codes of an integer-coded numeric column (Likert items, 1–6 scales, 97/98/99 codes) without hashing.
+
+    Values become offsets from the smallest code (missing values land past the
+    last level, which the kernel skips); explicit levels go through a small
+    lookup table. Returns None when the values are not whole numbers within
+    MAX_CODE_SPAN of each other, so the caller falls back to hashing.
+    """
+    array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    # fmin/fmax skip NaN; NaN - floor(NaN) > 0 is False, so missing values pass the whole-number test
+    lo, hi = np.fmin.reduce(array, initial=np.inf), np.fmax.reduce(array, initial=-np.inf)
+    if not np.isfinite(lo) or not np.isfinite(hi) or hi - lo > MAX_CODE_SPAN:
+        return None
+    if not pd.api.types.is_integer_dtype(values.dtype) and (array - np.floor(array) > 0).any():
+        return None
+
+    span = int(hi - lo) + 1
+    offset = array - lo
+    offset[np.isnan(offset)] = span
+    offset = offset.astype(np.intp)
+    if levels is None:
+        return offset, list(np.arange(lo, hi + 1))
+
+    levels = list(levels)
+    lookup = np.full(span + 1, -1)
+    for position, level in enumerate(levels):
+        if isinstance(level, (int, float, np.number)) and lo <= level <= hi and level == int(level):
+            lookup[int(level - lo)] = position
+    return lookup[offset], levels
+
+
+def group_codes(df, by):
+    """Group number per row (-1 = a missing key) and the observed groups' keys, in sorted order."""
+    combined = np.zeros(len(df), dtype=np.int64)
+    missing = np.zeros(len(df), dtype=bool)
+    key_levels = []
+    for col in by:
+        codes, levels = level_codes(df[col])
+        combined = combined * len(levels) + codes
+        missing |= (codes < 0) | (codes >= len(levels))
+        key_levels.append(levels)
+    combined[missing] = -1
+
+    # Renumber the observed key combinations 0..k-1 (sorted, so groups come out in key order)
+    groups, observed = pd.factorize(combined, sort=True, use_na_sentinel=False)
+    if len(observed) and observed[0] == -1:
+        groups, observed = groups - 1, observed[1:]
+
+    keys = {}
+    for col, levels in zip(reversed(by), reversed(key_levels)):
+        observed, position = np.divmod(observed, len(levels))
+        keys[col] = np.array(levels, dtype=object)[position]
+    return groups, pd.DataFrame({col: keys[col] for col in by})
+
+
+# === 3. Kernel ===
+def cell_codes(codes, n_levels, groups=None, n_groups=1):
+    """Flat (group, level) cell per row.
+
+    Rows whose code is outside 0..n_levels-1 (or whose group is -1) are skipped:
+    they go to an overflow cell n_groups * n_levels.
+    """
+    n_cells = n_groups * n_levels
+    codes = codes.astype(np.intp, copy=False)
+    valid = (codes >= 0) & (codes < n_levels)
+    if groups is None:
+        return np.where(valid, codes, n_cells)
+    return np.where(valid & (groups >= 0), groups * n_levels + codes, n_cells)
+
+
+def cell_sums(cells, n_levels, n_groups=1, weights=None):
+    """(n_groups, n_levels) sums of weights in one np.bincount (weights=None counts rows).
+
+    The overflow cell is dropped afterwards, so the weights are never copied or masked.
+    """
+    n_cells = n_groups * n_levels
+    sums = np.bincount(cells, weights=weights, minlength=n_cells + 1)
+    return sums[:n_cells].reshape(n_groups, n_levels)
+
+
+def cell_matrix_sums(cells, n_cells, matrix):
+    """(n_cells, columns) per-cell sums of every matrix column: one sparse indicator x dense product.
+
+    Used for the (rows x 81) weight matrix, so a cell's total under the final
+    weight and all replicates comes out of the same pass.
+    """
+    indicator = sparse.csr_matrix(
+        (np.ones(len(cells)), (cells, np.arange(len(cells)))), shape=(n_cells + 1, len(cells))
+    )
+    return np.asarray(indicator @ matrix)[:n_cells]
+
+
+def shares(sums):
+    """Percentages along the levels axis (axis 1) of (groups, levels[, weightings]) sums; empty groups give NaN."""
+    totals = sums.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, sums / totals * 100, np.nan)
+
+
+# === 4. Tables ===
+def weighted_tables(df, variables, by=None, levels=None, weight_col=WEIGHT_COL):
+    """Weighted distribution of each variable within each group, as one tidy frame.
+
+    Columns: *by, variable, value, n (students), weight (sum of weights),
+    percent (weighted) and se (Fay-BRR SE of percent; NaN when the replicate
+    weights are not loaded). levels maps a variable to its category order; other
+    variables use their sorted values. Missing values and values outside the
+    levels are left out of the base, as with value_counts(normalize=True).
+    """
+    levels = levels or {}
+    weighted = has_weights(df, weight_col)
+    replicated = has_replicates(df, weight_col)
+    weights = student_weights(df, weight_col) if weighted else None
+    matrix = weight_matrix(df, weight_col) if replicated else None
+    if by:
+        groups, keys = group_codes(df, by)
+    else:
+        groups, keys = None, pd.DataFrame(index=range(1))
+
+    tables = []
+    for var in variables:
+        codes, var_levels = level_codes(df[var], levels.get(var))
+        n_levels = len(var_levels)
+        cells = cell_codes(codes, n_levels, groups, len(keys))
+        count = cell_sums(cells, n_levels, len(keys))
+        if replicated:
+            # (groups, levels, 1 + R): totals under the final weight and every replicate
+            totals = cell_matrix_sums(cells, len(keys) * n_levels, matrix).reshape(len(keys), n_levels, -1)
+            total = totals[..., 0]
+        else:
+            total = cell_sums(cells, n_levels, len(keys), weights) if weighted else count.astype(np.float64)
+        if var not in levels:
+            # Drop categories nobody answered, as value_counts() on observed values would
+            used = count.sum(axis=0) > 0
+            count, total, var_levels = count[:, used], total[:, used], list(np.array(var_levels, dtype=object)[used])
+            if replicated:
+                totals = totals[:, used]
+            n_levels = len(var_levels)
+
+        table = keys.loc[keys.index.repeat(n_levels)].reset_index(drop=True)
+        table["variable"] = var
+        table["value"] = np.tile(np.array(var_levels, dtype=object), len(keys))
+        table["n"] = count.ravel().astype(np.int64)
+        table["weight"] = total.ravel()
+        table["percent"] = shares(total).ravel()
+        table["se"] = replicate_se(shares(totals)).ravel() if replicated else np.nan
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def weighted_shares(df, var, levels=None, by=None, weight_col=WEIGHT_COL):
+    """Weighted percent per level of one variable, like value_counts(normalize=True) * 100.
+
+    Returns a Series indexed by level, or a (groups x levels) frame when by is given.
+    """
+    table = weighted_tables(df, [var], by, None if levels is None else {var: levels}, weight_col)
+    if not by:
+        return table.set_index("value")["percent"].rename_axis(var)
+    percent = table.set_index(list(by) + ["value"])["percent"].unstack("value")
+    return percent.reindex(columns=table["value"].drop_duplicates().tolist()).rename_axis(columns=var)
+
+
+# === 5. Means and regressions ===
+def weighted_means(df, variables, by=None, weight_col=WEIGHT_COL):
+    """Weighted mean of each numeric variable within each group, as one tidy frame.
+
+    Columns: *by, variable, n, mean and se. With the replicate weights loaded the
+    SE is Fay-BRR, from one sparse product of a (1, y) group indicator with the
+    (rows x 81) weight matrix; otherwise it is the simple-random-sampling
+    std / sqrt(n), as in the descriptive plots before weights were available.
+    """
+    replicated = has_replicates(df, weight_col)
+    matrix = weight_matrix(df, weight_col) if replicated else student_weights(df, weight_col)[:, None]
+    if by:
+        groups, keys = group_codes(df, by)
+    else:
+        groups, keys = np.zeros(len(df), dtype=np.intp), pd.DataFrame(index=range(1))
+
+    tables = []
+    for var in variables:
+        y = df[var].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(y)
+        y = np.where(valid, y, 0.0)
+        cells = np.where(valid & (groups >= 0), groups, len(keys))
+        # Rows g and n_groups + 1 + g of the indicator hold 1 and y for the students in group g,
+        # so one product gives the (groups, 1 + R) totals of w and of w * y
+        indicator = sparse.csr_matrix(
+            (np.concatenate([np.ones(len(y)), y]),
+             (np.concatenate([cells, cells + len(keys) + 1]), np.tile(np.arange(len(y)), 2))),
+            shape=(2 * (len(keys) + 1), len(y)),
+        )
+        sums = np.asarray(indicator @ matrix)
+        totals, weighted_y = sums[:len(keys)], sums[len(keys) + 1:-1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = weighted_y / totals
+
+        table = keys.copy()
+        table["variable"] = var
+        table["n"] = np.bincount(cells, minlength=len(keys) + 1)[:len(keys)]
+        table["mean"] = means[:, 0]
+        if replicated:
+            table["se"] = replicate_se(means)
+        else:
+            table["se"] = (
+                pd.DataFrame({"group": cells, "y": y})[valid].groupby("group")["y"].std()
+                .reindex(range(len(keys))).to_numpy() / np.sqrt(table["n"].to_numpy())
+            )
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def replicate_betas(X, Y, W, groups):
+    """Weighted least-squares coefficients of every outcome column under every weighting.
+
+    X is (rows, p), Y is (rows, m), W is the (rows, 1 + R) weight matrix and groups
+    numbers the fixed-effect groups (all 0 for a plain intercept). Each weighting's
+    design block is built from two products with W (the weighted cross-products and
+    the per-group weighted sums), the group means are swept out, and one solve per
+    weighting covers all m outcomes. Returns (1 + R, p, m).
+    """
+    V = np.column_stack([X, Y])
+    p = X.shape[1]
+
+    # Weighted cross-products sum_i w_ir x_i v_i' for every weighting r: (1 + R, p, p + m)
+    cross = np.stack([W.T @ (V * X[:, [j]]) for j in range(p)], axis=1)
+
+    # Per-group totals of w_r and w_r * v
+    n_groups = groups.max() + 1
+    totals = cell_matrix_sums(groups, n_groups, W)
+    # Row (j, g) of the stacked indicator holds column j of [X, Y] for the rows in group g
+    stacked = sparse.csr_matrix(
+        (V.T.ravel(), ((np.arange(V.shape[1])[:, None] * n_groups + groups).ravel(), np.tile(np.arange(len(groups)), V.shape[1]))),
+        shape=(V.shape[1] * n_groups, len(groups)),
+    )
+    sums = np.asarray(stacked @ W).reshape(V.shape[1], n_groups, -1)  # (p + m, groups, 1 + R)
+
+    # Sweeping out the group means: sum_g S_g S_g' / T_g, per weighting
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scaled = np.where(totals > 0, sums[:p] / totals, 0.0)
+    within = cross - np.einsum("ugr,vgr->ruv", scaled, sums)
+    return np.linalg.solve(within[:, :, :p], within[:, :, p:])
+
+
+def design(rhs, data, outcomes, absorb=None, weight_col=WEIGHT_COL):
+    """Design matrix of a patsy right-hand side (intercept dropped), the outcomes, weight matrix and groups.
+
+    Rows missing any outcome, right-hand-side variable or absorb key are left out. The
+    weight matrix has the final weight only (or unit weights) when the replicates are not loaded.
+    """
+    keys = [absorb] if isinstance(absorb, str) else list(absorb or [])
+    data = data.dropna(subset=list(outcomes) + keys)
+    X = patsy.dmatrix(rhs, data, return_type="dataframe")
+    X = X.drop(columns="Intercept", errors="ignore")
+    rows = data.loc[X.index]
+    Y = rows[list(outcomes)].to_numpy(dtype=np.float64)
+    if keys:
+        groups = group_codes(rows, keys)[0]
+    else:
+        groups = np.zeros(len(rows), dtype=np.intp)
+    W = weight_matrix(rows, weight_col) if has_replicates(rows, weight_col) else student_weights(rows, weight_col)[:, None]
+    return X, Y, W, groups
+
+
+def coef_table(coef, se, index):
+    z = coef / se
+    return pd.DataFrame({"coef": coef, "se": se, "z": z, "pvalue": 2 * stats.norm.sf(np.abs(z))}, index=index)
+
+
+def replicate_ols(formula, data, absorb=None, weight_col=WEIGHT_COL, k=FAY_K):
+    """Weighted OLS under the final weight and all replicate weights, with Fay-BRR SEs.
+
+    formula is a patsy formula with an intercept; absorb names a column (e.g.
+    "country") or columns whose fixed effects are swept out within groups instead
+    of being estimated as dummies. All 81 weightings come out of replicate_betas, not 81 fits.
+    Returns a frame indexed by term with coef (final weight), se, z and pvalue.
+    """
+    outcome, rhs = (part.strip() for part in formula.split("~", 1))
+    X, Y, W, groups = design(rhs, data, [outcome], absorb, weight_col)
+    beta = replicate_betas(X.to_numpy(dtype=np.float64), Y, W, groups)[..., 0]  # (1 + R, p)
+    return coef_table(beta[0], replicate_se(beta.T, k), X.columns)
+
+
+# === 6. Plausible values ===
+# Achievement is reported as plausible values (PV1READ..PV10READ): draws of
+# each student's score, not one score. A model is fitted once per PV and the
+# results combined with Rubin's rules. All PVs share the design, so each
+# weighting solves the 10 outcomes together (10 PVs x 81 weightings, one
+# factorisation per weighting).
+
+PV_READ = [f"PV{i}READ" for i in range(1, 11)]
+
+
+def rubin_combine(estimates, sampling_var):
+    """Combine per-PV estimates (..., M) and their sampling variances with Rubin's rules.
+
+    coef = mean over PVs; var = mean sampling variance + (1 + 1/M) * between-PV variance.
+    """
+    m = estimates.shape[-1]
+    between = estimates.var(axis=-1, ddof=1) if m > 1 else np.zeros(estimates.shape[:-1])
+    return estimates.mean(axis=-1), sampling_var.mean(axis=-1) + (1 + 1 / m) * between
+
+
+def classical_var(X, Y, w, groups, beta):
+    """Model-based variances (p, m) of weighted within-group OLS coefficients, as WLS would report."""
+    V = np.column_stack([X, Y])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.stack([np.bincount(groups, weights=w * V[:, j]) for j in range(V.shape[1])], axis=1)
+        means /= np.bincount(groups, weights=w)[:, None]
+    V = V - means[groups]
+    p = X.shape[1]
+    resid = V[:, p:] - V[:, :p] @ beta
+    sigma2 = (w[:, None] * resid ** 2).sum(axis=0) / (len(V) - p - (groups.max() + 1))
+    return np.outer(np.diag(np.linalg.inv(V[:, :p].T @ (V[:, :p] * w[:, None]))), sigma2)
+
+
+def pv_ols(rhs, data, pv_cols=PV_READ, absorb=None, weight_col=WEIGHT_COL, k=FAY_K):
+    """Weighted OLS of every plausible value on rhs, combined with Rubin's rules.
+
+    Sampling variances are Fay-BRR when the replicate weights are loaded, else the
+    model-based variances of the weighted fit; the between-PV variance is added
+    either way. Returns a frame like replicate_ols.
+    """
+    X, Y, W, groups = design(rhs, data, pv_cols, absorb, weight_col)
+    beta = replicate_betas(X.to_numpy(dtype=np.float64), Y, W, groups)  # (1 + R, p, M)
+    if W.shape[1] > 1:
+        sampling_var = replicate_se(np.moveaxis(beta, 0, -1), k) ** 2  # (p, M)
+    else:
+        sampling_var = classical_var(X.to_numpy(dtype=np.float64), Y, W[:, 0], groups, beta[0])
+    coef, var = rubin_combine(beta[0], sampling_var)
+    return coef_table(coef, np.sqrt(var), X.columns)
@@ -3,6 +3,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 import seaborn as sns
+from pisa_panel import panel_shares, READ_TIME_ORDER
 
 # === 1. File setup ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,55 +11,16 @@ att_dir = os.path.join(BASE_DIR, "../output/readtime")
 plot_dir = os.path.join(att_dir, "plots")
 os.makedirs(plot_dir, exist_ok=True)
 
-# === 2. File paths ===
+# === 2. Reading time shares (one grouped scan of the harmonised panel, see build_panel.py) ===
+TREND_YEARS = [2000, 2009, 2018]
+read_order = READ_TIME_ORDER
 
-time_files = {
-    2000: "pisa2000_reading_time.csv",
-    2009: "pisa2009_reading_time.csv",
-    2018: "pisa2018_reading_time.csv"
-}
+shares = panel_shares("read_time", years=TREND_YEARS)
+df_time_plot = shares.pivot(index="year", columns="read_time", values="percent")
+df_time_plot = df_time_plot.reindex(columns=read_order)
+df_time_plot.columns = list(df_time_plot.columns)
+sample_sizes = shares.groupby("year")["n"].sum().to_dict()
 
-# === 5. READING TIME TREND PLOT ===
-standard_labels = {
-    "don't read": "None",
-    "none": "None",
-    "<30 min": "<30 min",
-    "30–60 min": "30–60 min",
-    "31–60 min": "30–60 min",
-    "1–2 hrs": "1–2 hrs",
-    "2+ hrs": ">2 hrs",
-    ">2 hrs": ">2 hrs"
-}
-read_order = ["None", "<30 min", "30–60 min", "1–2 hrs", ">2 hrs"]
-
-df_time_plot = pd.DataFrame()
-sample_sizes = {}
-
-for year, file in time_files.items():
-    df = pd.read_csv(os.path.join(att_dir, file), keep_default_na=False)
-    time_col = "Time" if "Time" in df.columns else "read_time"
-    pct_col = "Percent" if "Percent" in df.columns else "percent"
-    n_col = "n"
-
-    df[time_col] = (
-        df[time_col]
-        .astype(str)
-        .str.strip()
-        .str.replace(r"\s+", " ", regex=True)
-        .str.replace("’", "'", regex=False)
-        .str.lower()
-        .map(standard_labels)
-        .fillna(df[time_col])
-    )
-
-    df_grouped = df.groupby(time_col).agg({pct_col: 'sum', n_col: 'sum'})
-    sample_sizes[year] = int(df_grouped[n_col].sum())
-
-    row = df_grouped[pct_col].reindex(read_order)
-    df_time_plot[year] = row
-
-df_time_plot = df_time_plot.T
-df_time_plot.index = df_time_plot.index.astype(int)
 label_lines = [f"{year} (n = {sample_sizes[year]:,})" for year in df_time_plot.index]
 
 # === Print reading time percentages by year ===
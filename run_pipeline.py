@@ -0,0 +1,309 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from pisa_fwf import PROCESSES_ENV
+from pisa_cache import file_hash, CACHE_DIR
+from pisa_archive import find_source
+from pisa_store import CLEANED_2018
+from pisa_codebook import DATA_FILES
+from pisa_panel import SAV_FILES, PANEL_YEARS
+
+print("✅ Pipeline started...")
+
+# === Run options ===
+# None = every stage; e.g. ["books_trend"] builds that stage plus everything upstream of it
+TARGETS = None
+# True = rerun stages even when their code and inputs are unchanged
+FORCE = False
+# Stages running at once. The cores are split between them: each stage's readers
+# get cpu_count // MAX_WORKERS processes (via PISA_NUM_PROCESSES), so a full run
+# starts about one worker per core instead of one per core per stage.
+MAX_WORKERS = 2
+
+
+# === 1. Paths ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "../data")
+OUTPUT_DIR = os.path.join(BASE_DIR, "../output")
+STATE_PATH = os.path.join(OUTPUT_DIR, "pipeline_state.json")
+LOG_DIR = os.path.join(OUTPUT_DIR, "pipeline_logs")
+
+
+def data(*parts):
+    return os.path.normpath(os.path.join(DATA_DIR, *parts))
+
+
+def out(*parts):
+    return os.path.normpath(os.path.join(OUTPUT_DIR, *parts))
+
+
+def stage(script, inputs, outputs, args=()):
+    return {"script": script, "inputs": inputs, "outputs": outputs, "args": list(args)}
+
+
+def panel_year(year):
+    return out("panel", f"year={year}")
+
+
+# === 2. Stages (script, files it reads, files it writes) ===
+# Order between stages follows from the files: a stage runs after whichever stage
+# writes one of its inputs. Inputs no stage writes are treated as external files.
+BOOKS_TREND_YEARS = [2003, 2006, 2009, 2012, 2015, 2018, 2022]  # as in books_trend.py
+
+STAGES = {
+    "load_2000": stage(
+        "load_pisa2000.py", [data("2000", "2000_QU_data.txt")], [out("pisa2000_cleaned.csv")]
+    ),
+    "analyse_2000": stage(
+        "analyse_pisa2000.py", [out("pisa2000_cleaned.csv")],
+        [out("pisa2000_books_overall.csv"),
+         out("attitudes_readtime", "pisa2000_reading_time.csv"),
+         out("attitudes_readtime", "pisa2000_attitudes.csv")],
+    ),
+    "load_2003": stage(
+        "load_pisa2003.py", [data("2003", "2003_QU_data.txt")],
+        [out("pisa2003_books_overall.csv"), out("pisa2003_books_by_country.csv")],
+    ),
+    "load_2006": stage(
+        "load_pisa2006.py", [data("2006", "2006_QU_data.txt")],
+        [out("pisa2006_books_overall.csv"), out("pisa2006_books_by_country.csv")],
+    ),
+    "load_2009": stage(
+        "load_pisa2009.py", [data("2009", "2009_QU_data.txt")], [out("pisa2009_cleaned.csv")]
+    ),
+    "analyse_2009": stage(
+        "analyse_pisa2009.py", [out("pisa2009_cleaned.csv")],
+        [out("pisa2009_books_overall.csv"),
+         out("attitudes_readtime", "pisa2009_reading_time.csv"),
+         out("attitudes_readtime", "pisa2009_attitudes_cleaned_labeled.csv")],
+    ),
+    "load_2012": stage(
+        "load_pisa2012.py", [data("2012", "2012_QU_data.txt")], [out("pisa2012_books_overall.csv")]
+    ),
+    "load_2015": stage(
+        "load_pisa2015.py", [data("2015", "PUF_SPSS_COMBINED_CMB_STU_QQQ", "CY6_MS_CMB_STU_QQQ.sav")],
+        [out("pisa2015_books_overall.csv"), out("pisa2015_books_by_country.csv")],
+    ),
+    "load_2018": stage(
+        "load_pisa2018.py", [data("2018", "CY07_MSU_STU_QQQ.sav")], [os.path.normpath(CLEANED_2018)]
+    ),
+    "analyse_2018": stage(
+        "analyse_pisa2018.py", [os.path.normpath(CLEANED_2018)],
+        [out("2018_books_all.csv"), out("2018_readingtime_all.csv"),
+         out("attitudes_readtime", "pisa2018_attitudes.csv")],
+    ),
+    "load_2022": stage(
+        "load_pisa2022.py", [data("2022", "CY08MSP_STU_QQQ.SAV")], [out("pisa2022_books_overall.csv")]
+    ),
+    **{
+        f"panel_{year}": stage(
+            "build_panel.py", [os.path.normpath(DATA_FILES.get(year) or SAV_FILES[year])], [panel_year(year)],
+            args=[str(year)],
+        )
+        for year in PANEL_YEARS
+    },
+    "books_trend": stage(
+        "books_trend.py", [panel_year(year) for year in BOOKS_TREND_YEARS],
+        [out("pisa_books_over_time_final_noline.png")],
+    ),
+    "read_time_trend": stage(
+        "read_time_trend.py", [panel_year(year) for year in (2000, 2009, 2018)],
+        [out("readtime", "plots", "reading_time_trend.png")],
+    ),
+    "att_trend": stage(
+        "att_trend.py", [out("pisa2000_cleaned.csv"), out("pisa2009_cleaned.csv"), os.path.normpath(CLEANED_2018)],
+        [out("attitudes_trend", "plots")],
+    ),
+    "spec_curve": stage(
+        "spec_curve.py", [os.path.normpath(CLEANED_2018)], [out("2018output", "spec_curve_results.csv")]
+    ),
+}
+
+
+# === 3. Graph ===
+def upstream(stages):
+    """Stages each stage waits for: the writers of its inputs."""
+    writers = {path: name for name, spec in stages.items() for path in spec["outputs"]}
+    deps = {
+        name: sorted({writers[path] for path in spec["inputs"] if path in writers} - {name})
+        for name, spec in stages.items()
+    }
+
+    # Reject cycles up front instead of waiting forever
+    visiting, checked = set(), set()
+
+    def visit(name):
+        if name in checked:
+            return
+        if name in visiting:
+            raise ValueError(f"Pipeline stages form a cycle through {name}")
+        visiting.add(name)
+        for dep in deps[name]:
+            visit(dep)
+        visiting.discard(name)
+        checked.add(name)
+
+    for name in deps:
+        visit(name)
+    return deps
+
+
+def select(deps, targets):
+    """Targets plus everything upstream of them (all stages when targets is None)."""
+    if targets is None:
+        return set(deps)
+    unknown = [name for name in targets if name not in deps]
+    if unknown:
+        raise KeyError(f"Unknown pipeline stages: {unknown}")
+
+    selected, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(deps[name])
+    return selected
+
+
+# === 4. Change detection ===
+IMPORT_PATTERN = re.compile(r"^\s*(?:from|import)\s+(pisa_\w+)", re.MULTILINE)
+
+
+def code_files(script):
+    """The script plus every pisa_* helper module it imports, directly or indirectly."""
+    files, todo = [], [os.path.join(BASE_DIR, script)]
+    while todo:
+        path = todo.pop()
+        if path in files or not os.path.exists(path):
+            continue
+        files.append(path)
+        with open(path, encoding="utf-8") as f:
+            todo.extend(os.path.join(BASE_DIR, module + ".py") for module in IMPORT_PATTERN.findall(f.read()))
+    return sorted(files)
+
+
+def input_hash(path):
+    try:
+        source, member = find_source(path)
+    except FileNotFoundError:
+        return "missing"
+    if os.path.isdir(source):
+        digest = hashlib.sha256()
+        for root, dirs, names in os.walk(source):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                digest.update(f"{os.path.relpath(path, source)}:{file_hash(path, CACHE_DIR)}\n".encode())
+        return digest.hexdigest()
+    return file_hash(source, CACHE_DIR) + (f":{member}" if member else "")
+
+
+def stage_digest(name):
+    """Content hash of a stage's code and inputs; unchanged digest = nothing to redo."""
+    spec = STAGES[name]
+    parts = {
+        "code": {os.path.basename(path): file_hash(path, CACHE_DIR) for path in code_files(spec["script"])},
+        "args": spec["args"],
+        "inputs": {os.path.relpath(path, BASE_DIR): input_hash(path) for path in spec["inputs"]},
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def up_to_date(name, state, digest):
+    return state.get(name) == digest and all(os.path.exists(p) for p in STAGES[name]["outputs"])
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_PATH + ".tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(STATE_PATH + ".tmp", STATE_PATH)
+
+
+# === 5. Runner ===
+def run_stage(name, num_processes=1):
+    """Run one stage's script in its own interpreter, logging to output/pipeline_logs/<stage>.log.
+
+    num_processes is the pool size the stage's readers use for num_processes=None.
+    """
+    log_path = os.path.join(LOG_DIR, f"{name}.log")
+    with open(log_path, "w") as log:
+        result = subprocess.run(
+            [sys.executable, os.path.join(BASE_DIR, STAGES[name]["script"]), *STAGES[name]["args"]],
+            cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT,
+            # Save figures without opening windows; size the stage's process pools
+            env={**os.environ, "MPLBACKEND": "Agg", PROCESSES_ENV: str(num_processes)},
+        )
+    return result.returncode
+
+
+def run_pipeline(targets=None, force=False, max_workers=MAX_WORKERS):
+    cores = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers or 1, cores))
+    num_processes = max(1, cores // max_workers)
+    deps = upstream(STAGES)
+    pending = select(deps, targets)
+    state = load_state()
+    os.makedirs(LOG_DIR, exist_ok=True)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # Digest of the code and inputs each running stage started from: recorded on
+    # success, so an input edited mid-run still counts as changed next time
+    done, failed, running, started_from = set(), set(), {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Start (or skip) every stage whose upstream stages have all finished
+            progressed = False
+            for name in sorted(pending):
+                if any(dep in failed for dep in deps[name]):
+                    pending.discard(name)
+                    failed.add(name)
+                    print(f"⛔ {name}: skipped, an upstream stage failed")
+                    progressed = True
+                elif all(dep in done for dep in deps[name]):
+                    pending.discard(name)
+                    progressed = True
+                    digest = stage_digest(name)
+                    if not force and up_to_date(name, state, digest):
+                        done.add(name)
+                        print(f"⏭️  {name}: up to date")
+                    else:
+                        print(f"▶️  {name}: running {STAGES[name]['script']}")
+                        started_from[name] = digest
+                        running[pool.submit(run_stage, name, num_processes)] = name
+
+            if progressed and not running:
+                continue
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.result() == 0:
+                    done.add(name)
+                    state[name] = started_from[name]
+                    save_state(state)
+                    print(f"✅ {name}: done")
+                else:
+                    failed.add(name)
+                    print(f"❌ {name}: failed, see {os.path.join(LOG_DIR, name + '.log')}")
+
+    print(f"\n📋 {len(done)} stages up to date, {len(failed)} failed")
+    return done, failed
+
+
+if __name__ == "__main__":
+    _, failed_stages = run_pipeline(TARGETS, FORCE, MAX_WORKERS)
+    sys.exit(1 if failed_stages else 0)
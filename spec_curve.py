@@ -0,0 +1,87 @@
+import os
+import time
+import pandas as pd
+from tabulate import tabulate
+from pisa_store import read_cleaned, CLEANED_2018
+from pisa_multiverse import specifications, run_multiverse, spec_curve_plot
+
+print("✅ Specification curve started...")
+
+# === 1. Paths ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(BASE_DIR, "../output/2018output")
+PLOT_DIR = os.path.join(OUTPUT_DIR, "spec_curve")
+
+# === 2. Model ===
+PREDICTORS = ["read_time_numeric", "books_home"]
+OUTCOMES = [
+    "metacog_understanding", "metacog_summarising", "metacog_credibility", "cognitive_flexibility", "perspective_taking",
+]
+
+# === 3. Control blocks (comment a block out to keep it out of every specification) ===
+CONTROL_BLOCKS = {
+    "demographics": ["age", "gender", "immigration_status"],
+    "wealth": ["family_wealth_index", "socioeconomic_index", "home_possessions", "cultural_possessions"],
+    "education": ["mother_edu", "father_edu", "highest_parent_edu"],
+    "teacher_support": ["teacher_interest", "teacher_support_language", "teacher_directed_instruction",
+                        "teacher_reading_stimulation"],
+    "ict": ["ict_home", "ict_school", "ict_use_leisure", "ict_interest"],
+    "reading_attitudes": ["att_1_read_only_if_have_to", "att_2_reading_hobby", "att_3_talk_books",
+                          "att_4_reading_waste", "att_5_read_for_info"],
+    "school_climate": ["school_belonging", "being_bullied", "school_discrimination_climate"],
+    "learning_time": ["learning_time_mins", "ecec_duration"],
+}
+
+# === 4. Run options ===
+# None = any number of blocks per specification; e.g. 3 = at most three blocks at once
+MAX_BLOCKS = None
+# None = every combination; otherwise a random sample of this many (the no-controls baseline is always kept)
+MAX_SPECS = None
+SEED = 2018
+USE_COUNTRY_FE = True
+USE_CLUSTER_SES = True
+# Worker processes fitting specifications (None = every core)
+NUM_PROCESSES = None
+
+# === 5. Load only the columns the specifications use ===
+control_columns = [var for block in CONTROL_BLOCKS.values() for var in block]
+columns = ["read_time", "books_home", "country"] + control_columns + OUTCOMES
+df = read_cleaned(CLEANED_2018, columns=list(dict.fromkeys(columns)))
+df = df.rename(columns={"read_time": "read_time_numeric"})
+
+# === 6. Fit every specification ===
+specs = specifications(CONTROL_BLOCKS, max_blocks=MAX_BLOCKS, max_specs=MAX_SPECS, seed=SEED)
+print(f"🔢 {len(specs):,} specifications x {len(OUTCOMES)} outcomes")
+start = time.perf_counter()
+results = run_multiverse(
+    df, OUTCOMES, PREDICTORS, CONTROL_BLOCKS, specs,
+    absorb="country" if USE_COUNTRY_FE else None,
+    cluster="country" if USE_CLUSTER_SES else None,
+    num_processes=NUM_PROCESSES,
+)
+print(f"⏱️ Fitted in {time.perf_counter() - start:.1f}s")
+
+os.makedirs(PLOT_DIR, exist_ok=True)
+out_csv = os.path.join(OUTPUT_DIR, "spec_curve_results.csv")
+results.to_csv(out_csv, index=False)
+print(f"✅ Saved specification results ➜ {out_csv}")
+
+# === 7. Summary: how stable each estimate is across specifications ===
+summary = results.groupby(["outcome", "predictor"]).agg(
+    specs=("coef", "size"),
+    median_coef=("coef", "median"),
+    min_coef=("coef", "min"),
+    max_coef=("coef", "max"),
+    share_positive=("coef", lambda c: (c > 0).mean()),
+    share_significant=("pvalue", lambda p: (p < 0.05).mean()),
+).reset_index()
+print("\n=== Specification curve summary ===")
+print(tabulate(summary, headers="keys", tablefmt="github", floatfmt=".3f", showindex=False))
+
+# === 8. Plots ===
+for outcome in OUTCOMES:
+    for predictor in PREDICTORS:
+        path = spec_curve_plot(results, outcome, predictor, CONTROL_BLOCKS,
+                               os.path.join(PLOT_DIR, f"spec_curve_{predictor}_{outcome}.png"))
+        if path:
+            print(f"📈 Saved ➜ {path}")
@@ -0,0 +1,76 @@
+import os
+import re
+import sys
+import shutil
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLUMNS = {
+    2000: ["att_q35a_only_if_have_to", "att_q35b_reading_hobby", "att_q35c_talk_books",
+           "att_q35f_waste_of_time", "att_q35h_read_for_info"],
+    2009: ["att_q35a", "att_q35b", "att_q35c", "att_q35f"],  # att_q35h left out of the file
+    2018: ["att_1_read_only_if_have_to", "att_2_reading_hobby", "att_3_talk_books",
+           "att_4_reading_waste", "att_5_read_for_info"],
+}
+ITEMS = ["I read only if I have to", "Reading is one of my favourite hobbies",
+         "I like talking about books with other people", "For me, reading is a waste of time",
+         "I read only to get information that I need"]
+
+
+@pytest.fixture
+def cleaned_files(tmp_path):
+    """att_trend.py and pisa_store.py copied into tmp_path/pkg, with cleaned files in tmp_path/output."""
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    for name in ("att_trend.py", "pisa_store.py"):
+        shutil.copy(os.path.join(HERE, name), pkg)
+
+    rng = np.random.default_rng(0)
+    frames = {}
+    for year, columns in COLUMNS.items():
+        # Codes outside 1-4 (7 = invalid) and blanks are not answers
+        frames[year] = pd.DataFrame({col: rng.choice([1, 2, 3, 4, 4, 7, np.nan], 300) for col in columns})
+        frames[year]["country"] = rng.choice(["GBR", "USA"], 300)
+    output = tmp_path / "output"
+    (output / "2018output").mkdir(parents=True)
+    frames[2000].to_csv(output / "pisa2000_cleaned.csv", index=False)
+    frames[2009].to_csv(output / "pisa2009_cleaned.csv", index=False)
+    frames[2018].astype({col: np.float32 for col in COLUMNS[2018]}).to_parquet(
+        output / "2018output" / "newpisa2018_cleaned_all_countries.parquet", index=False
+    )
+    return pkg, frames
+
+
+def per_item_shares(frames):
+    """The shares as the old script computed them: one read and one value_counts per (item, year)."""
+    expected = {}
+    for i, item in enumerate(ITEMS):
+        for year, df in frames.items():
+            if i < len(COLUMNS[year]):
+                answers = df[COLUMNS[year][i]]
+                answers = answers[answers.isin([1, 2, 3, 4])]
+                vc = (answers.value_counts(normalize=True).sort_index() * 100).round(2)
+                expected[item, year] = (", ".join(f"{int(k)}: {v:.2f}%" for k, v in vc.items()), len(answers))
+    return expected
+
+
+def test_one_read_per_year_gives_the_per_item_shares(cleaned_files):
+    pkg, frames = cleaned_files
+    result = subprocess.run([sys.executable, str(pkg / "att_trend.py")], capture_output=True, text=True,
+                            env={**os.environ, "MPLBACKEND": "Agg"}, check=True)
+
+    printed, item = {}, None
+    for line in result.stdout.splitlines():
+        if line.startswith("📖 "):
+            item = line[2:].strip()
+        match = re.match(r"(\d{4}): \[(.*)\], n = ([\d,]+)", line)
+        if match:
+            printed[item, int(match[1])] = (match[2], int(match[3].replace(",", "")))
+
+    assert printed == per_item_shares(frames)
+    assert "2009: ❌ Column not found: att_q35h" in result.stdout
+    assert len(os.listdir(pkg.parent / "output" / "attitudes_trend" / "plots")) == len(ITEMS)
@@ -0,0 +1,136 @@
+import os
+import gzip
+import zipfile
+from collections import namedtuple
+
+import pandas as pd
+import pytest
+import zstandard
+
+import pisa_archive
+from pisa_archive import (
+    local_copy, unpacked_size, find_source, stored_member_span, read_fixed_width_archive, EXTRACT_ENV,
+)
+from pisa_fwf import read_fixed_width
+from pisa_spss import read_spss_chunked
+
+COLUMNS = ["CNT", "ST013Q01TA", "ESCS"]
+
+
+@pytest.fixture
+def zipped_sav(sav_path, tmp_path):
+    """The .sav moved into <name>.sav.zip, so only the archive is on disk."""
+    zip_path = sav_path + ".zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.write(sav_path, os.path.basename(sav_path))
+    expected = read_spss_chunked(sav_path, COLUMNS)
+    os.remove(sav_path)
+    return sav_path, expected
+
+
+def test_unpacked_size_from_archive_headers(tmp_path):
+    payload = b"x" * 5000
+    with zipfile.ZipFile(tmp_path / "a.zip", "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("a.sav", payload)
+    (tmp_path / "a.sav.zst").write_bytes(zstandard.ZstdCompressor().compress(payload))
+    with gzip.open(tmp_path / "a.sav.gz", "wb") as f:
+        f.write(payload)
+
+    assert unpacked_size(str(tmp_path / "a.zip"), "a.sav") == 5000
+    assert unpacked_size(str(tmp_path / "a.sav.zst")) == 5000
+    assert unpacked_size(str(tmp_path / "a.sav.gz")) is None
+
+
+def test_archived_sav_is_unpacked_to_the_extract_dir(zipped_sav, tmp_path, monkeypatch, capsys):
+    path, expected = zipped_sav
+    extract = tmp_path / "extract"
+    extract.mkdir()
+    monkeypatch.setenv(EXTRACT_ENV, str(extract))
+
+    with local_copy(path) as local_path:
+        assert os.path.dirname(local_path) == str(extract)
+    assert "📦 Unpacking" in capsys.readouterr().out
+    assert os.listdir(extract) == []  # removed after the read
+
+    pd.testing.assert_frame_equal(read_spss_chunked(path, COLUMNS), expected)
+
+
+def test_too_little_space_for_the_extract_is_reported_up_front(zipped_sav, tmp_path, monkeypatch):
+    path, _ = zipped_sav
+    usage = namedtuple("usage", "total used free")
+    monkeypatch.setattr(pisa_archive.shutil, "disk_usage", lambda _: usage(1000, 900, 100))
+    monkeypatch.setenv(EXTRACT_ENV, str(tmp_path))
+
+    with pytest.raises(OSError, match=EXTRACT_ENV):
+        with local_copy(path):
+            pass
+    with local_copy(path, max_bytes=50) as header_path:  # a header-only extract still fits
+        assert os.path.getsize(header_path) == 50
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    """A fixed-width questionnaire file: 3-digit country, 2-digit item (blank = missing)."""
+    data_dir = tmp_path / "2009"
+    data_dir.mkdir()
+    path = data_dir / "2009_QU_data.txt"
+    path.write_text("".join(f"{country}{item:>2}\n" for country, item in
+                            [("036", "1"), ("036", ""), ("826", "12"), ("826", "4"), ("840", "7")] * 40))
+    return path
+
+
+def archive_as(path, kind):
+    """Move path into an archive of the given kind; returns the archive path."""
+    data = path.read_bytes()
+    if kind == "gz":
+        target = f"{path}.gz"
+        with gzip.open(target, "wb") as f:
+            f.write(data)
+    elif kind == "zst":
+        target = f"{path}.zst"
+        with open(target, "wb") as f:
+            f.write(zstandard.ZstdCompressor().compress(data))
+    else:
+        target = {"zip": f"{path}.zip", "stem_zip": f"{os.path.splitext(path)[0]}.zip",
+                  "dir_zip": f"{path.parent}.zip"}[kind]
+        method = zipfile.ZIP_STORED if kind == "dir_zip" else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(target, "w", method) as archive:
+            archive.writestr("README.txt", "not the data")
+            archive.writestr(f"{path.parent.name}/{path.name.upper()}", data)  # case-insensitive match
+    os.remove(path)
+    return target
+
+
+@pytest.mark.parametrize("kind", ["gz", "zst", "zip", "stem_zip", "dir_zip"])
+def test_find_source_locates_the_archive(text_file, kind):
+    target = archive_as(text_file, kind)
+    source, member = find_source(str(text_file))
+    assert source == target
+    assert member == (None if kind in ("gz", "zst") else "2009/2009_QU_DATA.TXT")
+
+
+def test_find_source_errors(text_file, tmp_path):
+    assert find_source(str(text_file)) == (str(text_file), None)
+    with pytest.raises(FileNotFoundError, match="no unpacked file"):
+        find_source(str(tmp_path / "2012_QU_data.txt"))
+    zip_path = archive_as(text_file, "zip")
+    with pytest.raises(ValueError, match="holds 2 files"):
+        find_source(zip_path)  # a .zip named directly must hold one file
+
+
+@pytest.mark.parametrize("kind", ["gz", "zst", "zip", "dir_zip"])
+def test_archived_text_matches_the_unpacked_file(text_file, kind):
+    colspecs, names = [(0, 3), (3, 5)], ["country", "item"]
+    expected = read_fixed_width(str(text_file), colspecs, names, {"country": "str"})
+    uk = expected[expected["country"] == "826"].reset_index(drop=True)
+
+    archive_as(text_file, kind)
+    source, member = find_source(str(text_file))
+    # Stored members are memory-mapped in place; compressed ones are streamed
+    assert (member is not None and stored_member_span(source, member) is not None) == (kind == "dir_zip")
+
+    full = read_fixed_width_archive(source, member, colspecs, names, {"country": "str"})
+    pd.testing.assert_frame_equal(full, expected)
+    filtered = read_fixed_width_archive(source, member, colspecs, names, {"country": "str"},
+                                        filter_span=(0, 3), filter_values=["826"])
+    pd.testing.assert_frame_equal(filtered, uk, check_dtype=False)  # no UK blanks: item decodes to int64
@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import write_sav
+from pisa_cache import read_spss_cached, entry_key, evict, file_hash
+from pisa_spss import read_spss_chunked
+
+COLUMNS = ["CNT", "ST013Q01TA", "ESCS"]
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def entries(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".parquet"))
+
+
+def test_miss_then_hit_returns_the_same_frame(sav_path, cache_dir, capsys):
+    first = read_spss_cached(sav_path, COLUMNS, num_processes=1, cache_dir=cache_dir)
+    assert "Cache miss" in capsys.readouterr().out
+    second = read_spss_cached(sav_path, COLUMNS, num_processes=1, cache_dir=cache_dir)
+    assert "Cache hit" in capsys.readouterr().out
+
+    pd.testing.assert_frame_equal(first, read_spss_chunked(sav_path, COLUMNS))
+    pd.testing.assert_frame_equal(second, first)
+    assert len(entries(cache_dir)) == 1
+
+
+def test_column_subset_is_served_from_the_cached_entry(sav_path, cache_dir, capsys):
+    read_spss_cached(sav_path, COLUMNS, num_processes=1, cache_dir=cache_dir)
+    subset = read_spss_cached(sav_path, ["ESCS", "CNT"], num_processes=1, cache_dir=cache_dir)
+    assert "Cache hit" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(subset, read_spss_chunked(sav_path, ["CNT", "ESCS"]))
+
+
+def test_new_options_or_contents_are_a_miss(sav_path, cache_dir, capsys):
+    read_spss_cached(sav_path, COLUMNS, num_processes=1, cache_dir=cache_dir)
+    read_spss_cached(sav_path, COLUMNS, num_processes=1, cache_dir=cache_dir, apply_value_formats=True)
+    assert capsys.readouterr().out.count("Cache miss") == 2
+
+    old_hash = file_hash(sav_path, cache_dir)
+    write_sav(sav_path, seed=1)
+    assert file_hash(sav_path, cache_dir) != old_hash
+    changed = read_spss_cached(sav_path, COLUMNS, num_processes=1, cache_dir=cache_dir)
+    assert "Cache miss" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(changed, read_spss_chunked(sav_path, COLUMNS))
+    assert len(entries(cache_dir)) == 3
+
+
+def test_entry_key_ignores_column_order():
+    assert entry_key("abc", ["b", "a"], {}) == entry_key("abc", ["a", "b"], {})
+    assert entry_key("abc", ["a"], {}) != entry_key("abc", ["a"], {"apply_value_formats": True})
+
+
+def test_evict_removes_least_recently_used_entries(sav_path, cache_dir):
+    for columns in (["CNT"], ["ESCS"], ["ST013Q01TA"]):
+        read_spss_cached(sav_path, columns, num_processes=1, cache_dir=cache_dir)
+    names = entries(cache_dir)
+    by_age = sorted(names, key=lambda name: os.path.getmtime(os.path.join(cache_dir, name)))
+    os.utime(os.path.join(cache_dir, by_age[0]))  # a hit makes the oldest entry the newest
+
+    newest = os.path.join(cache_dir, by_age[0])
+    evict(max_bytes=os.path.getsize(newest), keep=newest, cache_dir=cache_dir)
+    assert entries(cache_dir) == [by_age[0]]
+    assert not os.path.exists(os.path.join(cache_dir, by_age[1][:-len(".parquet")] + ".json"))
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pisa_codebook import (
+    read_cycle, get_fields, plan_read, value_labels, apply_missing_codes, BOOK_LABELS, ATTITUDE_NAMES_2009,
+)
+
+NAMES = ["country", "books_raw", "read_time_cat"] + ATTITUDE_NAMES_2009[:3] + ["hisei", "wealth"]
+
+
+@pytest.fixture
+def records_2009(tmp_path):
+    """Synthetic 2009 records laid out as the codebook says, with 7/8/9 missing codes in the items."""
+    rng = np.random.default_rng(0)
+    lines = []
+    for country in np.sort(rng.choice(["036", "826", "840"], 200)):
+        line = bytearray(b" " * 709)
+        line[3:6] = country.encode()
+        line[114:119] = bytes(str(code).encode()[0] for code in rng.choice([1, 2, 3, 4, 7, 8, 9], 5))
+        line[408:416] = f"{rng.uniform(16, 90):8.2f}".encode()
+        line[700:709] = f"{rng.normal():9.4f}".encode()
+        lines.append(line.decode())
+    path = tmp_path / "2009_QU_data.txt"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_unknown_cycles_and_variables_are_named():
+    with pytest.raises(KeyError, match="1999"):
+        get_fields(1999, ["country"])
+    with pytest.raises(KeyError, match="no_such_item"):
+        get_fields(2009, ["country", "no_such_item"])
+    assert value_labels(2009, "books_raw") is BOOK_LABELS
+
+
+def test_plan_read_merges_adjacent_items_into_one_span():
+    colspecs, dtypes, spans = plan_read(2009, NAMES)
+    assert colspecs[:4] == [(3, 6), (114, 115), (115, 116), (116, 117)]
+    assert dtypes["country"] == "str" and dtypes["hisei"] == "float" and dtypes["books_raw"] == "int"
+    assert spans == [(3, 6), (114, 119), (408, 416), (700, 709)]
+
+
+def test_read_cycle_matches_read_fwf_with_missing_codes(records_2009):
+    ours = read_cycle(2009, NAMES, path=records_2009)
+
+    colspecs, _, _ = plan_read(2009, NAMES)
+    expected = pd.read_fwf(records_2009, colspecs=colspecs, names=NAMES, header=None, dtype={"country": str})
+    items = ["read_time_cat"] + ATTITUDE_NAMES_2009[:3]  # books_raw has no missing codes listed
+    expected[items] = expected[items].where(~expected[items].isin([7, 8, 9]))
+    pd.testing.assert_frame_equal(ours, expected, check_dtype=False)
+    assert ours["books_raw"].isin([7, 8, 9]).any() and not ours[items].isin([7, 8, 9]).any().any()
+
+
+def test_read_cycle_country_filter_and_raw_codes(records_2009):
+    raw = read_cycle(2009, NAMES, path=records_2009, apply_missing=False)
+    uk = read_cycle(2009, NAMES, path=records_2009, countries=["826"])
+    expected = apply_missing_codes(raw[raw["country"] == "826"].reset_index(drop=True), 2009)
+    pd.testing.assert_frame_equal(uk, expected)
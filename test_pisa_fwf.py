@@ -0,0 +1,127 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pisa_fwf import (
+    read_fixed_width, merge_spans, decode_int, decode_float, open_records, record_layout, decode_row_ranges,
+    field_index, index_row_ranges, INDEX_SUFFIX,
+)
+
+# Layout of the synthetic questionnaire file: country, school id, two items, a word
+COLSPECS = [(0, 3), (3, 8), (8, 9), (9, 11), (11, 17)]
+NAMES = ["country", "school", "item_a", "item_b", "word"]
+DTYPES = {"country": "str", "word": "str"}
+
+
+def write_records(path, n_rows=500, seed=0):
+    """Fixed-width file sorted by country, with blank (missing) fields mixed in."""
+    rng = np.random.default_rng(seed)
+    countries = np.sort(rng.choice(["036", "124", "826", "840"], n_rows))
+    lines = []
+    for country in countries:
+        school = f"{rng.integers(0, 99999):5d}"
+        item_a = " " if rng.random() < 0.1 else str(rng.integers(1, 5))
+        item_b = "  " if rng.random() < 0.1 else f"{rng.integers(0, 99):>2d}"
+        word = rng.choice(["alpha ", "be    ", "      ", "gamma "])
+        lines.append(f"{country}{school}{item_a}{item_b}{word}")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.fixture
+def records_path(tmp_path):
+    return write_records(tmp_path / "2000_QU_data.txt")
+
+
+def test_read_fixed_width_matches_read_fwf(records_path):
+    ours = read_fixed_width(str(records_path), COLSPECS, NAMES, DTYPES)
+    expected = pd.read_fwf(records_path, colspecs=COLSPECS, names=NAMES, header=None,
+                           dtype={"country": str, "word": str})
+    pd.testing.assert_frame_equal(ours, expected, check_dtype=False)
+
+
+def test_overlapping_fields_share_one_span(records_path):
+    colspecs = [(3, 8), (0, 3), (4, 6), (11, 17)]
+    assert merge_spans(colspecs) == [(0, 8, [1, 0, 2]), (11, 17, [3])]
+
+    names = ["school", "country", "school_part", "word"]
+    ours = read_fixed_width(str(records_path), colspecs, names, DTYPES)
+    expected = pd.read_fwf(records_path, colspecs=colspecs, names=names, header=None,
+                           dtype={"country": str, "word": str})
+    pd.testing.assert_frame_equal(ours, expected, check_dtype=False)
+
+
+def test_decode_int_rejects_junk_and_inner_blanks():
+    block = np.frombuffer(b" 12" b"7  " b"1 2" b"   " b"x12" b"007", dtype=np.uint8).reshape(6, 3)
+    np.testing.assert_array_equal(decode_int(block), [12, 7, np.nan, np.nan, np.nan, 7])
+
+
+def test_field_index_blocks_match_country_rows(records_path):
+    path = str(records_path)
+    index = field_index(path, 0, 3)
+    assert os.path.exists(path + INDEX_SUFFIX)
+
+    full = read_fixed_width(path, COLSPECS, NAMES, DTYPES)
+    ranges = index_row_ranges(index, [36, "826"])
+    picked = decode_row_ranges(path, record_layout(open_records(path)), ranges, COLSPECS, NAMES, DTYPES)
+    expected = full[full["country"].isin(["036", "826"])].reset_index(drop=True)
+    pd.testing.assert_frame_equal(picked, expected)
+
+
+def test_field_index_rebuilt_when_file_changes(records_path):
+    path = str(records_path)
+    field_index(path, 0, 3)
+    write_records(records_path, n_rows=40, seed=1)
+    index = field_index(path, 0, 3)
+    assert index["rows"] == 40
+    with open(path + INDEX_SUFFIX) as f:
+        assert json.load(f)["size"] == os.path.getsize(path)
+
+
+def test_parallel_row_ranges_match_single_pass(records_path, monkeypatch):
+    monkeypatch.setattr("pisa_fwf.CHUNK_ROWS", 64)  # several chunks from a small file
+    path = str(records_path)
+    layout = record_layout(open_records(path))
+    single = read_fixed_width(path, COLSPECS, NAMES, DTYPES)
+
+    pd.testing.assert_frame_equal(read_fixed_width(path, COLSPECS, NAMES, DTYPES, num_processes=3), single)
+    ranges = [(10, 150), (300, 420)]
+    parallel = decode_row_ranges(path, layout, ranges, COLSPECS, NAMES, DTYPES, num_processes=3)
+    expected = pd.concat([single.iloc[lo:hi] for lo, hi in ranges], ignore_index=True)
+    pd.testing.assert_frame_equal(parallel, expected)
+
+
+def test_decode_float_signs_points_and_implied_decimals():
+    fields = [b"-0.4532", b" 45.0  ", b"    +12", b"-004532", b"       ", b"1.2.3  ", b"12 34  ", b"3-     "]
+    block = np.frombuffer(b"".join(fields), dtype=np.uint8).reshape(len(fields), 7)
+    np.testing.assert_array_equal(decode_float(block), [-0.4532, 45.0, 12, -4532, np.nan, np.nan, np.nan, np.nan])
+    np.testing.assert_allclose(decode_float(block, decimals=4)[:4], [-0.4532, 45.0, 0.0012, -0.4532])
+
+
+def test_float_fields_match_read_fwf(tmp_path):
+    rng = np.random.default_rng(2)
+    values = np.round(rng.normal(0, 2, 300), 4)
+    path = tmp_path / "wealth.txt"
+    path.write_text("".join(f"{value:9.4f}{' ' * 8 if i % 7 == 0 else f'{value:8.2f}'}\n"
+                            for i, value in enumerate(values)))
+    ours = read_fixed_width(str(path), [(0, 9), (9, 17)], ["wealth", "hisei"], {"wealth": "float", "hisei": "float"})
+    expected = pd.read_fwf(path, colspecs=[(0, 9), (9, 17)], names=["wealth", "hisei"], header=None)
+    pd.testing.assert_frame_equal(ours, expected)
+
+
+def test_complete_integer_fields_stay_integers(records_path):
+    ours = read_fixed_width(str(records_path), COLSPECS[:4], NAMES[:4])
+    expected = pd.read_fwf(records_path, colspecs=COLSPECS[:4], names=NAMES[:4], header=None)
+    assert ours["country"].dtype == ours["school"].dtype == np.int64  # written as 826, not 826.0
+    assert ours["item_a"].dtype == np.float64 and ours["item_a"].isna().any()
+    pd.testing.assert_frame_equal(ours, expected)
+
+
+def test_strings_with_non_ascii_bytes_decode_as_latin1(tmp_path):
+    path = tmp_path / "names.txt"
+    path.write_bytes("826Zoë    \n250Ørsted \n250       \n".encode("latin-1"))
+    ours = read_fixed_width(str(path), [(0, 3), (3, 10)], ["country", "name"], {"name": "str"})
+    assert ours["name"].tolist()[:2] == ["Zoë", "Ørsted"] and pd.isna(ours["name"][2])
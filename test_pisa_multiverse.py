@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pisa_ols import fe_ols
+from pisa_multiverse import specifications, run_multiverse
+
+BLOCKS = {"home": ["books", "wealth"], "school": ["class_size"], "ict": ["devices"]}
+
+
+@pytest.fixture
+def students():
+    rng = np.random.default_rng(0)
+    n = 800
+    df = pd.DataFrame({
+        "country": rng.choice(["GBR", "USA", "DEU", "FRA", "JPN"], n),
+        "read_time": rng.normal(size=n),
+        "books": rng.normal(size=n),
+        "wealth": rng.normal(size=n),
+        "class_size": rng.normal(size=n),
+        "devices": rng.normal(size=n),
+    })
+    df.loc[::13, "wealth"] = np.nan
+    df["score"] = 0.3 * df["read_time"] + 0.2 * df["books"] + rng.normal(size=n)
+    df["score_math"] = df["score"].where(df.index % 5 != 0)
+    return df
+
+
+def test_specifications_enumerate_or_sample():
+    assert specifications(BLOCKS) == [(), ("home",), ("school",), ("ict",), ("home", "school"), ("home", "ict"),
+                                      ("school", "ict"), ("home", "school", "ict")]
+    assert len(specifications(BLOCKS, max_blocks=1)) == 4
+
+    blocks = {f"b{i}": [f"x{i}"] for i in range(10)}
+    sampled = specifications(blocks, max_blocks=3, max_specs=50, seed=1)
+    assert len(sampled) == len(set(sampled)) == 50 < sum(math.comb(10, k) for k in range(4))
+    assert sampled[0] == () and max(map(len, sampled)) <= 3
+    assert sampled == specifications(blocks, max_blocks=3, max_specs=50, seed=1)
+
+
+def test_run_multiverse_rows_match_single_fits(students):
+    specs = specifications(BLOCKS)
+    results = run_multiverse(students, ["score", "score_math"], ["read_time"], BLOCKS, specs,
+                             absorb="country", cluster="country", num_processes=1)
+    assert len(results) == len(specs) * 2
+
+    row = results.query("controls == 'home+ict' and outcome == 'score_math'").iloc[0]
+    data = students.dropna(subset=["read_time", "books", "wealth", "devices", "score_math"])
+    fit = fe_ols("score_math ~ read_time + books + wealth + devices", data, absorb="country", cluster="country")
+    assert row["coef"] == pytest.approx(fit.params["read_time"], rel=1e-12)
+    assert row["se"] == pytest.approx(fit.bse["read_time"], rel=1e-12)
+    assert row["nobs"] == fit.nobs and row["block_home"] and not row["block_school"]
+
+
+def test_forked_pool_matches_serial_run(students):
+    specs = specifications(BLOCKS)
+    serial = run_multiverse(students, ["score"], ["read_time"], BLOCKS, specs, absorb="country", num_processes=1)
+    forked = run_multiverse(students, ["score"], ["read_time"], BLOCKS, specs, absorb="country", num_processes=3)
+    pd.testing.assert_frame_equal(forked, serial)
+
+
+def test_collinear_specification_is_skipped(students, capsys):
+    students["country_size"] = students.groupby("country")["books"].transform("size").astype(float)
+    blocks = dict(BLOCKS, country=["country_size"])  # constant within the absorbed countries
+    results = run_multiverse(students, ["score"], ["read_time"], blocks, [(), ("country",), ("home",)],
+                             absorb="country", num_processes=1)
+    assert list(results["controls"]) == ["none", "home"]
+    assert "Specification 1 (country) skipped" in capsys.readouterr().out
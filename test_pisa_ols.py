@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.formula.api as smf
+
+from pisa_ols import fe_ols, fe_ols_many
+
+
+@pytest.fixture
+def students():
+    """Students in 12 countries with country effects, a categorical control and a cross-country region."""
+    rng = np.random.default_rng(0)
+    n = 1500
+    df = pd.DataFrame({
+        "country": rng.choice([f"C{i:02d}" for i in range(12)], n),
+        "region": rng.choice(["north", "south", "east", "west", "centre"], n),  # not nested in country
+        "gender": rng.choice(["female", "male"], n),
+        "x": rng.normal(size=n),
+        "z": rng.normal(size=n),
+    })
+    effect = df["country"].str[1:].astype(int) * 0.3
+    df["y"] = 0.4 * df["x"] - 0.2 * df["z"] + effect + (df["gender"] == "male") * 0.1 + rng.normal(size=n)
+    return df
+
+
+def dummy_fit(formula, df, **fit_kwargs):
+    return smf.ols(formula + " + C(country)", df).fit(**fit_kwargs)
+
+
+def test_fe_ols_matches_country_dummies(students):
+    ours = fe_ols("y ~ x + z + C(gender)", students, absorb="country")
+    expected = dummy_fit("y ~ x + z + C(gender)", students)
+
+    terms = ours.params.index
+    assert list(terms) == ["C(gender)[T.male]", "x", "z"]
+    np.testing.assert_allclose(ours.params, expected.params[terms], rtol=1e-10)
+    np.testing.assert_allclose(ours.bse, expected.bse[terms], rtol=1e-10)
+    np.testing.assert_allclose(ours.pvalues, expected.pvalues[terms], rtol=1e-8)
+    assert ours.nobs == expected.nobs and ours.df_resid == expected.df_resid
+
+
+def test_cluster_ses_match_statsmodels(students):
+    ours = fe_ols("y ~ x + z", students, absorb="country", cluster="region")
+    groups = students["region"].astype("category").cat.codes
+    expected = dummy_fit("y ~ x + z", students, cov_type="cluster", cov_kwds={"groups": groups}, use_t=True)
+
+    np.testing.assert_allclose(ours.bse, expected.bse[ours.params.index], rtol=1e-10)
+    np.testing.assert_allclose(ours.pvalues, expected.pvalues[ours.params.index], rtol=1e-8)
+
+
+def test_nested_clusters_drop_absorbed_effects_from_k(students):
+    ours = fe_ols("y ~ x + z", students, absorb="country", cluster="country")
+    groups = students["country"].astype("category").cat.codes
+    expected = dummy_fit("y ~ x + z", students, cov_type="cluster", cov_kwds={"groups": groups})
+
+    # statsmodels counts the 11 country dummies in K; nested effects use no degrees of freedom here
+    n, k_dummies, p = len(students), expected.df_model + 1, 2
+    np.testing.assert_allclose(ours.bse ** 2, expected.bse[ours.params.index] ** 2 * (n - k_dummies) / (n - p),
+                               rtol=1e-10)
+
+
+def test_fe_ols_many_equals_separate_fits(students):
+    students["y2"] = students["y"].where(students.index % 4 != 0)  # another missing-data pattern
+    students["y3"] = -students["y"]
+    outcomes = ["y", "y2", "y3"]
+    batch = fe_ols_many("x + z + C(gender)", students, outcomes, absorb="country", cluster="country")
+    for outcome in outcomes:
+        single = fe_ols(f"{outcome} ~ x + z + C(gender)", students.dropna(subset=[outcome]),
+                        absorb="country", cluster="country")
+        pd.testing.assert_series_equal(batch[outcome].params, single.params)
+        pd.testing.assert_series_equal(batch[outcome].bse, single.bse)
+        assert batch[outcome].nobs == single.nobs
+    assert batch["y2"].nobs < batch["y"].nobs
+
+
+def test_collinear_design_names_the_aliased_terms(students):
+    students["country_level"] = students["country"].str[1:].astype(float)  # constant within countries
+    students["x_plus_z"] = students["x"] + students["z"]
+    with pytest.raises(np.linalg.LinAlgError, match=r"\['country_level'\]"):
+        fe_ols("y ~ x + country_level", students, absorb="country")
+    with pytest.raises(np.linalg.LinAlgError, match=r"\['x_plus_z'\]"):
+        fe_ols("y ~ x + z + x_plus_z", students, absorb="country")
+    assert "country_level" in fe_ols("y ~ x + country_level", students).params  # identified without the effects
+
+
+def test_two_way_cluster_ses_match_statsmodels(students):
+    students["cohort"] = np.random.default_rng(1).choice(["a", "b", "c", "d", "e", "f", "g"], len(students))
+    ours = fe_ols("y ~ x + z", students, absorb="country", cluster=["region", "cohort"])
+    groups = np.column_stack([students[col].astype("category").cat.codes for col in ["region", "cohort"]])
+    expected = dummy_fit("y ~ x + z", students, cov_type="cluster", cov_kwds={"groups": groups})
+
+    np.testing.assert_allclose(ours.bse, expected.bse[ours.params.index], rtol=1e-10)
+
+
+def test_two_way_clusters_must_not_be_nested(students):
+    students["school_id"] = students["country"] + "-" + (students.index % 9).astype(str)
+    with pytest.raises(ValueError, match="school_id is nested in country"):
+        fe_ols("y ~ x + z", students, absorb="country", cluster=["country", "school_id"])
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+from pisa_panel import (
+    iso_country, harmonise, write_panel_year, read_panel, panel_shares, ATTITUDE_ITEMS, READ_TIME_ORDER,
+)
+from pisa_codebook import ATTITUDE_NAMES_2009
+from pisa_survey import WEIGHT_COL
+
+
+def raw_2018(n=60, seed=0):
+    """Raw 2018 columns as read from the .sav: alpha-3 CNT, books 1-6, read time 1-5, items 1-4, weights."""
+    rng = np.random.default_rng(seed)
+    raw = pd.DataFrame({
+        "CNT": rng.choice(["GBR", "USA", "DEU"], n),
+        "ST013Q01TA": rng.choice([1, 2, 3, 4, 5, 6, np.nan], n),
+        "ST175Q01IA": rng.choice([1, 2, 3, 4, 5, 99], n).astype(float),
+        WEIGHT_COL: rng.uniform(1, 30, n),
+    })
+    for i in range(1, 6):
+        raw[f"ST160Q0{i}IA"] = rng.choice([1, 2, 3, 4, 7], n).astype(float)  # 7 = not a valid answer
+    return raw
+
+
+def raw_2009(n=40, seed=1):
+    """Raw 2009 columns as read from the fixed-width file: numeric country codes, books 1-6 and items."""
+    rng = np.random.default_rng(seed)
+    raw = pd.DataFrame({
+        "country": rng.choice(["826", "840", "999", None], n),
+        "books_raw": rng.choice([1, 2, 3, 4, 5, 6], n).astype(float),
+        "read_time_cat": rng.choice([1, 2, 3, 4, 5, np.nan], n),
+    })
+    for name in ATTITUDE_NAMES_2009:
+        raw[name] = rng.choice([1, 2, 3, 4, np.nan], n)
+    return raw
+
+
+def test_iso_country_maps_numeric_and_text_codes():
+    codes = pd.Series([826, 840.0, "826", "GBR ", 999, "036", "", None])
+    iso = iso_country(codes)
+    assert iso[:6].tolist() == ["GBR", "USA", "GBR", "GBR", "999", "AUS"]  # unknown 999 kept as text
+    assert iso[6:].isna().all()
+
+
+def test_harmonise_2018_recodes_to_panel_variables():
+    raw = raw_2018()
+    df = harmonise(2018, raw)
+
+    assert list(df.columns) == ["year", "country", "books_home", WEIGHT_COL, "read_time", *ATTITUDE_ITEMS]
+    assert (df["year"] == 2018).all() and set(df["country"]) <= {"GBR", "USA", "DEU"}
+    assert df["books_home"].cat.ordered and df["books_home"].isna().sum() == raw["ST013Q01TA"].isna().sum()
+    assert list(df["read_time"].cat.categories) == READ_TIME_ORDER
+    assert df["read_time"].isna().tolist() == (raw["ST175Q01IA"] == 99).tolist()
+    np.testing.assert_array_equal(df[WEIGHT_COL], raw[WEIGHT_COL])
+
+    item = df["att_only_if_have_to"]
+    assert item.dtype == "Int8" and item.isna().tolist() == (raw["ST160Q01IA"] == 7).tolist()
+
+
+def test_harmonise_2009_gives_unit_weights_and_drops_unknown_countries():
+    raw = raw_2009()
+    df = harmonise(2009, raw)
+
+    assert len(df) == raw["country"].notna().sum()
+    assert set(df["country"]) == {"GBR", "USA", "999"}  # unknown numeric codes are kept as text
+    assert (df[WEIGHT_COL] == 1.0).all() and df[WEIGHT_COL].dtype == np.float64
+    assert df["read_time"].notna().any()
+    assert df["att_only_if_have_to"].notna().any()
+
+
+def test_harmonise_folds_no_books_into_the_lowest_band():
+    raw = pd.DataFrame({"CNT": ["GBR"] * 7, "ST255Q01JA": [1, 2, 3, 4, 5, 6, 7], WEIGHT_COL: 1.0})
+    books = harmonise(2022, raw)["books_home"]
+    assert books.tolist() == ["0–10", "0–10", "11–25", "26–100", "101–200", "201–500", "500+"]
+    assert harmonise(2022, raw)["read_time"].isna().all()  # not asked in 2022
+
+
+def test_panel_partitions_round_trip(tmp_path):
+    panel_dir = str(tmp_path / "panel")
+    df_2009, df_2018 = harmonise(2009, raw_2009()), harmonise(2018, raw_2018())
+    write_panel_year(df_2009, 2009, panel_dir)
+    year_dir = write_panel_year(df_2018, 2018, panel_dir)
+    assert sorted(p.name for p in (tmp_path / "panel" / "year=2018").iterdir()) == [
+        "country=DEU", "country=GBR", "country=USA"
+    ]
+    assert year_dir.endswith("year=2018")
+
+    back = read_panel(panel_dir=panel_dir)
+    expected = pd.concat([df_2009, df_2018])
+    assert len(back) == len(expected) and back["year"].dtype == int
+    keys = ["year", "country", "books_home"]
+    for df in (back, expected):
+        df[keys] = df[keys].astype(str)  # key dtypes change in the partition round trip
+    pd.testing.assert_series_equal(back.groupby(keys).size(), expected.groupby(keys).size())
+    pd.testing.assert_series_equal(back.groupby(keys)[WEIGHT_COL].sum(), expected.groupby(keys)[WEIGHT_COL].sum())
+
+    uk_2018 = read_panel(["country", "books_home"], years=[2018], countries=["GBR"], panel_dir=panel_dir)
+    assert set(uk_2018["country"]) == {"GBR"} and len(uk_2018) == (df_2018["country"] == "GBR").sum()
+
+    # Rewriting a year replaces its partitions instead of adding to them
+    write_panel_year(df_2018[df_2018["country"] == "USA"], 2018, panel_dir)
+    assert set(read_panel(["country"], years=[2018], panel_dir=panel_dir)["country"]) == {"USA"}
+    assert len(read_panel(["country"], years=[2009], panel_dir=panel_dir)) == len(df_2009)
+
+
+def test_panel_shares_weight_each_year(tmp_path):
+    panel_dir = str(tmp_path / "panel")
+    df_2009, df_2018 = harmonise(2009, raw_2009()), harmonise(2018, raw_2018())
+    write_panel_year(df_2009, 2009, panel_dir)
+    write_panel_year(df_2018, 2018, panel_dir)
+    shares = panel_shares("books_home", panel_dir=panel_dir)
+
+    assert shares["year"].dtype == int and isinstance(shares["books_home"].dtype, pd.CategoricalDtype)
+    np.testing.assert_allclose(shares.groupby("year")["percent"].sum(), 100)
+
+    # 2009 has unit weights: plain shares of the answered rows
+    plain = df_2009["books_home"].value_counts(normalize=True).sort_index() * 100
+    got_2009 = shares[shares["year"] == 2009].set_index("books_home")["percent"]
+    np.testing.assert_allclose(got_2009, plain[plain > 0].to_numpy())
+
+    # 2018 uses W_FSTUWT
+    valid = df_2018.dropna(subset=["books_home"])
+    weighted = valid.groupby("books_home", observed=True)[WEIGHT_COL].sum() / valid[WEIGHT_COL].sum() * 100
+    got_2018 = shares[shares["year"] == 2018]
+    np.testing.assert_allclose(got_2018["percent"], weighted.to_numpy())
+    np.testing.assert_array_equal(got_2018["n"], valid["books_home"].value_counts(sort=False)[weighted.index])
+
+    by_country = panel_shares("books_home", by=["year", "country"], years=[2018], countries=["GBR"],
+                              panel_dir=panel_dir)
+    assert set(by_country["country"]) == {"GBR"}
+    np.testing.assert_allclose(by_country["percent"].sum(), 100)
+
+
+def test_sav_without_weight_column_gets_unit_weights():
+    df = harmonise(2018, raw_2018().drop(columns=WEIGHT_COL))
+    assert (df[WEIGHT_COL] == 1.0).all() and len(df) == 60
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pyreadstat
+
+from pisa_spss import read_spss_chunked, read_spss_parallel, isin_filter, row_ranges, missing_rules, scrub_block
+
+COLUMNS = ["CNT", "ST013Q01TA", "ESCS"]
+
+
+def test_chunked_read_matches_read_sav(sav_path):
+    expected, _ = pyreadstat.read_sav(sav_path, usecols=COLUMNS)
+    chunked = read_spss_chunked(sav_path, COLUMNS, chunksize=128, downcast=False)
+    pd.testing.assert_frame_equal(chunked, expected)
+
+
+def test_chunked_read_filters_and_downcasts(sav_path):
+    expected, _ = pyreadstat.read_sav(sav_path, usecols=COLUMNS)
+    expected = expected[expected["CNT"].isin(["GBR", "USA"])].reset_index(drop=True)
+    chunked = read_spss_chunked(sav_path, COLUMNS, chunksize=128, row_filter=isin_filter("CNT", ["GBR", "USA"]))
+
+    assert chunked["ST013Q01TA"].dtype == np.float32  # integer codes
+    assert chunked["ESCS"].dtype == np.float64  # non-integer index stays exact
+    pd.testing.assert_frame_equal(chunked, expected, check_dtype=False)
+
+
+def test_row_ranges_cover_every_row_once():
+    assert row_ranges(10, 4) == [(0, 4), (4, 4), (8, 2)]
+    assert row_ranges(8, 4) == [(0, 4), (4, 4)]
+    assert row_ranges(0, 4) == []
+
+
+def test_parallel_read_matches_chunked(sav_path):
+    chunked = read_spss_chunked(sav_path, COLUMNS, chunksize=128, row_filter=isin_filter("CNT", ["DEU"]))
+    parallel = read_spss_parallel(sav_path, COLUMNS, num_processes=3, chunksize=128,
+                                  row_filter=isin_filter("CNT", ["DEU"]))
+    pd.testing.assert_frame_equal(parallel, chunked)
+
+
+def test_missing_rules_from_labels_and_ranges(sav_path):
+    rules = missing_rules(sav_path, COLUMNS)
+    assert sorted(rules["ST013Q01TA"]) == [(95, 95), (97, 97), (98, 98), (99, 99)]
+    assert rules["ESCS"] == [(9995.0, 9999.0)]
+    assert "CNT" not in rules
+
+
+def test_scrub_block_blanks_only_missing_codes(sav_path):
+    raw, _ = pyreadstat.read_sav(sav_path, usecols=COLUMNS)
+    scrubbed = scrub_block(raw.copy(), missing_rules(sav_path, COLUMNS))
+
+    expected = raw["ST013Q01TA"].where(raw["ST013Q01TA"] < 95)
+    pd.testing.assert_series_equal(scrubbed["ST013Q01TA"], expected)
+    pd.testing.assert_series_equal(scrubbed["ESCS"], raw["ESCS"])  # 97 is a valid index value
+    pd.testing.assert_series_equal(scrubbed["CNT"], raw["CNT"])
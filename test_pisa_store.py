@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.formula.api as smf
+
+from pisa_store import (
+    shrink_column, shrink_dtypes, write_cleaned, read_cleaned, label_column, strip_strings, drop_unused_categories,
+)
+
+
+def test_shrink_column_picks_the_smallest_dtype():
+    assert shrink_column(pd.Series([1.0, 4.0, 2.0])).dtype == np.int8
+    assert shrink_column(pd.Series([-300.0, 2.0])).dtype == np.int16
+    assert shrink_column(pd.Series([82600001.0, 84000002.0])).dtype == np.int32  # school ids
+    assert shrink_column(pd.Series([0.25, -1.5])).dtype == np.float32
+    assert shrink_column(pd.Series(["GBR", "GBR", "USA", "USA"])).dtype == "category"
+    assert shrink_column(pd.Series(["a", "b", "c"])).dtype != "category"  # no repeats to share
+
+
+def test_shrink_column_keeps_missing_values_as_nan():
+    items = shrink_column(pd.Series([1.0, np.nan, 4.0]))
+    assert items.dtype == np.float32 and items.isna().tolist() == [False, True, False]
+
+    ids = shrink_column(pd.Series([82600001.0, np.nan]))  # beyond float32's exact whole numbers
+    assert ids.dtype == np.float64 and ids[0] == 82600001
+
+
+def test_shrunk_columns_with_missing_values_fit_in_formulas():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"item": rng.integers(1, 5, 50).astype(float), "y": rng.normal(size=50)})
+    df.loc[::7, "item"] = np.nan
+    shrunk = shrink_dtypes(df, report=False)
+    fit = smf.ols("y ~ item", shrunk).fit()  # patsy drops the NaN rows itself
+    assert fit.nobs == df["item"].notna().sum()
+    np.testing.assert_allclose(fit.params, smf.ols("y ~ item", df).fit().params, rtol=1e-6)
+
+
+def test_shrink_dtypes_keeps_exact_columns_and_reports(capsys):
+    df = pd.DataFrame({"W_FSTUWT": [12.3456789012, 3.0], "PV1READ": [480.123456789, 512.0],
+                       "ESCS": [0.123456789, -1.0], "ST013Q01TA": [1.0, 6.0]})
+    shrunk = shrink_dtypes(df, exact=["W_FSTUWT", "PV1READ"])
+
+    assert shrunk.dtypes.astype(str).tolist() == ["float64", "float64", "float32", "int8"]
+    pd.testing.assert_series_equal(shrunk["W_FSTUWT"], df["W_FSTUWT"])
+    pd.testing.assert_series_equal(shrunk["PV1READ"], df["PV1READ"])
+    assert "🧮 Memory:" in capsys.readouterr().out
+
+
+@pytest.fixture
+def cleaned(tmp_path):
+    """A small cleaned dataset written both as Parquet and as a legacy CSV."""
+    df = pd.DataFrame({
+        "country": pd.Categorical(["GBR", "USA", "DEU", "GBR", "USA", "FRA"]),
+        "books_home": np.array([1, 2, 3, 4, 5, 6], dtype=np.int8),
+        "ESCS": np.array([0.5, -1.25, np.nan, 1.0, 0.0, 2.5], dtype=np.float32),
+        "note": ["a", None, "c", "d", "e", "f"],
+    })
+    parquet_path = write_cleaned(df, str(tmp_path / "out" / "cleaned.parquet"))
+    csv_path = str(tmp_path / "cleaned.csv")
+    df.to_csv(csv_path, index=False)
+    return df, parquet_path, csv_path
+
+
+def test_parquet_round_trip_keeps_dtypes(cleaned):
+    df, parquet_path, _ = cleaned
+    pd.testing.assert_frame_equal(read_cleaned(parquet_path), df, check_dtype=False)
+    back = read_cleaned(parquet_path)
+    assert isinstance(back["country"].dtype, pd.CategoricalDtype)
+    assert back["books_home"].dtype == np.int8 and back["ESCS"].dtype == np.float32
+
+
+def test_read_cleaned_projects_columns_and_names_missing_ones(cleaned):
+    _, parquet_path, csv_path = cleaned
+    for path in (parquet_path, csv_path):
+        assert list(read_cleaned(path, columns=["ESCS", "country"]).columns) == ["ESCS", "country"]
+        with pytest.raises(KeyError, match=r"\['WEALTH'\]"):
+            read_cleaned(path, columns=["ESCS", "WEALTH"])
+
+
+def test_label_column_blanks_unlabelled_codes():
+    labels = {1: "None", 2: "One", 3: "Two", 4: "Three or more"}
+    codes = pd.Series([1.0, 4.0, np.nan, 9.0, 2.0], index=[10, 11, 12, 13, 14])
+    labelled = label_column(codes, labels)
+
+    assert labelled.tolist()[:2] == ["None", "Three or more"] and labelled.index.tolist() == [10, 11, 12, 13, 14]
+    assert labelled.isna().tolist() == [False, False, True, True, False]  # NaN and the unlabelled 9
+    assert list(labelled.cat.categories) == ["None", "One", "Two", "Three or more"]
+
+
+def test_label_columns_share_one_categorical_dtype():
+    labels = {1: "Low", 2: "Mid", 3: "High", 4: "High"}  # two codes may share a label
+    a = label_column(pd.Series([1, 2, 3]), labels, ordered=True)
+    b = label_column(pd.Series([4, 4, 1]), dict(labels), ordered=True)
+
+    assert a.dtype is b.dtype and list(a.dtype.categories) == ["Low", "Mid", "High"]
+    assert b.tolist() == ["High", "High", "Low"] and (a < "High").tolist() == [True, True, False]
+    combined = pd.concat([a, b], ignore_index=True)  # shared dtype: stays categorical
+    assert combined.dtype == a.dtype
+    assert label_column(pd.Series([1]), labels).dtype is not a.dtype  # unordered is its own set
+
+
+def test_country_filters_on_parquet_and_csv(cleaned):
+    df, parquet_path, csv_path = cleaned
+    expected = df[df["country"].isin(["GBR", "USA"])].reset_index(drop=True)
+
+    from_parquet = read_cleaned(parquet_path, countries=["GBR", "USA"])
+    pd.testing.assert_frame_equal(from_parquet, expected, check_dtype=False, check_categorical=False)
+    assert list(read_cleaned(parquet_path, columns=["ESCS"], countries=["DEU"]).columns) == ["ESCS"]
+
+    from_csv = read_cleaned(csv_path, columns=["ESCS", "country"], countries=["GBR", "USA"])
+    assert from_csv["country"].tolist() == expected["country"].tolist()
+    np.testing.assert_allclose(from_csv["ESCS"], expected["ESCS"])
+    assert read_cleaned(csv_path, countries=["JPN"]).empty
+
+
+def test_strip_strings_on_text_and_categorical_columns():
+    df = pd.DataFrame({
+        "country": pd.Categorical([" GBR", "USA ", " GBR"]),
+        "clashing": pd.Categorical(["a", "a ", "b"]),  # stripping would merge two categories
+        "school": pd.Series([" s1 ", None, "s2"], dtype=object),
+        "ESCS": [0.5, -1.0, 2.0],
+    })
+    stripped = strip_strings(df.copy())
+
+    assert list(stripped["country"].cat.categories) == ["GBR", "USA"]
+    assert stripped["country"].tolist() == ["GBR", "USA", "GBR"]
+    assert stripped["clashing"].tolist() == ["a", "a ", "b"]
+    assert stripped["school"].tolist()[::2] == ["s1", "s2"] and pd.isna(stripped["school"][1])
+    pd.testing.assert_series_equal(stripped["ESCS"], df["ESCS"])
+
+
+def test_projected_subset_keeps_only_used_categories(cleaned):
+    _, parquet_path, _ = cleaned
+    df = read_cleaned(parquet_path, columns=["country", "ESCS"])
+    subset = drop_unused_categories(df[df["country"].isin(["GBR", "USA"])].copy())
+    assert list(subset["country"].cat.categories) == ["GBR", "USA"]
+    assert smf.ols("ESCS ~ C(country)", subset).fit().params.index.tolist() == ["Intercept", "C(country)[T.USA]"]
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.formula.api as smf
+
+from pisa_survey import (
+    replicate_se, weighted_tables, replicate_ols, rubin_combine, pv_ols, WEIGHT_COL, REPLICATE_COLS, FAY_K,
+)
+
+
+@pytest.fixture
+def survey_df():
+    """Students in countries with a final weight and 80 Fay replicate weights (0.5x / 1.5x the final weight)."""
+    rng = np.random.default_rng(0)
+    n = 600
+    df = pd.DataFrame({
+        "country": rng.choice(["GBR", "USA", "DEU", "FRA"], n),
+        "books": rng.choice([1, 2, 3, 4], n).astype(float),
+        "x": rng.normal(size=n),
+    })
+    df.loc[::17, "books"] = np.nan
+    df["y"] = 0.5 * df["x"] + df["country"].map({"GBR": 0, "USA": 1, "DEU": -1, "FRA": 2}) + rng.normal(size=n)
+    for i in range(1, 4):  # plausible values: the score plus a per-draw imputation error
+        df[f"PV{i}READ"] = 480 + 20 * df["x"] + rng.normal(0, 30, n)
+    df[WEIGHT_COL] = rng.uniform(5, 50, n)
+    factors = np.where(rng.random((n, len(REPLICATE_COLS))) < 0.5, 1 - FAY_K, 1 + FAY_K)
+    replicates = pd.DataFrame(df[WEIGHT_COL].to_numpy()[:, None] * factors, columns=REPLICATE_COLS)
+    return pd.concat([df, replicates], axis=1)
+
+
+def brr_se(full, replicates):
+    """Fay-BRR SE written out as the PISA technical report states it."""
+    return np.sqrt(sum((r - full) ** 2 for r in replicates) / (len(replicates) * (1 - FAY_K) ** 2))
+
+
+def test_replicate_se_matches_formula():
+    rng = np.random.default_rng(1)
+    estimates = rng.normal(size=(3, 81))
+    expected = [brr_se(row[0], row[1:]) for row in estimates]
+    np.testing.assert_allclose(replicate_se(estimates), expected)
+
+
+def test_weighted_table_se_matches_replicate_loop(survey_df):
+    table = weighted_tables(survey_df, ["books"])
+
+    def percent(weight_col):
+        valid = survey_df.dropna(subset=["books"])
+        totals = valid.groupby("books")[weight_col].sum()
+        return totals / totals.sum() * 100
+
+    full = percent(WEIGHT_COL)
+    replicates = [percent(col) for col in REPLICATE_COLS]
+    np.testing.assert_allclose(table["percent"], full.to_numpy())
+    np.testing.assert_allclose(table["se"], brr_se(full, replicates).to_numpy())
+    np.testing.assert_array_equal(table["n"], survey_df["books"].value_counts().sort_index().to_numpy())
+
+
+def test_replicate_ols_matches_wls_loop(survey_df):
+    fits = [smf.wls("y ~ x + books + C(country)", survey_df, weights=survey_df[col]).fit().params
+            for col in [WEIGHT_COL] + REPLICATE_COLS]
+    ours = replicate_ols("y ~ x + books", survey_df, absorb="country")
+
+    for term in ["x", "books"]:
+        assert ours.loc[term, "coef"] == pytest.approx(fits[0][term], rel=1e-10)
+        expected_se = brr_se(fits[0][term], [fit[term] for fit in fits[1:]])
+        assert ours.loc[term, "se"] == pytest.approx(expected_se, rel=1e-8)
+
+
+def test_rubin_combine_matches_loop():
+    rng = np.random.default_rng(2)
+    estimates, sampling_var = rng.normal(size=(4, 10)), rng.uniform(0.1, 1, (4, 10))
+    coef, var = rubin_combine(estimates, sampling_var)
+    for j in range(4):
+        m = estimates.shape[1]
+        mean = sum(estimates[j]) / m
+        between = sum((e - mean) ** 2 for e in estimates[j]) / (m - 1)
+        assert coef[j] == pytest.approx(mean)
+        assert var[j] == pytest.approx(sum(sampling_var[j]) / m + (1 + 1 / m) * between)
+
+
+def test_pv_ols_matches_wls_loop(survey_df):
+    pv_cols = ["PV1READ", "PV2READ", "PV3READ"]
+    ours = pv_ols("x + books", survey_df, pv_cols=pv_cols, absorb="country")
+
+    coefs, variances = [], []
+    for pv in pv_cols:
+        fits = [smf.wls(f"{pv} ~ x + books + C(country)", survey_df, weights=survey_df[col]).fit().params["x"]
+                for col in [WEIGHT_COL] + REPLICATE_COLS]
+        coefs.append(fits[0])
+        variances.append(brr_se(fits[0], fits[1:]) ** 2)
+    coef, var = rubin_combine(np.array(coefs), np.array(variances))
+    assert ours.loc["x", "coef"] == pytest.approx(coef, rel=1e-10)
+    assert ours.loc["x", "se"] == pytest.approx(np.sqrt(var), rel=1e-8)
+
+
+def test_pv_ols_without_replicates_uses_model_variances(survey_df):
+    pv_cols = ["PV1READ", "PV2READ", "PV3READ"]
+    data = survey_df.drop(columns=REPLICATE_COLS)
+    ours = pv_ols("x + books", data, pv_cols=pv_cols, absorb="country")
+
+    fits = [smf.wls(f"{pv} ~ x + books + C(country)", data, weights=data[WEIGHT_COL]).fit() for pv in pv_cols]
+    coef, var = rubin_combine(np.array([fit.params["x"] for fit in fits]),
+                              np.array([fit.bse["x"] ** 2 for fit in fits]))
+    assert ours.loc["x", "coef"] == pytest.approx(coef, rel=1e-10)
+    assert ours.loc["x", "se"] == pytest.approx(np.sqrt(var), rel=1e-8)
+
+
+def test_rows_missing_the_absorb_key_are_dropped(survey_df):
+    survey_df["country"] = survey_df["country"].astype(object)
+    survey_df.loc[::11, "country"] = None
+    ours = replicate_ols("y ~ x + books", survey_df, absorb="country")
+    expected = replicate_ols("y ~ x + books", survey_df.dropna(subset=["country"]), absorb="country")
+    pd.testing.assert_frame_equal(ours, expected)
+
+    pvs = pv_ols("x + books", survey_df, pv_cols=["PV1READ", "PV2READ"], absorb="country")
+    assert pvs.notna().all().all()
+
+
+def test_unit_weights_give_plain_shares(survey_df):
+    plain = survey_df["books"].value_counts(normalize=True).sort_index() * 100
+    unit = survey_df.drop(columns=REPLICATE_COLS).assign(**{WEIGHT_COL: 1.0})
+    no_weight = survey_df.drop(columns=REPLICATE_COLS + [WEIGHT_COL])
+
+    for df in (unit, no_weight):
+        table = weighted_tables(df, ["books"])
+        np.testing.assert_allclose(table["percent"], plain.to_numpy())
+        np.testing.assert_array_equal(table["n"], survey_df["books"].value_counts().sort_index().to_numpy())
+    assert weighted_tables(unit, ["books"])["se"].isna().all()  # no replicates, no Fay-BRR SE
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import run_pipeline
+from run_pipeline import stage
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """Two-stage pipeline in tmp_path (raw.txt -> clean.txt -> table.txt) with a fake stage runner."""
+    raw, clean, table = (str(tmp_path / name) for name in ("raw.txt", "clean.txt", "table.txt"))
+    with open(raw, "w") as f:
+        f.write("raw v1\n")
+    stages = {
+        "load": stage("load.py", [raw], [clean]),
+        "analyse": stage("analyse.py", [clean], [table]),
+    }
+    monkeypatch.setattr(run_pipeline, "STAGES", stages)
+    monkeypatch.setattr(run_pipeline, "STATE_PATH", str(tmp_path / "state.json"))
+    monkeypatch.setattr(run_pipeline, "LOG_DIR", str(tmp_path / "logs"))
+    monkeypatch.setattr(run_pipeline, "CACHE_DIR", str(tmp_path / "cache"))
+
+    ran = []
+
+    def fake_run_stage(name, num_processes=1):
+        ran.append(name)
+        for path in stages[name]["outputs"]:
+            with open(path, "w") as f:
+                f.write(f"{name} output\n")
+        return 0
+
+    monkeypatch.setattr(run_pipeline, "run_stage", fake_run_stage)
+    return stages, raw, ran
+
+
+def test_unchanged_stages_are_skipped(pipeline):
+    _, _, ran = pipeline
+    run_pipeline.run_pipeline()
+    assert ran == ["load", "analyse"]
+    done, failed = run_pipeline.run_pipeline()
+    assert ran == ["load", "analyse"] and done == {"load", "analyse"} and not failed
+
+
+def test_input_edited_during_a_stage_is_still_out_of_date(pipeline, monkeypatch):
+    stages, raw, ran = pipeline
+    fake_run_stage = run_pipeline.run_stage
+
+    def edit_input_while_running(name, num_processes=1):
+        if name == "load" and not ran:
+            with open(raw, "w") as f:  # the stage has already read the old contents
+                f.write("raw v2, edited mid-run\n")
+        return fake_run_stage(name, num_processes)
+
+    monkeypatch.setattr(run_pipeline, "run_stage", edit_input_while_running)
+    run_pipeline.run_pipeline()
+    run_pipeline.run_pipeline()
+    assert ran == ["load", "analyse", "load"]
+
+
+def test_upstream_follows_files_and_rejects_cycles():
+    stages = {
+        "load": stage("load.py", ["raw.sav"], ["clean.parquet"]),
+        "analyse": stage("analyse.py", ["clean.parquet"], ["table.csv"]),
+        "trend": stage("trend.py", ["table.csv", "clean.parquet"], ["trend.png"]),
+    }
+    assert run_pipeline.upstream(stages) == {"load": [], "analyse": ["load"], "trend": ["analyse", "load"]}
+
+    stages["load"]["inputs"].append("trend.png")
+    with pytest.raises(ValueError, match="cycle"):
+        run_pipeline.upstream(stages)
+
+
+def test_select_pulls_in_upstream_stages():
+    deps = {"load": [], "analyse": ["load"], "trend": ["analyse"], "other": []}
+    assert run_pipeline.select(deps, None) == {"load", "analyse", "trend", "other"}
+    assert run_pipeline.select(deps, ["trend"]) == {"load", "analyse", "trend"}
+    with pytest.raises(KeyError, match="nope"):
+        run_pipeline.select(deps, ["trend", "nope"])
+
+
+def test_repo_stages_form_a_dag():
+    deps = run_pipeline.upstream(run_pipeline.STAGES)
+    assert deps["analyse_2018"] == ["load_2018"]
+    assert run_pipeline.select(deps, ["books_trend"]) == {"books_trend"} | {
+        f"panel_{year}" for year in run_pipeline.BOOKS_TREND_YEARS
+    }
+
+
+def test_failed_stage_skips_everything_downstream(pipeline, monkeypatch):
+    _, _, ran = pipeline
+    monkeypatch.setattr(run_pipeline, "run_stage", lambda name, num_processes=1: ran.append(name) or 1)
+    done, failed = run_pipeline.run_pipeline()
+    assert ran == ["load"] and not done and failed == {"load", "analyse"}